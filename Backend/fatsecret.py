@@ -1,224 +1,328 @@
-import hashlib#for computing hash
-from rauth.service import OAuth1Service #see https://github.com/litl/rauth for more info
-import shelve #for persistent caching of tokens, hashes,etc.
-import time
-import datetime 
-#get your consumer key and secret after registering as a developer here: https://oauth.withings.com/en/partner/add
+import asyncio
+import datetime
+import sys
+from array import array
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+#make the app package importable when this module is used from Backend/
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from app.services.fatsecret import FatSecretTransport
+from app.services.token_store import TokenStore
+
+#get your consumer key and secret after registering as a developer here: https://platform.fatsecret.com/api/
+
+REQUEST_TOKEN_URL = 'http://www.fatsecret.com/oauth/request_token'
+ACCESS_TOKEN_URL = 'http://www.fatsecret.com/oauth/access_token'
+AUTHORIZE_URL = 'http://www.fatsecret.com/oauth/authorize'
+MEALS = ['breakfast', 'lunch', 'dinner', 'other']
+EPOCH = datetime.date(1970, 1, 1)
+#months are fetched concurrently, but never more than this many at once
+DEFAULT_MAX_CONCURRENCY = 6
+
+
+def _date_int(date):
+    """fatsecret identifies days by the number of days since the epoch"""
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    return (date - EPOCH).days
+
+
+def _month_starts(start, end):
+    """first day of every month between start and end, inclusive"""
+    current = datetime.date(start.year, start.month, 1)
+    last = datetime.date(end.year, end.month, 1)
+    months = []
+    while current <= last:
+        months.append(current)
+        if current.month == 12:
+            current = datetime.date(current.year + 1, 1, 1)
+        else:
+            current = datetime.date(current.year, current.month + 1, 1)
+    return months
+
+
+class DiaryTimeSeries:
+    """Columnar daily series keyed by date_int.
+
+    date_int is an array of ints sorted ascending and every numeric field of
+    the month responses becomes an array of doubles of the same length, with
+    NaN where a day did not report that field.
+    """
+
+    def __init__(self, date_int=None, columns=None):
+        self.date_int = date_int if date_int is not None else array('l')
+        self.columns = columns if columns is not None else {}
+
+    @classmethod
+    def from_days(cls, days):
+        by_date = {}
+        names = set()
+        for day in days:
+            try:
+                key = int(day['date_int'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            values = {}
+            for name, value in day.items():
+                if name == 'date_int':
+                    continue
+                try:
+                    values[name] = float(value)
+                except (TypeError, ValueError):
+                    continue
+            by_date.setdefault(key, {}).update(values)
+            names.update(values)
+
+        ordered = sorted(by_date)
+        series = cls(array('l', ordered))
+        nan = float('nan')
+        for name in sorted(names):
+            series.columns[name] = array('d', (by_date[key].get(name, nan) for key in ordered))
+        return series
+
+    def __len__(self):
+        return len(self.date_int)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def dates(self):
+        return [EPOCH + datetime.timedelta(days=value) for value in self.date_int]
+
 
 #FIXME add method to set default units and make it an optional argument to the constructor
 class Fatsecret:
-    def __init__(self,consumer_key,consumer_secret,verbose=0,cache_name='tokens.dat'):
-        #cache stores tokens and hashes on disk so we avoid
+    """Async three-legged fatsecret client.
+
+    Signed requests go through the app's pooled FatSecretTransport and tokens
+    are persisted in a TokenStore, which is safe to share between threads and
+    processes (unlike the shelve file it replaces). Use as an async context
+    manager, or call authorize()/aclose() yourself:
+
+        async with Fatsecret(key, secret) as fs:
+            days = await fs.food_entries_get_month()
+    """
+
+    def __init__(self,consumer_key,consumer_secret,verbose=0,cache_name='tokens.dat',
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        #cache stores tokens and completed past months on disk so we avoid
         #requesting them every time.
-        self.cache=shelve.open(cache_name,writeback=False)
-        self.verbose=verbose        
-        self.oauth=OAuth1Service(
-                name='fatsecret',
-                consumer_key=consumer_key,
-                consumer_secret=consumer_secret,
-                request_token_url='http://www.fatsecret.com/oauth/request_token',
-                access_token_url='http://www.fatsecret.com/oauth/access_token',
-                authorize_url='http://www.fatsecret.com/oauth/authorize')
+        self.cache=TokenStore(cache_name)
+        self.verbose=verbose
+        self.max_concurrency=max_concurrency
+        self.transport=FatSecretTransport(consumer_key,consumer_secret)
 
         self.access_token = self.cache.get('fatsecret_access_token',None)
         self.access_token_secret = self.cache.get('fatsecret_access_token_secret',None)
         self.request_token =  self.cache.get('fatsecret_request_token',None)
         self.request_token_secret =  self.cache.get('fatsecret_request_token_secret',None)
         self.pin= self.cache.get('fatsecret_pin',None)
-        
-        #If this is our first time running- get new tokens 
-        if (self.need_request_token()):
-            self.get_request_token()
-            got_access_token=self.get_access_token()
-            if( not got_access_token):
+
+    async def __aenter__(self):
+        await self.authorize()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def authorize(self):
+        """If this is our first time running- get new tokens"""
+        if self.need_request_token():
+            await self.get_request_token()
+            got_access_token = await self.get_access_token()
+            if not got_access_token:
                 print("Error: Unable to get access token")
-                    
+        return self.access_token is not None
+
+    async def aclose(self):
+        await self.transport.aclose()
+        self.cache.close()
 
     def dbg_print(self,txt):
         if self.verbose==1:
             print(txt)
 
-    def get_request_token(self):
-        self.request_token,self.request_token_secret = self.oauth.get_request_token(method='GET',params={'oauth_callback':'oob'})
-        authorize_url=self.oauth.get_authorize_url(self.request_token)
+    async def get_request_token(self):
+        response = await self.transport.get(REQUEST_TOKEN_URL, {'oauth_callback': 'oob'})
+        data = dict(parse_qsl(response.text))
+        self.request_token = data.get('oauth_token')
+        self.request_token_secret = data.get('oauth_token_secret')
+        authorize_url = f"{AUTHORIZE_URL}?oauth_token={self.request_token}"
         #the pin you want here is the string that appears after oauth_verifier on the page served
         #by the authorize_url
         print('Visit this URL in your browser then login: ' + authorize_url)
-        self.pin = input('Enter PIN from browser: ')
-        self.cache['fatsecret_request_token']=self.request_token
-        self.cache['fatsecret_request_token_secret']=self.request_token_secret
-        self.cache['fatsecret_pin']=self.pin
-        print("fatsecret_pin is ",self.cache.get('fatsecret_pin'))
+        self.pin = await asyncio.to_thread(input, 'Enter PIN from browser: ')
+        self.cache.update({
+            'fatsecret_request_token': self.request_token,
+            'fatsecret_request_token_secret': self.request_token_secret,
+            'fatsecret_pin': self.pin,
+        })
+        self.dbg_print(f"fatsecret_pin is {self.pin}")
 
     def need_request_token(self):
         #created this method because i'm not clear when request tokens need to be obtained, or how often
-        if (self.request_token==None) or (self.request_token_secret==None) or (self.pin==None):
-            return True
-        else:
-            return False
+        return self.request_token is None or self.request_token_secret is None or self.pin is None
 
-    def get_access_token(self):
-        print("in get_access_token")
-        response=self.oauth.get_access_token('GET',
-                request_token=self.request_token,
-                request_token_secret=self.request_token_secret,
-                params={'oauth_verifier':self.pin})
-        data=response.content
-        print(response.content)
+    async def get_access_token(self):
+        self.dbg_print("in get_access_token")
+        response = await self.transport.get(
+                ACCESS_TOKEN_URL,
+                {'oauth_verifier': self.pin},
+                token=self.request_token,
+                token_secret=self.request_token_secret)
+        data = dict(parse_qsl(response.text))
+        self.dbg_print(data)
         self.access_token=data.get('oauth_token',None)
         self.access_token_secret=data.get('oauth_token_secret',None)
-        self.cache['fatsecret_access_token']=self.access_token
-        self.cache['fatsecret_access_token_secret']=self.access_token_secret
+        self.cache.update({
+            'fatsecret_access_token': self.access_token,
+            'fatsecret_access_token_secret': self.access_token_secret,
+        })
         if not(self.access_token) or not(self.access_token_secret):
             print("access token expired ")
             return False
-        else:
-            return True
+        return True
+
+    async def _call(self, method, params=None):
+        """single signed call on behalf of the authorized user"""
+        content = await self.transport.call(
+                method,
+                params,
+                token=self.access_token,
+                token_secret=self.access_token_secret)
+        self.dbg_print(content)
+        return content
+
+    async def _get_month(self, method, date=None):
+        date = date or datetime.datetime.now()
+        content = await self._call(method, {'date': _date_int(date)})
+        #months without data will still contain a 'month' key, but not a 'day' key
+        #also note that in the response you also get from_date_int and to_date_int keys
+        #that specify the range of dates included in the requested month
+        month = content.get('month') or {}
+        days = month.get('day')
+        if days is None:
+            return None
+        if not isinstance(days, list):
+            days = [days]
+        return days
 
-    
-    def food_get(self,food_id):
+    def _month_cache_key(self, method, month):
+        return f"month:{self.access_token}:{method}:{_date_int(month)}"
+
+    async def _get_cached_month(self, method, month, semaphore):
+        """months that ended before the current one can't change, so they are cached forever"""
+        today = datetime.date.today()
+        is_past = (month.year, month.month) < (today.year, today.month)
+        key = self._month_cache_key(method, month)
+        if is_past:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached['days']
+
+        async with semaphore:
+            days = await self._get_month(method, month)
+        if is_past:
+            self.cache.set(key, {'days': days})
+        return days
+
+    async def _get_months(self, method, start, end):
+        """fetch every month between start and end concurrently, in calendar order"""
+        months = _month_starts(start, end)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *(self._get_cached_month(method, month, semaphore) for month in months))
+        return dict(zip(months, results))
+
+    async def _get_range(self, method, start, end):
+        months = await self._get_months(method, start, end)
+        first, last = _date_int(start), _date_int(end)
+        days = [
+            day
+            for month_days in months.values() if month_days
+            for day in month_days
+            if first <= int(day.get('date_int', -1)) <= last
+        ]
+        return DiaryTimeSeries.from_days(days)
+
+    async def food_get(self,food_id):
         """Returns nutrition information and the corresponding fatsecret information URL for the specified food_id
         food_ids may be obtained by using foods_search()"""
         if food_id is None:
             return None
-        params={'method': 'food.get','food_id':food_id,'format':'json'} 
-        response=self.oauth.get(
-                'http://platform.fatsecret.com/rest/server.api',
-                params=params,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                header_auth=False)
-        return response.content
-
-    def foods_get_favorites(self):
-        params={'method': 'foods.get_favorites','oauth_token': self.access_token,'format':'json'} 
-
-        response=self.oauth.get(
-                'http://platform.fatsecret.com/rest/server.api',
-                params=params,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                header_auth=False)
-        if response.content.get('foods'):
-            return response.content['foods']['food']
-
-    def foods_get_most_eaten(self,meal=None):
-        params={'method': 'foods.get_most_eaten','oauth_token': self.access_token,'format':'json'} 
-        if meal in ['breakfast','lunch','dinner','other']: 
-            params['meal']=meal
+        return await self._call('food.get', {'food_id': food_id})
 
-        response=self.oauth.get(
-                'http://platform.fatsecret.com/rest/server.api',
-                params=params,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                header_auth=False)
-        if response.content.get('foods'):
-            return response.content['foods']['food']
-
-    def foods_get_recently_eaten(self,meal=None):
-        params={'method': 'foods.get_recently_eaten','oauth_token': self.access_token,'format':'json'} 
-        if meal in ['breakfast','lunch','dinner','other']: 
-            params['meal']=meal
+    async def foods_get_favorites(self):
+        content = await self._call('foods.get_favorites')
+        if content.get('foods'):
+            return content['foods']['food']
 
-        response=self.oauth.get(
-                'http://platform.fatsecret.com/rest/server.api',
-                params=params,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                header_auth=False)
+    async def foods_get_most_eaten(self,meal=None):
+        params = {}
+        if meal in MEALS:
+            params['meal']=meal
+        content = await self._call('foods.get_most_eaten', params)
+        if content.get('foods'):
+            return content['foods']['food']
 
-        if response.content.get('foods'):
-            return response.content['foods']['food']
+    async def foods_get_recently_eaten(self,meal=None):
+        params = {}
+        if meal in MEALS:
+            params['meal']=meal
+        content = await self._call('foods.get_recently_eaten', params)
+        if content.get('foods'):
+            return content['foods']['food']
 
-    def foods_search(self,search_expression,page_number=None,max_results=None):
-        params={'method': 'foods.search','oauth_token': self.access_token,'search_expression':search_expression,'format':'json'} 
-        if page_number!=None:
+    async def foods_search(self,search_expression,page_number=None,max_results=None):
+        params={'search_expression':search_expression}
+        if page_number is not None:
             params['page_number'] = page_number
-        if max_results!=None:
+        if max_results is not None:
             params['max_results'] = max_results
+        return await self._call('foods.search', params)
 
-        response=self.oauth.get(
-                'http://platform.fatsecret.com/rest/server.api',
-                params=params,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                header_auth=False)
-        return response.content
-
-    def food_entries_get_month(self,date=datetime.datetime.now()):
-        params={'method': 'food_entries.get_month','format':'json'} 
-        params['date']=int(round(time.mktime(date.timetuple())/60/60/24))
-        response=self.oauth.get(
-                'http://platform.fatsecret.com/rest/server.api',
-                params=params,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                header_auth=False)
-
-        print(response.content)
-        if response.content['month'].get('day'):
-            tmp=response.content['month']['day']
-        else:
-            #months without data will still contain a 'month' key, but not a 'day' key
-            tmp=None
-        #result=[(i['carbohydrate'],i['fat'],i['protein'],i['calories'],i['date_int']) for i in tmp] 
-        return tmp
-
-    
-    def saved_meals_get(self):
-        """Returns a list where each item is formatted like 
+    async def food_entries_get_month(self,date=None):
+        #result=[(i['carbohydrate'],i['fat'],i['protein'],i['calories'],i['date_int']) for i in tmp]
+        return await self._get_month('food_entries.get_month', date)
+
+    async def food_entries_get_months(self,start,end):
+        """food_entries_get_month for every month in [start, end], keyed by first day of month"""
+        return await self._get_months('food_entries.get_month', start, end)
+
+    async def food_entries_get_range(self,start,end):
+        """daily calories/macros between start and end (inclusive) as a DiaryTimeSeries"""
+        return await self._get_range('food_entries.get_month', start, end)
+
+    async def saved_meals_get(self):
+        """Returns a list where each item is formatted like
         {"saved_meal": {"meals": "Lunch,Other", "saved_meal_description": "A high impact energy meal - terrific for the great outdoors!", "saved_meal_id": "1111111", "saved_meal_name": "Power Snack" }"""
-        params={'method': 'saved_meals.get','format':'json'} 
-        response=self.oauth.get(
-                'http://platform.fatsecret.com/rest/server.api',
-                params=params,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                header_auth=False)
-        if response.content.get('saved_meals'):
-            tmp=response.content['saved_meals']['saved_meal']
-        else:
-            tmp=None
-        return tmp
+        content = await self._call('saved_meals.get')
+        if content.get('saved_meals'):
+            return content['saved_meals']['saved_meal']
+        return None
 
-    def weights_get_month(self,date=datetime.datetime.now()):
+    async def weights_get_month(self,date=None):
         """Return date_int and weight in kg for each day in requested month"""
-        params={'method': 'weights.get_month','format':'json'} 
-        params['date']=int(round(time.mktime(date.timetuple())/60/60/24))
-        response=self.oauth.get(
-                'http://platform.fatsecret.com/rest/server.api',
-                params=params,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                header_auth=False)
-        print(response.content)
-        #note that every valid data point has weight_kg and date_int fields but 
+        #note that every valid data point has weight_kg and date_int fields but
         #may also optionally have a weight_comment field
-        #also note that you in response.content you also get from_date_int and to_date_int keys
-        #that specify the range of dates included in the requested month
-        if response.content['month'].get('day'):
-            tmp=response.content['month']['day']
-        else: 
-            tmp=None
-        return tmp
+        return await self._get_month('weights.get_month', date)
+
+    async def weights_get_months(self,start,end):
+        return await self._get_months('weights.get_month', start, end)
 
+    async def weights_get_range(self,start,end):
+        return await self._get_range('weights.get_month', start, end)
 
-    def exercise_entries_get_month(self,date=datetime.datetime.now()):
+    async def exercise_entries_get_month(self,date=None):
         """Return date_int and calories burned for each day in requested month"""
-        params={'method': 'exercise_entries.get_month','format':'json'} 
-        params['date']=int(round(time.mktime(date.timetuple())/60/60/24))
-        response=self.oauth.get(
-                'http://platform.fatsecret.com/rest/server.api',
-                params=params,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                header_auth=False)
-        print(response.content)
-        #note that every valid data point has weight_kg and date_int fields but 
-        #may also optionally have a weight_comment field
-        if response.content['month'].get('day'):
-            tmp=response.content['month']['day']
-        else: 
-            tmp=None
-        return tmp
+        return await self._get_month('exercise_entries.get_month', date)
+
+    async def exercise_entries_get_months(self,start,end):
+        return await self._get_months('exercise_entries.get_month', start, end)
+
+    async def exercise_entries_get_range(self,start,end):
+        return await self._get_range('exercise_entries.get_month', start, end)
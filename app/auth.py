@@ -0,0 +1,51 @@
+import hashlib
+import time
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+
+from .cache import get_shared_cache
+from .config import settings
+from .firebase import get_firebase_auth
+
+
+security = HTTPBearer()
+
+
+def _token_cache_key(token: str) -> str:
+    # Never store raw bearer tokens in the shared cache
+    return f"id_token:{hashlib.sha256(token.encode('utf-8')).hexdigest()}"
+
+
+def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """Verify a Firebase ID token and return the UID.
+
+    Verified tokens are cached in the shared cache (visible to every worker)
+    until ``TOKEN_CACHE_TTL_SECONDS`` or the token's own expiry, whichever
+    comes first.
+    """
+    token = credentials.credentials
+    cache = get_shared_cache()
+    key = _token_cache_key(token)
+
+    user_id = cache.get(key)
+    if user_id:
+        return user_id
+
+    try:
+        auth_client = get_firebase_auth()
+        decoded = auth_client.verify_id_token(token)
+    except Exception as exc:
+        raise HTTPException(status_code=401, detail="Invalid token") from exc
+
+    user_id = decoded.get("uid")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    ttl = settings.TOKEN_CACHE_TTL_SECONDS
+    expires_at = decoded.get("exp")
+    if expires_at:
+        ttl = min(ttl, expires_at - time.time())
+    if ttl > 0:
+        cache.set(key, user_id, ttl)
+    return user_id
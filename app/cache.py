@@ -0,0 +1,186 @@
+"""
+Shared cache tier for FatSecret responses, verified tokens and analyses.
+
+With a single worker an in-process dictionary is enough. When uvicorn runs
+several worker processes, ``SQLiteCache`` keeps entries in a local SQLite
+file (WAL mode) so a value cached by one worker is visible to every other
+worker on the host. Its reads and writes are local file operations done
+inline from async code, so it uses a short busy timeout: a write that
+cannot get the lock quickly is skipped rather than stalling the event
+loop, which only costs a cache miss later.
+
+Shared cache values come back as independent copies with either backend
+(JSON round trip); callers may modify what they get.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from .config import settings
+
+
+def cache_key(namespace: str, *parts: Any) -> str:
+    """Build a fixed-length key from arbitrary JSON-serialisable parts."""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return f"{namespace}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+class MemoryCache:
+    """Per-process LRU cache with per-entry TTL.
+
+    Values are returned by reference. Owners that update entries in place
+    (history stats counters) rely on that; anything handed to other code
+    must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class JSONMemoryCache(MemoryCache):
+    """``MemoryCache`` that stores values JSON-encoded, like ``SQLiteCache``.
+
+    Every ``get`` decodes a fresh copy, so the shared cache behaves the same
+    with both backends and callers cannot alias each other's values.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = super().get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        super().set(key, json.dumps(value, default=str), ttl_seconds)
+
+
+class SQLiteCache:
+    """Cross-process cache stored in a local SQLite file.
+
+    Values are JSON-encoded. Expired rows are ignored on read and purged
+    every ``purge_every`` writes. Lock contention or a database error is
+    treated as a miss on read and skips the write.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 50, purge_every: int = 1000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql: str, params: Tuple[Any, ...] = ()) -> bool:
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(sql, params)
+        except sqlite3.Error as e:
+            print(f"WARNING: Shared cache write skipped: {e}")
+            return False
+        return True
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"WARNING: Shared cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        written = self._write(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, default=str), time.time() + ttl_seconds),
+        )
+        if written:
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self.purge_expired()
+
+    def delete(self, key: str) -> None:
+        self._write("DELETE FROM cache WHERE key = ?", (key,))
+
+    def purge_expired(self) -> None:
+        self._write("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def clear(self) -> None:
+        self._write("DELETE FROM cache")
+
+
+_shared_cache = None
+
+
+def get_shared_cache():
+    """Return the cache selected by ``Settings.CACHE_BACKEND``.
+
+    ``auto`` uses SQLite when more than one worker is configured and an
+    in-process cache otherwise.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        backend = settings.CACHE_BACKEND
+        if backend == "auto":
+            backend = "sqlite" if settings.WORKERS > 1 else "memory"
+        if backend == "sqlite":
+            _shared_cache = SQLiteCache(settings.CACHE_PATH)
+        else:
+            _shared_cache = JSONMemoryCache(settings.CACHE_MAX_ENTRIES)
+    return _shared_cache
@@ -0,0 +1,187 @@
+"""
+Response compression middleware.
+
+Compresses JSON and NDJSON responses with brotli when the client accepts
+it and the ``brotli`` package is installed, and with gzip otherwise.
+Responses below ``minimum_size`` are sent as-is, since compressing them
+costs CPU without saving a network round trip. The gzip level and brotli
+quality can be tuned per route prefix: large, rarely changing payloads
+can afford a higher level, while streamed results use a low one so every
+chunk is flushed promptly. Streamed bodies are compressed chunk by chunk
+with a sync flush after each.
+"""
+import asyncio
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+# Bodies at least this large are compressed in a worker thread.
+THREAD_MINIMUM_SIZE = 256 * 1024
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+class _Compressor:
+    """Incremental gzip or brotli stream."""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=level)
+        else:
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data) if data else b""
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        route_levels: Optional[Dict[str, Dict[str, int]]] = None,
+        compressible_types: Iterable[str] = COMPRESSIBLE_TYPES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+        # Longest prefix first, so the most specific route wins.
+        self.route_levels: List[Tuple[str, Dict[str, int]]] = sorted(
+            (route_levels or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.compressible_types = tuple(compressible_types)
+
+    def choose(self, path: str, accept_encoding: str) -> Optional[Tuple[str, int]]:
+        """The (encoding, level) to use for a request, or ``None`` for identity."""
+        accepted = _accepted_encodings(accept_encoding)
+        levels = self.levels
+        for prefix, overrides in self.route_levels:
+            if path.startswith(prefix):
+                levels = {**levels, **overrides}
+                break
+        wildcard = accepted.get("*", 0.0)
+        for encoding in ("br", "gzip"):
+            if encoding == "br" and brotli is None:
+                continue
+            if accepted.get(encoding, wildcard) > 0 and levels.get(encoding, 0) > 0:
+                return encoding, levels[encoding]
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        choice = self.choose(scope["path"], Headers(scope=scope).get("accept-encoding", ""))
+        if choice is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(send, choice[0], choice[1], self)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    def __init__(self, send: Send, encoding: str, level: int, middleware: CompressionMiddleware):
+        self._send = send
+        self.encoding = encoding
+        self.level = level
+        self.middleware = middleware
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+
+    def _compressible(self, message: Message) -> bool:
+        if message["status"] in (204, 206, 304):
+            return False
+        headers = Headers(raw=message["headers"])
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").lower()
+        return content_type.startswith(self.middleware.compressible_types)
+
+    def _set_headers(self, streaming: bool, length: int = 0) -> None:
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        headers["Content-Encoding"] = self.encoding
+        if streaming:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+        # The compressed bytes differ from the ones the strong ETag names.
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            if not self._compressible(message):
+                self.passthrough = True
+                await self._send(message)
+            return
+        if self.passthrough or message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body:
+                await self._send_whole(message, body)
+                return
+            self.compressor = _Compressor(self.encoding, self.level)
+            self._set_headers(streaming=True)
+            await self._send(self.start)
+
+        await self._send({
+            "type": "http.response.body",
+            "body": self.compressor.compress(body, final=not more_body),
+            "more_body": more_body,
+        })
+
+    async def _send_whole(self, message: Message, body: bytes) -> None:
+        if len(body) >= self.middleware.minimum_size:
+            compressor = _Compressor(self.encoding, self.level)
+            if len(body) >= THREAD_MINIMUM_SIZE:
+                compressed = await asyncio.to_thread(compressor.compress, body, True)
+            else:
+                compressed = compressor.compress(body, True)
+            if len(compressed) < len(body):
+                self._set_headers(streaming=False, length=len(compressed))
+                await self._send(self.start)
+                await self._send({**message, "body": compressed})
+                return
+        MutableHeaders(raw=self.start["headers"]).add_vary_header("Accept-Encoding")
+        await self._send(self.start)
+        await self._send(message)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     # Firebase Configuration
@@ -15,9 +15,65 @@ class Settings(BaseSettings):
     # Google Gemini AI Configuration
     GEMINI_KEY: str = ""
 
+    # Storage backend: "firestore" or "sqlite" (one local database file,
+    # for on-prem deployments and offline benchmarking)
+    STORAGE_BACKEND: str = "firestore"
+    STORAGE_SQLITE_PATH: str = "data/storage.sqlite3"
+
+    # Scan history write-behind queue
+    HISTORY_FLUSH_INTERVAL_MS: int = 250
+    HISTORY_FLUSH_MAX_RECORDS: int = 100
+    HISTORY_MAX_RETRIES: int = 5
+    # History delta sync: a sync re-reads this many seconds before its token,
+    # covering entries still in the write queue when the token was issued
+    HISTORY_SYNC_OVERLAP_SECONDS: int = 60
+    HISTORY_TOMBSTONE_RETENTION_DAYS: int = 30
+    HISTORY_STATS_CACHE_TTL_SECONDS: float = 60.0
+    # Per-user food_id -> latest scan index consulted by the scan routes
+    SCAN_INDEX_MAX_ENTRIES: int = 50000
+    SCAN_INDEX_CACHE_TTL_SECONDS: float = 300.0
+
+    # Readiness probes
+    READINESS_PROBE_INTERVAL_SECONDS: float = 15.0
+    READINESS_PROBE_TIMEOUT_SECONDS: float = 5.0
+    READINESS_MAX_POOL_SATURATION: float = 0.9
+    READINESS_MAX_QUEUE_DEPTH: int = 1000
+
     # Server Configuration
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WORKERS: int = 1
+
+    # Shared cache: "memory" (per process), "sqlite" (shared by all workers
+    # on the host) or "auto" (sqlite when WORKERS > 1)
+    CACHE_BACKEND: str = "auto"
+    CACHE_PATH: str = "cache/shared_cache.sqlite3"
+    CACHE_MAX_ENTRIES: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+    FATSECRET_CACHE_TTL_SECONDS: int = 86400
+    # max-age sent with food details and nutrition responses
+    FOOD_RESPONSE_MAX_AGE_SECONDS: int = 3600
+    # Concurrent upstream fetches per /foods/batch request
+    FOOD_BATCH_CONCURRENCY: int = 8
+    ANALYSIS_CACHE_TTL_SECONDS: int = 86400
+
+    # Local food catalog (SQLite FTS5) in front of FatSecret foods.search
+    FOOD_CATALOG_ENABLED: bool = True
+    FOOD_CATALOG_PATH: str = "cache/food_catalog.sqlite3"
+    FOOD_CATALOG_QUERY_TTL_SECONDS: int = 86400
+
+    # Response compression (brotli is used when the package is installed)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    # Path prefix -> {"gzip": level, "br": quality}; 0 disables compression
+    COMPRESSION_ROUTE_LEVELS: Dict[str, Dict[str, int]] = {
+        "/api/v1/foods/search/stream": {"gzip": 1, "br": 1},
+    }
+
+    # Food name autocomplete
+    SUGGEST_FILL_DELAY_MS: int = 300
     
     # Environment
     ENVIRONMENT: str = "development"
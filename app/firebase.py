@@ -1,11 +1,14 @@
 import json
 import os
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional, Type
 
 from dotenv import load_dotenv
 
-import firebase_admin
-from firebase_admin import credentials, firestore, auth as firebase_auth
+# firebase_admin pulls in google-auth, grpc and the Firestore client, which
+# dominates import time; it is imported on first use instead.
+if TYPE_CHECKING:
+    import firebase_admin
+    from firebase_admin import credentials, firestore, firestore_async
 
 
 load_dotenv()
@@ -20,11 +23,14 @@ FIREBASE_SERVICE_ACCOUNT_FILE = (
 FIREBASE_SERVICE_ACCOUNT_JSON = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
 
 
-firebase_app: Optional[firebase_admin.App] = None
-firestore_client: Optional[firestore.Client] = None
+firebase_app: Optional["firebase_admin.App"] = None
+firestore_client: Optional["firestore.Client"] = None
+async_firestore_client: Optional["firestore_async.AsyncClient"] = None
 
 
-def _load_credentials() -> Optional[credentials.Certificate]:
+def _load_credentials() -> Optional["credentials.Certificate"]:
+    from firebase_admin import credentials
+
     if FIREBASE_SERVICE_ACCOUNT_FILE:
         try:
             return credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_FILE)
@@ -53,12 +59,15 @@ def _load_credentials() -> Optional[credentials.Certificate]:
     return None
 
 
-def _initialize_firebase() -> Optional[firebase_admin.App]:
+def _initialize_firebase() -> Optional["firebase_admin.App"]:
     global firebase_app, firestore_client
 
     if firebase_app:
         return firebase_app
 
+    import firebase_admin
+    from firebase_admin import firestore
+
     credentials_cert = _load_credentials()
     if credentials_cert is None:
         return None
@@ -81,7 +90,7 @@ def _initialize_firebase() -> Optional[firebase_admin.App]:
     return firebase_app
 
 
-def get_firestore_client() -> firestore.Client:
+def get_firestore_client() -> "firestore.Client":
     if not _initialize_firebase() or firestore_client is None:
         raise RuntimeError(
             "Firebase is not configured. Provide FIREBASE_SERVICE_ACCOUNT_* "
@@ -90,15 +99,45 @@ def get_firestore_client() -> firestore.Client:
     return firestore_client
 
 
+def get_async_firestore_client() -> "firestore_async.AsyncClient":
+    """Return the shared ``google.cloud.firestore.AsyncClient``."""
+    global async_firestore_client
+
+    if not _initialize_firebase():
+        raise RuntimeError(
+            "Firebase is not configured. Provide FIREBASE_SERVICE_ACCOUNT_* "
+            "environment variables to enable Firestore access."
+        )
+    if async_firestore_client is None:
+        from firebase_admin import firestore_async
+
+        async_firestore_client = firestore_async.client()
+    return async_firestore_client
+
+
 def get_firebase_auth():
     if not _initialize_firebase():
         raise RuntimeError(
             "Firebase is not configured. Provide FIREBASE_SERVICE_ACCOUNT_* "
             "environment variables to enable Firebase authentication."
         )
+    from firebase_admin import auth as firebase_auth
+
     return firebase_auth
 
 
+def firebase_error() -> Type[Exception]:
+    """Return ``firebase_admin.exceptions.FirebaseError``.
+
+    Meant for ``except firebase_error() as exc:`` clauses, which are only
+    evaluated once an exception is raised, so importing a route module does
+    not load firebase_admin.
+    """
+    from firebase_admin import exceptions
+
+    return exceptions.FirebaseError
+
+
 def get_firebase_api_key() -> str:
     if not FIREBASE_API_KEY:
         raise RuntimeError("FIREBASE_API_KEY must be set in environment variables")
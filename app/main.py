@@ -1,11 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 
-from .firebase import get_firestore_client
+from .compression import CompressionMiddleware
+from .config import settings
+from .responses import ORJSONResponse
 from .routes import users, foods, scan
+from .services.fatsecret import close_fatsecret_service
+from .services.food_suggest import food_suggestions
+from .services.health import dependency_monitor
+from .services.history_queue import history_queue
 
 # Load environment variables
 load_dotenv()
@@ -14,25 +21,27 @@ load_dotenv()
 async def lifespan(app: FastAPI):
     # Startup
     print("Starting Allergen-Aware Recipe Advisor API...")
-    # Test Firebase connection
-    try:
-        db = get_firestore_client()
-        list(db.collections())  # Trigger a simple request
-        print("SUCCESS: Firebase connection successful")
-    except Exception as e:
-        print(f"ERROR: Firebase connection failed: {e}")
+    # The dependency monitor's first storage probe doubles as a background
+    # warmup, so the worker accepts traffic without waiting for a round trip
+    dependency_monitor.start()
+    history_queue.start()
     
     yield
     
     # Shutdown
     print("Shutting down Allergen-Aware Recipe Advisor API...")
+    await dependency_monitor.stop()
+    await history_queue.stop()
+    await food_suggestions.stop()
+    await close_fatsecret_service()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Allergen-Aware Recipe Advisor API",
     description="A FastAPI backend for food allergen analysis using Firebase, FatSecret, and Gemini AI",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -44,6 +53,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        route_levels=settings.COMPRESSION_ROUTE_LEVELS,
+    )
+
 # Include routers with versioned prefixes
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(foods.router, prefix="/api/v1/foods", tags=["foods"])
@@ -60,4 +78,10 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "allergen-aware-recipe-advisor"}
\ No newline at end of file
+    return {"status": "healthy", "service": "allergen-aware-recipe-advisor"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Report dependency status and load from cached background probes."""
+    report = dependency_monitor.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
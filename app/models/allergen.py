@@ -1,7 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
+from .food import FoodDetails
+
 class AllergenProfile(BaseModel):
     id: Optional[str] = None
     user_id: str
@@ -55,3 +57,23 @@ class AllergenAnalysis(BaseModel):
     alternative_suggestions: List[str]
     confidence_score: float  # 0.0 to 1.0
     analysis_details: str
+
+class GroupSafetyRequest(BaseModel):
+    food: FoodDetails
+    # The caller and users who share their allergen profile with the caller
+    user_ids: List[str] = Field(..., min_length=1, max_length=100)
+    use_ai: bool = True
+
+class UserSafetyResult(BaseModel):
+    user_id: str
+    is_safe: bool
+    conflicting_allergens: List[str] = []
+
+class GroupSafetyResponse(BaseModel):
+    food_name: str
+    detected_allergens: List[str]
+    ai_analyzed: bool
+    safe_count: int
+    unsafe_count: int
+    results: List[UserSafetyResult]
+    unknown_user_ids: List[str] = []
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
 class FoodSearchRequest(BaseModel):
@@ -26,6 +27,7 @@ class NutritionInfo(BaseModel):
     trans_fat: Optional[float] = None
     serving_size: Optional[str] = None
     serving_unit: Optional[str] = None
+    basis: Optional[str] = None  # per_serving, per_100g or per_100ml
 
 class FoodDetails(BaseModel):
     food_id: str
@@ -37,13 +39,38 @@ class FoodDetails(BaseModel):
     ingredients: Optional[List[str]] = None
     nutrition: Optional[NutritionInfo] = None
     allergens: Optional[List[str]] = None
+    may_contain: Optional[List[str]] = None
     barcode: Optional[str] = None
 
 class FoodSearchResponse(BaseModel):
     foods: List[FoodItem]
-    total_results: int
+    total_results: Optional[int] = None  # unknown for catalog pages
     page_number: int
     max_results: int
+    source: str = "fatsecret"  # fatsecret or catalog
+    next_cursor: Optional[str] = None
+
+class FoodSuggestion(BaseModel):
+    food_name: str
+    score: float
+
+class FoodSuggestResponse(BaseModel):
+    prefix: str
+    suggestions: List[FoodSuggestion]
+
+class FoodBatchRequest(BaseModel):
+    food_ids: List[str] = Field(..., min_length=1, max_length=100)
+
+class FoodBatchItem(BaseModel):
+    food_id: str
+    food_details: Optional[FoodDetails] = None
+    error: Optional[str] = None
+    cached: bool = False
+
+class FoodBatchResponse(BaseModel):
+    foods: List[FoodBatchItem]
+    found: int
+    failed: int
 
 class BarcodeScanRequest(BaseModel):
     barcode: str
@@ -52,7 +79,19 @@ class VoiceInputRequest(BaseModel):
     text: Optional[str] = None
     audio_base64: Optional[str] = None
 
+class PreviousScan(BaseModel):
+    scan_id: str
+    scan_type: Optional[str] = None
+    food_name: Optional[str] = None
+    scanned_at: Optional[datetime] = None
+    verdict: Optional[str] = None
+    detected_allergens: List[str] = []
+
 class ScanResponse(BaseModel):
     success: bool
     food_details: Optional[FoodDetails] = None
     error_message: Optional[str] = None
+    # History record of this scan; send it as scan_id when posting the
+    # analysis to /users/history
+    scan_id: Optional[str] = None
+    previous_scan: Optional[PreviousScan] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserCreate(BaseModel):
@@ -46,6 +46,8 @@ class UserProfileUpdate(BaseModel):
     name: Optional[str] = None  # For frontend compatibility
     age: Optional[str] = None   # For frontend compatibility
     gender: Optional[str] = None  # For frontend compatibility
+    # Users allowed to include this user in group allergen checks
+    share_allergens_with: Optional[List[str]] = None
 
 class HistoryEntry(BaseModel):
     id: str
@@ -0,0 +1,82 @@
+"""
+Async data access layer over the application's collections.
+
+``Settings.STORAGE_BACKEND`` selects Firestore (the default) or the
+embedded SQLite backend; both implement the interfaces in ``base``.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from ..config import settings
+from .base import (
+    Document,
+    DocumentRepository,
+    FoodScanRepository,
+    HistoryStatsRepository,
+    HistoryTombstoneRepository,
+    StorageError,
+)
+from .firestore import (
+    FirestoreAllergenProfileRepository,
+    FirestoreFoodScanRepository,
+    FirestoreHistoryStatsRepository,
+    FirestoreHistoryTombstoneRepository,
+    FirestoreUserProfileRepository,
+)
+
+
+@dataclass
+class Repositories:
+    user_profiles: DocumentRepository
+    allergen_profiles: DocumentRepository
+    food_scans: FoodScanRepository
+    history_tombstones: HistoryTombstoneRepository
+    history_stats: HistoryStatsRepository
+
+
+_repositories: Optional[Repositories] = None
+
+
+def _sqlite_repositories() -> Repositories:
+    from .sqlite import (
+        SQLiteAllergenProfileRepository,
+        SQLiteDatabase,
+        SQLiteFoodScanRepository,
+        SQLiteHistoryStatsRepository,
+        SQLiteHistoryTombstoneRepository,
+        SQLiteUserProfileRepository,
+    )
+
+    database = SQLiteDatabase(settings.STORAGE_SQLITE_PATH)
+    return Repositories(
+        user_profiles=SQLiteUserProfileRepository(database),
+        allergen_profiles=SQLiteAllergenProfileRepository(database),
+        food_scans=SQLiteFoodScanRepository(database),
+        history_tombstones=SQLiteHistoryTombstoneRepository(database),
+        history_stats=SQLiteHistoryStatsRepository(database),
+    )
+
+
+def get_repositories() -> Repositories:
+    """Return the shared repositories, constructing them on first use."""
+    global _repositories
+    if _repositories is None:
+        if settings.STORAGE_BACKEND == "sqlite":
+            _repositories = _sqlite_repositories()
+        else:
+            _repositories = Repositories(
+                user_profiles=FirestoreUserProfileRepository(),
+                allergen_profiles=FirestoreAllergenProfileRepository(),
+                food_scans=FirestoreFoodScanRepository(),
+                history_tombstones=FirestoreHistoryTombstoneRepository(),
+                history_stats=FirestoreHistoryStatsRepository(),
+            )
+    return _repositories
+
+
+__all__ = [
+    "Document",
+    "Repositories",
+    "StorageError",
+    "get_repositories",
+]
@@ -0,0 +1,60 @@
+"""
+Storage backend interface.
+
+Every backend provides the repositories below. Services and routes only
+use these methods, so a backend can be swapped via
+``Settings.STORAGE_BACKEND`` without touching them.
+"""
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Protocol, Tuple
+
+Document = Tuple[str, Dict[str, Any]]
+
+
+class StorageError(RuntimeError):
+    """Raised when the storage backend fails to read or write."""
+
+
+class DocumentRepository(Protocol):
+    """Documents keyed by id within one collection."""
+
+    async def get(self, doc_id: str) -> Optional[Dict[str, Any]]: ...
+
+    async def get_many(self, doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]: ...
+
+    async def set(self, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None: ...
+
+    async def delete(self, doc_id: str) -> None: ...
+
+    def stream_values(self, field: str) -> AsyncIterator[Any]: ...
+
+    def stream(self) -> AsyncIterator[Document]: ...
+
+    async def ping(self) -> None:
+        """Cheapest possible round trip, used by the readiness probe."""
+
+
+class FoodScanRepository(DocumentRepository, Protocol):
+    async def add_many(self, documents: List[Document]) -> None: ...
+
+    async def list_for_user(self, user_id: str) -> List[Document]: ...
+
+    def stream_for_user(self, user_id: str, page_size: int = ...) -> AsyncIterator[Document]: ...
+
+    async def list_for_user_since(self, user_id: str, since: datetime) -> List[Document]: ...
+
+    async def latest_for_food(self, user_id: str, food_id: str) -> Optional[Document]: ...
+
+    async def delete_for_user(self, user_id: str) -> int: ...
+
+
+class HistoryTombstoneRepository(DocumentRepository, Protocol):
+    async def add(
+        self, user_id: str, entry_id: Optional[str], deleted_at: datetime, expires_at: datetime
+    ) -> None: ...
+
+    async def list_for_user_since(self, user_id: str, since: datetime) -> List[Dict[str, Any]]: ...
+
+
+class HistoryStatsRepository(DocumentRepository, Protocol):
+    async def increment(self, user_id: str, counters: Dict[str, Any]) -> None: ...
@@ -0,0 +1,250 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from ..firebase import get_async_firestore_client
+from .base import Document, StorageError
+
+# Firestore rejects batches with more than 500 writes.
+FIRESTORE_MAX_BATCH = 500
+
+
+class FirestoreDocumentRepository:
+    """Async access to one Firestore collection keyed by document id."""
+
+    collection_name: str = ""
+
+    def _collection(self):
+        return get_async_firestore_client().collection(self.collection_name)
+
+    async def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            snapshot = await self._collection().document(doc_id).get()
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}/{doc_id}: {exc}") from exc
+        if not snapshot.exists:
+            return None
+        return snapshot.to_dict() or {}
+
+    async def get_many(self, doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch several documents in one batched ``get_all`` round trip."""
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not doc_ids:
+            return {}
+        try:
+            collection = self._collection()
+            refs = [collection.document(doc_id) for doc_id in doc_ids]
+            return {
+                snapshot.id: snapshot.to_dict() or {}
+                async for snapshot in get_async_firestore_client().get_all(refs)
+                if snapshot.exists
+            }
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+
+    async def set(self, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None:
+        try:
+            await self._collection().document(doc_id).set(data, merge=merge)
+        except Exception as exc:
+            raise StorageError(f"Failed to write {self.collection_name}/{doc_id}: {exc}") from exc
+
+    async def delete(self, doc_id: str) -> None:
+        try:
+            await self._collection().document(doc_id).delete()
+        except Exception as exc:
+            raise StorageError(f"Failed to delete {self.collection_name}/{doc_id}: {exc}") from exc
+
+    async def stream_values(self, field: str) -> AsyncIterator[Any]:
+        """Yield one field of every document, fetching only that field."""
+        try:
+            async for snapshot in self._collection().select([field]).stream():
+                yield (snapshot.to_dict() or {}).get(field)
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+
+    async def stream(self) -> AsyncIterator[Document]:
+        """Yield every document in the collection."""
+        try:
+            async for snapshot in self._collection().stream():
+                yield snapshot.id, snapshot.to_dict() or {}
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+
+    async def ping(self) -> None:
+        try:
+            async for _ in self._collection().limit(1).stream():
+                pass
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+
+
+class FirestoreUserProfileRepository(FirestoreDocumentRepository):
+    collection_name = "user_profiles"
+
+
+class FirestoreAllergenProfileRepository(FirestoreDocumentRepository):
+    collection_name = "allergen_profiles"
+
+
+class FirestoreFoodScanRepository(FirestoreDocumentRepository):
+    collection_name = "food_scans"
+
+    async def add_many(self, documents: List[Document]) -> None:
+        """Write documents with pre-assigned ids using batched commits."""
+        try:
+            client = get_async_firestore_client()
+            collection = self._collection()
+            for start in range(0, len(documents), FIRESTORE_MAX_BATCH):
+                batch = client.batch()
+                for doc_id, data in documents[start:start + FIRESTORE_MAX_BATCH]:
+                    batch.set(collection.document(doc_id), data)
+                await batch.commit()
+        except Exception as exc:
+            raise StorageError(f"Failed to write {self.collection_name}: {exc}") from exc
+
+    async def list_for_user(self, user_id: str) -> List[Document]:
+        """All of a user's scans, newest first."""
+        try:
+            query = (
+                self._collection()
+                .where("user_id", "==", user_id)
+                .order_by("created_at", direction="DESCENDING")
+            )
+            return [(doc.id, doc.to_dict() or {}) async for doc in query.stream()]
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+
+    async def stream_for_user(self, user_id: str, page_size: int = FIRESTORE_MAX_BATCH) -> AsyncIterator[Document]:
+        """Yield a user's scans newest first, reading ``page_size`` per query.
+
+        Each page starts after the last document of the previous one, so
+        memory use does not grow with the size of the history.
+        """
+        try:
+            query = (
+                self._collection()
+                .where("user_id", "==", user_id)
+                .order_by("created_at", direction="DESCENDING")
+                .limit(page_size)
+            )
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+        last = None
+        while True:
+            try:
+                page = query.start_after(last) if last is not None else query
+                snapshots = [doc async for doc in page.stream()]
+            except Exception as exc:
+                raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+            for doc in snapshots:
+                yield doc.id, doc.to_dict() or {}
+            if len(snapshots) < page_size:
+                return
+            last = snapshots[-1]
+
+    async def list_for_user_since(self, user_id: str, since: datetime) -> List[Document]:
+        """A user's scans created after ``since``, newest first."""
+        try:
+            query = (
+                self._collection()
+                .where("user_id", "==", user_id)
+                .where("created_at", ">", since)
+                .order_by("created_at", direction="DESCENDING")
+            )
+            return [(doc.id, doc.to_dict() or {}) async for doc in query.stream()]
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+
+    async def latest_for_food(self, user_id: str, food_id: str) -> Optional[Document]:
+        """A user's most recent scan of ``food_id``, or ``None``.
+
+        Served by the (user_id, food_id, created_at DESC) composite index.
+        """
+        try:
+            query = (
+                self._collection()
+                .where("user_id", "==", user_id)
+                .where("food_id", "==", food_id)
+                .order_by("created_at", direction="DESCENDING")
+                .limit(1)
+            )
+            for doc in [doc async for doc in query.stream()]:
+                return doc.id, doc.to_dict() or {}
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+        return None
+
+    async def delete_for_user(self, user_id: str) -> int:
+        """Delete every scan of a user with batched commits; returns the count."""
+        deleted = 0
+        try:
+            client = get_async_firestore_client()
+            query = self._collection().where("user_id", "==", user_id)
+            refs = [doc.reference async for doc in query.stream()]
+            for start in range(0, len(refs), FIRESTORE_MAX_BATCH):
+                batch = client.batch()
+                for ref in refs[start:start + FIRESTORE_MAX_BATCH]:
+                    batch.delete(ref)
+                await batch.commit()
+                deleted += len(refs[start:start + FIRESTORE_MAX_BATCH])
+        except Exception as exc:
+            raise StorageError(f"Failed to delete {self.collection_name}: {exc}") from exc
+        return deleted
+
+
+class FirestoreHistoryTombstoneRepository(FirestoreDocumentRepository):
+    """Log of deleted ``food_scans`` entries, read by history delta sync.
+
+    A tombstone without an ``entry_id`` records that the user's whole
+    history was cleared. ``expires_at`` is meant for a Firestore TTL policy.
+    """
+
+    collection_name = "history_tombstones"
+
+    async def add(
+        self, user_id: str, entry_id: Optional[str], deleted_at: datetime, expires_at: datetime
+    ) -> None:
+        data = {
+            "user_id": user_id,
+            "entry_id": entry_id,
+            "deleted_at": deleted_at,
+            "expires_at": expires_at,
+        }
+        try:
+            await self._collection().add(data)
+        except Exception as exc:
+            raise StorageError(f"Failed to write {self.collection_name}: {exc}") from exc
+
+    async def list_for_user_since(self, user_id: str, since: datetime) -> List[Dict[str, Any]]:
+        """A user's tombstones written after ``since``."""
+        try:
+            query = (
+                self._collection()
+                .where("user_id", "==", user_id)
+                .where("deleted_at", ">", since)
+            )
+            return [doc.to_dict() or {} async for doc in query.stream()]
+        except Exception as exc:
+            raise StorageError(f"Failed to read {self.collection_name}: {exc}") from exc
+
+
+def _increments(counters: Dict[str, Any]) -> Dict[str, Any]:
+    from google.cloud import firestore
+
+    return {
+        key: _increments(value) if isinstance(value, dict) else firestore.Increment(value)
+        for key, value in counters.items()
+    }
+
+
+class FirestoreHistoryStatsRepository(FirestoreDocumentRepository):
+    """Per-user scan statistics, one document per user id."""
+
+    collection_name = "history_stats"
+
+    async def increment(self, user_id: str, counters: Dict[str, Any]) -> None:
+        """Atomically add nested integer ``counters`` to the user's document."""
+        from google.cloud import firestore
+
+        data = _increments(counters)
+        data["updated_at"] = firestore.SERVER_TIMESTAMP
+        await self.set(user_id, data, merge=True)
@@ -0,0 +1,390 @@
+"""
+Embedded SQLite storage backend.
+
+Stores the same collections as Firestore in one local database file, for
+on-prem deployments and for benchmarking the API without a network. Each
+collection is a table of JSON documents keyed by id, plus copies of the
+fields its queries filter and sort on as indexed columns. Every thread
+gets its own connection and the database runs in WAL mode. Statements run
+in worker threads via ``asyncio.to_thread``: reads are quick, but a write
+can wait up to the busy timeout for another process's lock, and that
+must not stall the event loop. Statements are fixed per table, so
+sqlite3's statement cache reuses them.
+"""
+import asyncio
+import json
+import os
+import secrets
+import sqlite3
+import string
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .base import Document, StorageError
+
+# Rows fetched per query when streaming a table.
+STREAM_PAGE_SIZE = 500
+# Stay under SQLite's limit on bound parameters per statement.
+_MAX_PARAMS = 500
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(value: Dict[str, Any]) -> Any:
+    if len(value) == 1 and "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+
+def dumps(data: Dict[str, Any]) -> str:
+    """JSON-encode a document, keeping datetimes as datetimes on the way back."""
+    return json.dumps(data, default=_encode, separators=(",", ":"))
+
+
+def loads(raw: str) -> Dict[str, Any]:
+    return json.loads(raw, object_hook=_decode)
+
+
+def column_value(value: Any) -> Any:
+    """Value stored in an indexed column.
+
+    Datetimes become fixed-width UTC ISO strings, so they sort and compare
+    correctly as text; naive datetimes are taken to be UTC, as the app
+    writes them.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return str(value)
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    # Firestore merge semantics: nested maps are merged, other values replaced.
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def _add(target: Dict[str, Any], counters: Dict[str, Any]) -> Dict[str, Any]:
+    for key, value in counters.items():
+        current = target.get(key)
+        if isinstance(value, dict):
+            if not isinstance(current, dict):
+                current = target[key] = {}
+            _add(current, value)
+        else:
+            target[key] = (current if isinstance(current, (int, float)) else 0) + value
+    return target
+
+
+class SQLiteDatabase:
+    """Per-thread connections to the storage database file."""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout_ms / 1000,
+                isolation_level=None,
+                cached_statements=256,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction that takes the write lock up front.
+
+        ``BEGIN IMMEDIATE`` keeps read-modify-write updates (merges,
+        increments) atomic across worker processes.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+class SQLiteDocumentRepository:
+    """One collection stored as a table of JSON documents."""
+
+    table: str = ""
+    # Document fields copied into columns of the same name
+    indexed_fields: Tuple[str, ...] = ()
+    indexes: Tuple[Tuple[str, ...], ...] = ()
+
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+        columns = ("id",) + self.indexed_fields + ("data",)
+        self._insert_sql = (
+            f"INSERT OR REPLACE INTO {self.table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        self._create_schema()
+
+    def _create_schema(self) -> None:
+        extra = "".join(f", {field} TEXT" for field in self.indexed_fields)
+        conn = self.database.connection()
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (id TEXT PRIMARY KEY{extra}, data TEXT NOT NULL)")
+        for fields in self.indexes:
+            name = f"{self.table}_{'_'.join(fields)}"
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {self.table} ({', '.join(fields)})")
+
+    def _row(self, doc_id: str, data: Dict[str, Any]) -> Tuple[Any, ...]:
+        return (doc_id,) + tuple(column_value(data.get(field)) for field in self.indexed_fields) + (dumps(data),)
+
+    def _query(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Tuple[Any, ...]]:
+        try:
+            return self.database.connection().execute(sql, params).fetchall()
+        except sqlite3.Error as exc:
+            raise StorageError(f"Failed to read {self.table}: {exc}") from exc
+
+    def _documents(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Document]:
+        return [(doc_id, loads(raw)) for doc_id, raw in self._query(sql, params)]
+
+    async def _read(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Document]:
+        return await asyncio.to_thread(self._documents, sql, params)
+
+    async def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        documents = await self._read(f"SELECT id, data FROM {self.table} WHERE id = ?", (doc_id,))
+        return documents[0][1] if documents else None
+
+    def _get_many(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(ids), _MAX_PARAMS):
+            chunk = tuple(ids[start:start + _MAX_PARAMS])
+            placeholders = ", ".join("?" for _ in chunk)
+            found.update(self._documents(f"SELECT id, data FROM {self.table} WHERE id IN ({placeholders})", chunk))
+        return found
+
+    async def get_many(self, doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        ids = list(dict.fromkeys(doc_ids))
+        return await asyncio.to_thread(self._get_many, ids) if ids else {}
+
+    def _set(self, doc_id: str, data: Dict[str, Any], merge: bool) -> None:
+        try:
+            with self.database.transaction() as conn:
+                if merge:
+                    row = conn.execute(f"SELECT data FROM {self.table} WHERE id = ?", (doc_id,)).fetchone()
+                    if row is not None:
+                        data = _merge(loads(row[0]), data)
+                conn.execute(self._insert_sql, self._row(doc_id, data))
+        except sqlite3.Error as exc:
+            raise StorageError(f"Failed to write {self.table}/{doc_id}: {exc}") from exc
+
+    async def set(self, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None:
+        await asyncio.to_thread(self._set, doc_id, data, merge)
+
+    def _delete(self, doc_id: str) -> None:
+        try:
+            self.database.connection().execute(f"DELETE FROM {self.table} WHERE id = ?", (doc_id,))
+        except sqlite3.Error as exc:
+            raise StorageError(f"Failed to delete {self.table}/{doc_id}: {exc}") from exc
+
+    async def delete(self, doc_id: str) -> None:
+        await asyncio.to_thread(self._delete, doc_id)
+
+    async def stream(self) -> AsyncIterator[Document]:
+        """Yield every document, one page of rows at a time."""
+        last = ""
+        while True:
+            page = await self._read(
+                f"SELECT id, data FROM {self.table} WHERE id > ? ORDER BY id LIMIT ?",
+                (last, STREAM_PAGE_SIZE),
+            )
+            for document in page:
+                yield document
+            if len(page) < STREAM_PAGE_SIZE:
+                return
+            last = page[-1][0]
+
+    async def stream_values(self, field: str) -> AsyncIterator[Any]:
+        async for _, data in self.stream():
+            yield data.get(field)
+
+    async def ping(self) -> None:
+        await asyncio.to_thread(self._query, "SELECT 1")
+
+
+class SQLiteUserProfileRepository(SQLiteDocumentRepository):
+    table = "user_profiles"
+
+
+class SQLiteAllergenProfileRepository(SQLiteDocumentRepository):
+    table = "allergen_profiles"
+
+
+class SQLiteFoodScanRepository(SQLiteDocumentRepository):
+    table = "food_scans"
+    indexed_fields = ("user_id", "food_id", "created_at")
+    indexes = (("user_id", "created_at"), ("user_id", "food_id", "created_at"))
+
+    def _add_many(self, documents: List[Document]) -> None:
+        try:
+            with self.database.transaction() as conn:
+                conn.executemany(self._insert_sql, [self._row(doc_id, data) for doc_id, data in documents])
+        except sqlite3.Error as exc:
+            raise StorageError(f"Failed to write {self.table}: {exc}") from exc
+
+    async def add_many(self, documents: List[Document]) -> None:
+        """Write documents with pre-assigned ids in one transaction."""
+        await asyncio.to_thread(self._add_many, documents)
+
+    async def list_for_user(self, user_id: str) -> List[Document]:
+        """All of a user's scans, newest first."""
+        return await self._read(
+            "SELECT id, data FROM food_scans WHERE user_id = ? ORDER BY created_at DESC, id DESC",
+            (user_id,),
+        )
+
+    async def stream_for_user(self, user_id: str, page_size: int = STREAM_PAGE_SIZE) -> AsyncIterator[Document]:
+        """Yield a user's scans newest first, reading ``page_size`` rows per query."""
+        page = await asyncio.to_thread(
+            self._query,
+            "SELECT id, data, created_at FROM food_scans WHERE user_id = ? "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (user_id, page_size),
+        )
+        while True:
+            for doc_id, raw, _ in page:
+                yield doc_id, loads(raw)
+            if len(page) < page_size:
+                return
+            last_id, _, last_created = page[-1]
+            # Keyset pagination on (created_at, id); NULL created_at sorts last.
+            if last_created is None:
+                page = await asyncio.to_thread(
+                    self._query,
+                    "SELECT id, data, created_at FROM food_scans WHERE user_id = ? "
+                    "AND created_at IS NULL AND id < ? ORDER BY id DESC LIMIT ?",
+                    (user_id, last_id, page_size),
+                )
+            else:
+                page = await asyncio.to_thread(
+                    self._query,
+                    "SELECT id, data, created_at FROM food_scans WHERE user_id = ? "
+                    "AND (created_at < ? OR (created_at = ? AND id < ?) OR created_at IS NULL) "
+                    "ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (user_id, last_created, last_created, last_id, page_size),
+                )
+
+    async def list_for_user_since(self, user_id: str, since: datetime) -> List[Document]:
+        """A user's scans created after ``since``, newest first."""
+        return await self._read(
+            "SELECT id, data FROM food_scans WHERE user_id = ? AND created_at > ? "
+            "ORDER BY created_at DESC, id DESC",
+            (user_id, column_value(since)),
+        )
+
+    async def latest_for_food(self, user_id: str, food_id: str) -> Optional[Document]:
+        """A user's most recent scan of ``food_id``, or ``None``."""
+        documents = await self._read(
+            "SELECT id, data FROM food_scans WHERE user_id = ? AND food_id = ? "
+            "ORDER BY created_at DESC, id DESC LIMIT 1",
+            (user_id, column_value(food_id)),
+        )
+        return documents[0] if documents else None
+
+    def _delete_for_user(self, user_id: str) -> int:
+        try:
+            with self.database.transaction() as conn:
+                return conn.execute("DELETE FROM food_scans WHERE user_id = ?", (user_id,)).rowcount
+        except sqlite3.Error as exc:
+            raise StorageError(f"Failed to delete {self.table}: {exc}") from exc
+
+    async def delete_for_user(self, user_id: str) -> int:
+        """Delete every scan of a user; returns the count."""
+        return await asyncio.to_thread(self._delete_for_user, user_id)
+
+
+class SQLiteHistoryTombstoneRepository(SQLiteDocumentRepository):
+    """Log of deleted ``food_scans`` entries, read by history delta sync.
+
+    Expired tombstones are purged whenever a new one is written, standing
+    in for Firestore's TTL policy.
+    """
+
+    table = "history_tombstones"
+    indexed_fields = ("user_id", "deleted_at", "expires_at")
+    indexes = (("user_id", "deleted_at"), ("expires_at",))
+
+    async def add(
+        self, user_id: str, entry_id: Optional[str], deleted_at: datetime, expires_at: datetime
+    ) -> None:
+        data = {
+            "user_id": user_id,
+            "entry_id": entry_id,
+            "deleted_at": deleted_at,
+            "expires_at": expires_at,
+        }
+        doc_id = "".join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+        await asyncio.to_thread(self._insert, doc_id, data)
+
+    def _insert(self, doc_id: str, data: Dict[str, Any]) -> None:
+        try:
+            with self.database.transaction() as conn:
+                conn.execute(
+                    "DELETE FROM history_tombstones WHERE expires_at < ?",
+                    (column_value(datetime.now(timezone.utc)),),
+                )
+                conn.execute(self._insert_sql, self._row(doc_id, data))
+        except sqlite3.Error as exc:
+            raise StorageError(f"Failed to write {self.table}: {exc}") from exc
+
+    async def list_for_user_since(self, user_id: str, since: datetime) -> List[Dict[str, Any]]:
+        """A user's tombstones written after ``since``."""
+        return [
+            data
+            for _, data in await self._read(
+                "SELECT id, data FROM history_tombstones WHERE user_id = ? AND deleted_at > ?",
+                (user_id, column_value(since)),
+            )
+        ]
+
+
+class SQLiteHistoryStatsRepository(SQLiteDocumentRepository):
+    """Per-user scan statistics, one document per user id."""
+
+    table = "history_stats"
+
+    async def increment(self, user_id: str, counters: Dict[str, Any]) -> None:
+        """Atomically add nested integer ``counters`` to the user's document."""
+        await asyncio.to_thread(self._increment, user_id, counters)
+
+    def _increment(self, user_id: str, counters: Dict[str, Any]) -> None:
+        try:
+            with self.database.transaction() as conn:
+                row = conn.execute("SELECT data FROM history_stats WHERE id = ?", (user_id,)).fetchone()
+                data = _add(loads(row[0]) if row is not None else {}, counters)
+                data["updated_at"] = datetime.utcnow()
+                conn.execute(self._insert_sql, self._row(user_id, data))
+        except sqlite3.Error as exc:
+            raise StorageError(f"Failed to write {self.table}/{user_id}: {exc}") from exc
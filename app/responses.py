@@ -0,0 +1,79 @@
+"""
+JSON response rendering.
+
+``ORJSONResponse`` is the application's default response class: orjson
+encodes the nested dictionaries returned by the history and nutrition
+endpoints several times faster than the standard library. Routes that
+return large dictionaries can return it directly to skip FastAPI's
+``jsonable_encoder`` pass, and ``json_body`` produces bytes that can be
+cached and sent again as-is, together with an ETag for conditional GETs.
+"""
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+
+def _default(value: Any) -> Any:
+    """Encode types orjson does not handle natively."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_body(content: Any) -> bytes:
+    """Serialize ``content`` to the exact bytes an ``ORJSONResponse`` would send."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class ORJSONResponse(JSONResponse):
+    """``JSONResponse`` rendered with orjson, or the standard library without it."""
+
+    def render(self, content: Any) -> bytes:
+        return json_body(content)
+
+
+def json_bytes_response(body: bytes, status_code: int = 200, **kwargs: Any) -> Response:
+    """Send an already serialized JSON body."""
+    return Response(content=body, status_code=status_code, media_type="application/json", **kwargs)
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag for a response body."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when an ``If-None-Match`` header matches ``etag``.
+
+    Uses the weak comparison RFC 9110 prescribes for ``If-None-Match``,
+    so ``W/"x"`` matches ``"x"``.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -1,111 +1,355 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import base64
+import json
+import sqlite3
 
-from ..services.fatsecret import fatsecret_service
-from ..models.food import FoodSearchRequest, FoodSearchResponse, FoodItem, FoodDetails
+from ..cache import MemoryCache, get_shared_cache
+from ..config import settings
+from ..responses import etag_matches, json_body, json_bytes_response, make_etag
+from ..services.fatsecret import FATSECRET_MAX_PAGE_SIZE, get_fatsecret_service, parse_search_results
+from ..services.food_catalog import FoodCatalog, get_food_catalog
+from ..services.food_suggest import food_suggestions
+from ..models.food import (
+    FoodSearchRequest,
+    FoodSearchResponse,
+    FoodItem,
+    FoodDetails,
+    FoodBatchRequest,
+    FoodBatchItem,
+    FoodBatchResponse,
+    FoodSuggestion,
+    FoodSuggestResponse,
+)
+from ..utils.food_details import normalize_food_details
 
 router = APIRouter()
 
+# Serialized bodies of food details and nutrition responses with their
+# ETags, so a repeated lookup is sent without re-encoding. The ETags are
+# also kept in the shared cache, letting any worker answer a conditional
+# GET with 304 before the body has been built in its own process.
+_response_bodies = MemoryCache(max_entries=5000)
+
+def _catalog() -> Optional[FoodCatalog]:
+    return get_food_catalog() if settings.FOOD_CATALOG_ENABLED else None
+
+
+def _catalog_page(
+    catalog: FoodCatalog, query: str, max_results: int, page_number: int
+) -> Optional[List[Dict[str, Any]]]:
+    local = catalog.search(query, max_results, offset=page_number * max_results)
+    if page_number or len(local) >= max_results or (local and catalog.was_searched(query)):
+        return local
+    return None
+
+
+async def _search_catalog(
+    catalog: FoodCatalog, query: str, max_results: int, page_number: int = 0
+) -> Optional[List[FoodItem]]:
+    """Serve a search page locally when the catalog can answer it.
+
+    A first page is served when the catalog has a full page of matches, or
+    when this query was already fetched from FatSecret and its results
+    stored. Later pages continue a listing the catalog started.
+    """
+    try:
+        local = await asyncio.to_thread(_catalog_page, catalog, query, max_results, page_number)
+    except sqlite3.Error as e:
+        print(f"WARNING: Food catalog search failed, using FatSecret: {e}")
+        return None
+    return None if local is None else [FoodItem(**food) for food in local]
+
+
+def _store_in_catalog(catalog: FoodCatalog, foods: List[Dict[str, Any]], query: Optional[str] = None) -> None:
+    catalog.store_in_background(foods, query)
+
+
+def _food_item(food: Dict[str, Any]) -> FoodItem:
+    return FoodItem(
+        food_id=food.get("food_id", ""),
+        food_name=food.get("food_name", ""),
+        brand_name=food.get("brand_name"),
+        food_type=food.get("food_type"),
+        food_url=food.get("food_url"),
+        food_description=food.get("food_description")
+    )
+
+
+def _encode_cursor(query: str, max_results: int, page_number: int, source: str = "fatsecret") -> str:
+    raw = json.dumps([query, max_results, page_number, source], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int, int, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        decoded = json.loads(raw)
+    except (ValueError, TypeError):
+        decoded = None
+    # Cursors issued before the source was recorded have three items
+    if isinstance(decoded, list) and len(decoded) == 3:
+        decoded = decoded + ["fatsecret"]
+    if isinstance(decoded, list) and len(decoded) == 4:
+        query, max_results, page_number, source = decoded
+        if (
+            isinstance(query, str)
+            and query
+            and type(max_results) is int
+            and type(page_number) is int
+            and 1 <= max_results <= FATSECRET_MAX_PAGE_SIZE
+            and page_number >= 0
+            and source in ("fatsecret", "catalog")
+        ):
+            return query, max_results, page_number, source
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/search", response_model=FoodSearchResponse)
 async def search_foods(
-    query: str = Query(..., description="Food name to search for"),
-    max_results: int = Query(10, ge=1, le=50, description="Maximum number of results to return")
+    query: Optional[str] = Query(None, description="Food name to search for"),
+    max_results: int = Query(10, ge=1, le=FATSECRET_MAX_PAGE_SIZE, description="Maximum number of results per page"),
+    page_number: int = Query(0, ge=0, description="Zero-based page of results"),
+    cursor: Optional[str] = Query(None, description="next_cursor of a previous page; replaces the other parameters")
 ):
-    """Search for foods by name using FatSecret API."""
+    """Search for foods by name, from the local catalog when possible and FatSecret otherwise.
+
+    Pages are cached upstream results; when a page has a successor it is
+    fetched in the background, so following ``next_cursor`` is a cache hit.
+    A listing the catalog starts is paged through the catalog by offset, in
+    its own ranking, and never mixed with FatSecret pages; its
+    ``total_results`` is unknown and left out.
+    """
+    source = "fatsecret"
+    if cursor is not None:
+        query, max_results, page_number, source = _decode_cursor(cursor)
+    elif not query:
+        raise HTTPException(status_code=422, detail="query or cursor is required")
+
+    catalog = _catalog()
+    if catalog is not None and (page_number == 0 or source == "catalog"):
+        local_foods = await _search_catalog(catalog, query, max_results, page_number if source == "catalog" else 0)
+        if local_foods is not None:
+            next_cursor = None
+            if len(local_foods) >= max_results:
+                next_cursor = _encode_cursor(query, max_results, page_number + 1, "catalog")
+            return FoodSearchResponse(
+                foods=local_foods,
+                total_results=None,
+                page_number=page_number,
+                max_results=max_results,
+                source="catalog",
+                next_cursor=next_cursor
+            )
+
     try:
-        result = await fatsecret_service.search_foods(query, max_results)
+        service = get_fatsecret_service()
+        result = await service.search_foods(query, max_results, page_number)
         
         # Parse FatSecret response and convert to our format
-        foods = []
-        if "foods" in result and "food" in result["foods"]:
-            food_list = result["foods"]["food"]
-            if not isinstance(food_list, list):
-                food_list = [food_list]
-            
-            for food in food_list:
-                food_item = FoodItem(
-                    food_id=food.get("food_id", ""),
-                    food_name=food.get("food_name", ""),
-                    brand_name=food.get("brand_name"),
-                    food_type=food.get("food_type"),
-                    food_url=food.get("food_url"),
-                    food_description=food.get("food_description")
-                )
-                foods.append(food_item)
+        food_list, total_results = parse_search_results(result)
+        foods = [_food_item(food) for food in food_list]
+        for food_item in foods:
+            food_suggestions.record_lookup(food_item.food_name, 0.0)
+
+        if catalog is not None:
+            _store_in_catalog(catalog, food_list, query if page_number == 0 else None)
+
+        next_cursor = None
+        if food_list and (page_number + 1) * max_results < total_results:
+            service.prefetch_search(query, max_results, page_number + 1)
+            next_cursor = _encode_cursor(query, max_results, page_number + 1)
         
         return FoodSearchResponse(
             foods=foods,
-            total_results=len(foods),
-            page_number=0,
-            max_results=max_results
+            total_results=total_results,
+            page_number=page_number,
+            max_results=max_results,
+            next_cursor=next_cursor
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Food search failed: {str(e)}")
 
-@router.get("/{food_id}", response_model=FoodDetails)
-async def get_food_details(food_id: str):
-    """Get detailed information about a specific food."""
+
+async def _stream_search(query: str, limit: int) -> AsyncIterator[str]:
+    service = get_fatsecret_service()
+    catalog = _catalog()
+    page_size = min(limit, FATSECRET_MAX_PAGE_SIZE)
+    page_number = 0
+    sent = 0
+    # The next page is requested before the current one is written out, so
+    # upstream latency overlaps with the client reading.
+    pending: Optional[asyncio.Task] = asyncio.create_task(service.search_foods(query, page_size, 0))
     try:
-        result = await fatsecret_service.get_food_details(food_id)
-        
-        # Parse FatSecret response
-        food_data = result.get("food", {})
-        
-        # Extract nutrition information
-        nutrition_data = {}
-        if "servings" in food_data and "serving" in food_data["servings"]:
-            serving = food_data["servings"]["serving"]
-            if not isinstance(serving, list):
-                serving = [serving]
-            
-            # Use the first serving for nutrition data
-            if serving:
-                nutrition_data = {
-                    "calories": float(serving[0].get("calories", 0)),
-                    "protein": float(serving[0].get("protein", 0)),
-                    "carbohydrates": float(serving[0].get("carbohydrate", 0)),
-                    "fat": float(serving[0].get("fat", 0)),
-                    "fiber": float(serving[0].get("fiber", 0)),
-                    "sugar": float(serving[0].get("sugar", 0)),
-                    "sodium": float(serving[0].get("sodium", 0)),
-                    "cholesterol": float(serving[0].get("cholesterol", 0)),
-                    "saturated_fat": float(serving[0].get("saturated_fat", 0)),
-                    "serving_size": serving[0].get("serving_size"),
-                    "serving_unit": serving[0].get("measurement_description")
-                }
-        
-        # Extract ingredients if available
-        ingredients = []
-        if "ingredients" in food_data:
-            ingredients_text = food_data["ingredients"]
-            if ingredients_text:
-                # Simple parsing - in production, you'd want more sophisticated parsing
-                ingredients = [ingredient.strip() for ingredient in ingredients_text.split(",")]
-        
-        food_details = FoodDetails(
-            food_id=food_data.get("food_id", food_id),
-            food_name=food_data.get("food_name", ""),
-            brand_name=food_data.get("brand_name"),
-            food_type=food_data.get("food_type"),
-            food_url=food_data.get("food_url"),
-            food_description=food_data.get("food_description"),
-            ingredients=ingredients,
-            nutrition=nutrition_data,
-            allergens=[]  # Would need additional processing to extract allergens
-        )
-        
-        return food_details
-        
+        while pending is not None:
+            try:
+                result = await pending
+            except Exception as e:
+                yield json.dumps({"error": f"Food search failed: {e}"}) + "\n"
+                return
+            food_list, total_results = parse_search_results(result)
+            page_number += 1
+            pending = None
+            if food_list and page_number * page_size < min(total_results, limit):
+                pending = asyncio.create_task(service.search_foods(query, page_size, page_number))
+
+            if catalog is not None:
+                _store_in_catalog(catalog, food_list, query if page_number == 1 else None)
+            for food in food_list[:limit - sent]:
+                yield _food_item(food).model_dump_json() + "\n"
+            sent = min(limit, sent + len(food_list))
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+@router.get("/search/stream")
+async def stream_search_foods(
+    query: str = Query(..., description="Food name to search for"),
+    limit: int = Query(200, ge=1, le=1000, description="Maximum number of results to stream")
+):
+    """Stream up to ``limit`` search results as NDJSON, one food per line."""
+    return StreamingResponse(_stream_search(query, limit), media_type="application/x-ndjson")
+
+@router.get("/suggest", response_model=FoodSuggestResponse)
+async def suggest_foods(
+    prefix: str = Query(..., min_length=1, description="What the user has typed so far"),
+    limit: int = Query(8, ge=1, le=20, description="Maximum number of suggestions")
+):
+    """Autocomplete food names from the in-memory index, most scanned first."""
+    suggestions = food_suggestions.suggest(prefix, limit)
+    return FoodSuggestResponse(
+        prefix=prefix,
+        suggestions=[
+            FoodSuggestion(food_name=name, score=score) for name, score in suggestions
+        ]
+    )
+
+def _food_details_from_result(food_id: str, result: Dict[str, Any]) -> FoodDetails:
+    """Convert a FatSecret ``food.get`` response, keeping the food in the catalog."""
+    food_data = result.get("food", {})
+    catalog = _catalog()
+    if catalog is not None and food_data:
+        _store_in_catalog(catalog, [food_data])
+    return normalize_food_details(result, food_id)
+
+
+def _batch_item(food_id: str, result: Dict[str, Any], cached: bool) -> FoodBatchItem:
+    try:
+        food_details = _food_details_from_result(food_id, result)
+        food_suggestions.record_lookup(food_details.food_name)
+        return FoodBatchItem(food_id=food_id, food_details=food_details, cached=cached)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get food details: {str(e)}")
+        return FoodBatchItem(food_id=food_id, error=f"Failed to get food details: {str(e)}")
+
+
+@router.post("/batch", response_model=FoodBatchResponse)
+async def get_food_details_batch(request: FoodBatchRequest):
+    """Get details for many foods in one request.
+
+    Duplicate ids are fetched once. Foods already in the shared cache are
+    answered directly and the rest are fetched concurrently, at most
+    ``FOOD_BATCH_CONCURRENCY`` at a time; a food that cannot be fetched is
+    reported in its item's ``error`` without failing the batch.
+    """
+    service = get_fatsecret_service()
+    food_ids = list(dict.fromkeys(food_id.strip() for food_id in request.food_ids if food_id.strip()))
+
+    items: Dict[str, FoodBatchItem] = {}
+    missing: List[str] = []
+    for food_id in food_ids:
+        cached = service.cached_food_details(food_id)
+        if cached is None:
+            missing.append(food_id)
+        else:
+            items[food_id] = _batch_item(food_id, cached, cached=True)
+
+    semaphore = asyncio.Semaphore(settings.FOOD_BATCH_CONCURRENCY)
+
+    async def fetch(food_id: str) -> FoodBatchItem:
+        async with semaphore:
+            try:
+                result = await service.get_food_details(food_id)
+            except Exception as e:
+                return FoodBatchItem(food_id=food_id, error=str(e))
+        return _batch_item(food_id, result, cached=False)
+
+    for item in await asyncio.gather(*(fetch(food_id) for food_id in missing)):
+        items[item.food_id] = item
+
+    foods = [items[food_id] for food_id in food_ids]
+    return FoodBatchResponse(
+        foods=foods,
+        found=sum(1 for item in foods if item.food_details is not None),
+        failed=sum(1 for item in foods if item.error is not None)
+    )
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.FOOD_RESPONSE_MAX_AGE_SECONDS}",
+    }
+
+
+async def _conditional_response(
+    key: str,
+    if_none_match: Optional[str],
+    load: Callable[[], Awaitable[Tuple[Any, Any]]],
+) -> Tuple[Response, Any]:
+    """Serve ``key`` from the body cache, as a 304 when the client's copy is current.
+
+    ``load`` is only awaited on a miss; it returns the content and a value
+    to keep alongside it, which is returned with the response (``None``
+    when the response is a 304 answered from the shared ETag alone).
+    """
+    entry = _response_bodies.get(key)
+    if entry is None:
+        etag = get_shared_cache().get(f"etag:{key}")
+        if etag is not None and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=_cache_headers(etag)), None
+        content, extra = await load()
+        body = json_body(content)
+        entry = (body, make_etag(body), extra)
+        _response_bodies.set(key, entry, settings.FATSECRET_CACHE_TTL_SECONDS)
+        get_shared_cache().set(f"etag:{key}", entry[1], settings.FATSECRET_CACHE_TTL_SECONDS)
+
+    body, etag, extra = entry
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=_cache_headers(etag)), extra
+    return json_bytes_response(body, headers=_cache_headers(etag)), extra
+
+
+@router.get("/{food_id}", response_model=FoodDetails)
+async def get_food_details(food_id: str, if_none_match: Optional[str] = Header(None)):
+    """Get detailed information about a specific food.
+
+    Responses carry an ETag and ``Cache-Control``; a matching
+    ``If-None-Match`` is answered with 304.
+    """
+    async def load() -> Tuple[Dict[str, Any], str]:
+        try:
+            result = await get_fatsecret_service().get_food_details(food_id)
+            food_details = _food_details_from_result(food_id, result)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to get food details: {str(e)}")
+        return food_details.model_dump(mode="json"), food_details.food_name
+
+    response, food_name = await _conditional_response(f"details:{food_id}", if_none_match, load)
+    if food_name is not None:
+        food_suggestions.record_lookup(food_name)
+    return response
 
 @router.get("/nutrition/{food_id}")
-async def get_food_nutrition(food_id: str):
+async def get_food_nutrition(food_id: str, if_none_match: Optional[str] = Header(None)):
     """Get detailed nutrition information for a specific food."""
-    try:
-        result = await fatsecret_service.get_food_nutrition(food_id)
-        return result
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get nutrition info: {str(e)}")
+    async def load() -> Tuple[Dict[str, Any], None]:
+        try:
+            return await get_fatsecret_service().get_food_nutrition(food_id), None
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to get nutrition info: {str(e)}")
+
+    response, _ = await _conditional_response(f"nutrition:{food_id}", if_none_match, load)
+    return response
@@ -1,42 +1,41 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import asyncio
 import base64
 import io
 from typing import Optional
 
-from ..services.fatsecret import fatsecret_service
-from ..services.gemini import gemini_service
-from ..firebase import get_firestore_client, get_firebase_auth
-from ..models.food import ScanResponse, FoodDetails, BarcodeScanRequest, VoiceInputRequest
-from ..models.allergen import AllergenAnalysis
+from ..services.fatsecret import get_fatsecret_service, parse_search_results
+from ..services.gemini import get_gemini_service
+from ..auth import get_current_user_id
+from ..repositories import StorageError, get_repositories
+from ..models.food import ScanResponse, FoodDetails, BarcodeScanRequest, VoiceInputRequest, PreviousScan
+from ..models.allergen import (
+    AllergenAnalysis,
+    GroupSafetyRequest,
+    GroupSafetyResponse,
+    UserSafetyResult,
+)
+from ..services.food_suggest import food_suggestions
+from ..services.history_queue import save_scan_to_history
+from ..services.profile_matrix import profile_matrix
+from ..services.scan_index import scan_index
+from ..utils.food_details import analysis_input, normalize_food_details
+from ..utils.allergens import custom_allergen_registry, decode_mask, detect_allergens, encode_allergen_tags
 
 router = APIRouter()
-security = HTTPBearer()
-
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Validate Firebase ID token and return the user ID."""
-    token = credentials.credentials
-    try:
-        auth_client = get_firebase_auth()
-        decoded = auth_client.verify_id_token(token)
-        user_id = decoded.get("uid")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user_id
-    except Exception as exc:
-        raise HTTPException(status_code=401, detail="Invalid token") from exc
 
 async def get_user_allergens(user_id: str) -> dict:
     """Get user's allergen profile."""
-    db = get_firestore_client()
     try:
-        doc = db.collection("allergen_profiles").document(user_id).get()
-        if doc.exists:
-            return doc.to_dict() or {}
-        return {}
+        return await get_repositories().allergen_profiles.get(user_id) or {}
     except Exception:
         return {}
 
+async def previous_scan(user_id: str, food_id: Optional[str]) -> Optional[PreviousScan]:
+    """The user's last scan of this food, looked up alongside the fresh one."""
+    summary = await scan_index.previous_scan(user_id, food_id)
+    return PreviousScan(**summary) if summary else None
+
 @router.post("/image", response_model=ScanResponse)
 async def scan_image(
     file: UploadFile = File(...),
@@ -66,21 +65,27 @@ async def scan_image(
         # Get user's allergen profile
         user_allergens = await get_user_allergens(user_id)
         
-        # Analyze for allergens using Gemini AI
-        analysis = await gemini_service.analyze_allergens(user_allergens, identified_food)
+        # Analyze for allergens using Gemini AI. Image recognition does not
+        # resolve a real food id yet, so there is no earlier scan to look up.
+        food_id = "image_scan_001"
+        analysis = await get_gemini_service().analyze_allergens(user_allergens, identified_food)
+        previous = None
         
         # Create food details
         food_details = FoodDetails(
-            food_id="image_scan_001",
+            food_id=food_id,
             food_name=identified_food["food_name"],
             ingredients=identified_food["ingredients"],
             nutrition=identified_food["nutrition"]
         )
+        scan_id = await save_scan_to_history(user_id, "image", food_details.dict(), analysis)
         
         return ScanResponse(
             success=True,
             food_details=food_details,
-            error_message=None
+            error_message=None,
+            scan_id=scan_id or None,
+            previous_scan=previous
         )
         
     except Exception as e:
@@ -98,7 +103,7 @@ async def scan_barcode(
     """Scan a barcode to identify food and analyze for allergens."""
     try:
         # Search for food by barcode using FatSecret
-        result = await fatsecret_service.search_by_barcode(barcode_data.barcode)
+        result = await get_fatsecret_service().search_by_barcode(barcode_data.barcode)
         
         if "food_id" not in result:
             return ScanResponse(
@@ -109,32 +114,21 @@ async def scan_barcode(
         
         # Get detailed food information
         food_id = result["food_id"]
-        food_details_result = await fatsecret_service.get_food_details(food_id)
-        
-        # Parse food details
-        food_data = food_details_result.get("food", {})
-        
-        # Extract ingredients
-        ingredients = []
-        if "ingredients" in food_data and food_data["ingredients"]:
-            ingredients = [ingredient.strip() for ingredient in food_data["ingredients"].split(",")]
-        
-        # Create food details object
-        food_details = FoodDetails(
-            food_id=food_data.get("food_id", food_id),
-            food_name=food_data.get("food_name", ""),
-            brand_name=food_data.get("brand_name"),
-            food_type=food_data.get("food_type"),
-            food_url=food_data.get("food_url"),
-            food_description=food_data.get("food_description"),
-            ingredients=ingredients,
-            barcode=barcode_data.barcode
+        food_details_result, previous = await asyncio.gather(
+            get_fatsecret_service().get_food_details(food_id),
+            previous_scan(user_id, food_id),
         )
         
+        food_details = normalize_food_details(food_details_result, food_id, barcode=barcode_data.barcode)
+        food_suggestions.record_scan(food_details.food_id, food_details.food_name)
+        scan_id = await save_scan_to_history(user_id, "barcode", food_details.dict())
+        
         return ScanResponse(
             success=True,
             food_details=food_details,
-            error_message=None
+            error_message=None,
+            scan_id=scan_id or None,
+            previous_scan=previous
         )
         
     except Exception as e:
@@ -167,20 +161,9 @@ async def scan_voice(
             )
         
         # Search for food using the transcribed text
-        search_result = await fatsecret_service.search_foods(text, max_results=1)
-        
-        if "foods" not in search_result or "food" not in search_result["foods"]:
-            return ScanResponse(
-                success=False,
-                food_details=None,
-                error_message="No food found for the given description"
-            )
-        
-        # Get the first result
-        food_list = search_result["foods"]["food"]
-        if not isinstance(food_list, list):
-            food_list = [food_list]
+        search_result = await get_fatsecret_service().search_foods(text, max_results=1)
         
+        food_list, _ = parse_search_results(search_result)
         if not food_list:
             return ScanResponse(
                 success=False,
@@ -190,31 +173,21 @@ async def scan_voice(
         
         # Get detailed information
         food_id = food_list[0]["food_id"]
-        food_details_result = await fatsecret_service.get_food_details(food_id)
-        
-        # Parse food details
-        food_data = food_details_result.get("food", {})
-        
-        # Extract ingredients
-        ingredients = []
-        if "ingredients" in food_data and food_data["ingredients"]:
-            ingredients = [ingredient.strip() for ingredient in food_data["ingredients"].split(",")]
-        
-        # Create food details object
-        food_details = FoodDetails(
-            food_id=food_data.get("food_id", food_id),
-            food_name=food_data.get("food_name", ""),
-            brand_name=food_data.get("brand_name"),
-            food_type=food_data.get("food_type"),
-            food_url=food_data.get("food_url"),
-            food_description=food_data.get("food_description"),
-            ingredients=ingredients
+        food_details_result, previous = await asyncio.gather(
+            get_fatsecret_service().get_food_details(food_id),
+            previous_scan(user_id, food_id),
         )
         
+        food_details = normalize_food_details(food_details_result, food_id)
+        food_suggestions.record_scan(food_details.food_id, food_details.food_name)
+        scan_id = await save_scan_to_history(user_id, "voice", food_details.dict())
+        
         return ScanResponse(
             success=True,
             food_details=food_details,
-            error_message=None
+            error_message=None,
+            scan_id=scan_id or None,
+            previous_scan=previous
         )
         
     except Exception as e:
@@ -235,14 +208,10 @@ async def analyze_food_allergens(
         user_allergens = await get_user_allergens(user_id)
         
         # Prepare food information for analysis
-        food_info = {
-            "food_name": food_details.food_name,
-            "ingredients": food_details.ingredients or [],
-            "nutrition": food_details.nutrition.dict() if food_details.nutrition else {}
-        }
+        food_info = analysis_input(food_details)
         
         # Analyze using Gemini AI
-        analysis_result = await gemini_service.analyze_allergens(user_allergens, food_info)
+        analysis_result = await get_gemini_service().analyze_allergens(user_allergens, food_info)
         
         # Convert to AllergenAnalysis model
         allergen_analysis = AllergenAnalysis(
@@ -261,3 +230,77 @@ async def analyze_food_allergens(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Allergen analysis failed: {str(e)}")
+
+
+@router.post("/analyze/group", response_model=GroupSafetyResponse)
+async def analyze_food_for_group(
+    request: GroupSafetyRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Check one food against several users' allergen profiles in a single pass.
+
+    Only the caller and users whose profile lists the caller in
+    ``share_allergens_with`` may be checked.
+    """
+    food = request.food
+    others = [uid for uid in dict.fromkeys(request.user_ids) if uid != user_id]
+    try:
+        profiles = await get_repositories().user_profiles.get_many(others)
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Group allergen analysis failed: {exc}")
+    forbidden = [
+        uid for uid in others
+        if user_id not in (profiles.get(uid) or {}).get("share_allergens_with", [])
+    ]
+    if forbidden:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Not authorised to check allergen profiles of: {', '.join(forbidden)}",
+        )
+
+    try:
+        await profile_matrix.ensure_fresh()
+        await profile_matrix.load_missing(request.user_ids)
+
+        # Analyze the food once: local keyword detection plus declared tags...
+        food_mask = detect_allergens(
+            [food.food_name, food.food_description or "", *(food.ingredients or [])],
+            custom_allergen_registry.names(),
+        )
+        # Precautionary "may contain" warnings count as a conflict too
+        food_mask |= encode_allergen_tags([*(food.allergens or []), *(food.may_contain or [])])
+
+        # ...and at most one profile-independent Gemini call
+        ai_analyzed = False
+        if request.use_ai:
+            try:
+                analysis_result = await get_gemini_service().analyze_allergens({}, analysis_input(food))
+                food_mask |= encode_allergen_tags(analysis_result.get("detected_allergens", []))
+                ai_analyzed = True
+            except Exception as exc:
+                print(f"WARNING: Group analysis continuing without Gemini: {exc}")
+
+        checks = profile_matrix.evaluate(food_mask, request.user_ids)
+        results = [
+            UserSafetyResult(
+                user_id=check.user_id,
+                is_safe=check.is_safe,
+                conflicting_allergens=decode_mask(check.conflicting_mask),
+            )
+            for check in checks
+        ]
+        unknown = [uid for uid in request.user_ids if uid not in profile_matrix]
+        safe_count = sum(1 for result in results if result.is_safe)
+
+        return GroupSafetyResponse(
+            food_name=food.food_name,
+            detected_allergens=decode_mask(food_mask),
+            ai_analyzed=ai_analyzed,
+            safe_count=safe_count,
+            unsafe_count=len(results) - safe_count,
+            results=results,
+            unknown_user_ids=unknown,
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Group allergen analysis failed: {str(e)}")
@@ -1,22 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from datetime import datetime
-from typing import Any, Dict, List
-
-import requests
-from firebase_admin import exceptions as firebase_exceptions
-from google.cloud import firestore as g_firestore
-
-from ..firebase import get_firestore_client, get_firebase_auth, get_firebase_api_key
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import asyncio
+import base64
+
+from ..auth import get_current_user_id
+from ..config import settings
+from ..firebase import get_firebase_auth, get_firebase_api_key, firebase_error
 from ..models.user import UserCreate, UserLogin, UserProfileUpdate
 from ..models.allergen import AllergenProfile, AllergenProfileUpdate
+from ..services.profile_matrix import profile_matrix
+from ..services.history_queue import history_queue
+from ..services.history_stats import history_stats, summarize
+from ..services import history_transfer
+from ..services.scan_index import scan_index
+from ..repositories import StorageError, get_repositories
+from ..responses import ORJSONResponse
 
 
 router = APIRouter()
-security = HTTPBearer()
 
 
 def _sign_in_with_password(email: str, password: str) -> Dict[str, Any]:
+    import requests
+
     api_key = get_firebase_api_key()
     url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={api_key}"
     payload = {
@@ -68,31 +76,19 @@ def _build_profile_response(profile: Dict[str, Any]) -> Dict[str, Any]:
         "phone": profile.get("phone"),
         "date_of_birth": profile.get("date_of_birth"),
         "emergency_contact": profile.get("emergency_contact"),
+        "share_allergens_with": profile.get("share_allergens_with") or [],
     }
 
 
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Verify Firebase ID token and return the UID."""
-    token = credentials.credentials
-    try:
-        auth_client = get_firebase_auth()
-        decoded = auth_client.verify_id_token(token)
-        user_id = decoded.get("uid")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user_id
-    except (firebase_exceptions.FirebaseError, ValueError) as exc:
-        raise HTTPException(status_code=401, detail="Invalid token") from exc
-
-
 @router.post("/register", response_model=dict)
 async def register(user_data: UserCreate):
     """Register a new user using Firebase Auth and initialise profile."""
     auth_client = get_firebase_auth()
-    db = get_firestore_client()
+    repos = get_repositories()
 
     try:
-        user = auth_client.create_user(
+        user = await asyncio.to_thread(
+            auth_client.create_user,
             email=user_data.email,
             password=user_data.password,
             display_name=" ".join(
@@ -101,9 +97,9 @@ async def register(user_data: UserCreate):
             or None,
         )
 
-        profile_ref = db.collection("user_profiles").document(user.uid)
         timestamp = datetime.utcnow()
-        profile_ref.set(
+        await repos.user_profiles.set(
+            user.uid,
             {
                 "user_id": user.uid,
                 "email": user.email,
@@ -120,14 +116,16 @@ async def register(user_data: UserCreate):
             "user_id": user.uid,
             "email": user.email,
         }
-    except firebase_exceptions.FirebaseError as exc:
+    except firebase_error() as exc:
         raise HTTPException(status_code=400, detail=f"Registration failed: {exc.message}")
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Registration failed: {exc}")
 
 
 @router.post("/login", response_model=dict)
 async def login(login_data: UserLogin):
     """Login user using Firebase Identity Toolkit password verification."""
-    tokens = _sign_in_with_password(login_data.email, login_data.password)
+    tokens = await asyncio.to_thread(_sign_in_with_password, login_data.email, login_data.password)
     if not tokens.get("access_token"):
         raise HTTPException(status_code=401, detail="Login failed")
     return tokens
@@ -136,17 +134,14 @@ async def login(login_data: UserLogin):
 @router.get("/profile")
 async def get_profile(user_id: str = Depends(get_current_user_id)):
     """Get user profile from Firestore, creating a default if necessary."""
-    db = get_firestore_client()
+    repos = get_repositories()
     auth_client = get_firebase_auth()
 
     try:
-        profile_ref = db.collection("user_profiles").document(user_id)
-        snapshot = profile_ref.get()
+        profile = await repos.user_profiles.get(user_id)
 
-        if snapshot.exists:
-            profile = snapshot.to_dict() or {}
-        else:
-            user_record = auth_client.get_user(user_id)
+        if profile is None:
+            user_record = await asyncio.to_thread(auth_client.get_user, user_id)
             timestamp = datetime.utcnow()
             profile = {
                 "user_id": user_id,
@@ -154,11 +149,13 @@ async def get_profile(user_id: str = Depends(get_current_user_id)):
                 "created_at": timestamp,
                 "updated_at": timestamp,
             }
-            profile_ref.set(profile)
+            await repos.user_profiles.set(user_id, profile)
 
         return _build_profile_response(profile)
-    except firebase_exceptions.FirebaseError as exc:
+    except firebase_error() as exc:
         raise HTTPException(status_code=500, detail=f"Failed to get profile: {exc.message}")
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to get profile: {exc}")
 
 
 @router.put("/profile")
@@ -167,7 +164,7 @@ async def update_profile(
     user_id: str = Depends(get_current_user_id),
 ):
     """Update user profile document in Firestore."""
-    db = get_firestore_client()
+    repos = get_repositories()
 
     try:
         update_data = profile_update.dict(exclude_unset=True)
@@ -180,39 +177,34 @@ async def update_profile(
 
         update_data["updated_at"] = datetime.utcnow()
 
-        profile_ref = db.collection("user_profiles").document(user_id)
-        profile_ref.set(update_data, merge=True)
+        await repos.user_profiles.set(user_id, update_data, merge=True)
 
-        snapshot = profile_ref.get()
-        profile = snapshot.to_dict() if snapshot.exists else {}
+        profile = await repos.user_profiles.get(user_id)
         return _build_profile_response(profile or {})
-    except firebase_exceptions.FirebaseError as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to update profile: {exc.message}")
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to update profile: {exc}")
 
 
 @router.get("/allergens", response_model=AllergenProfile)
 async def get_allergen_profile(user_id: str = Depends(get_current_user_id)):
     """Retrieve or initialise allergen profile for the user."""
-    db = get_firestore_client()
+    repos = get_repositories()
 
     try:
-        doc_ref = db.collection("allergen_profiles").document(user_id)
-        snapshot = doc_ref.get()
+        data = await repos.allergen_profiles.get(user_id)
 
-        if snapshot.exists:
-            data = snapshot.to_dict() or {}
-        else:
+        if data is None:
             timestamp = datetime.utcnow()
             data = {
                 "user_id": user_id,
                 "created_at": timestamp,
                 "updated_at": timestamp,
             }
-            doc_ref.set(data)
+            await repos.allergen_profiles.set(user_id, data)
 
         return AllergenProfile(**data)
-    except firebase_exceptions.FirebaseError as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to get allergen profile: {exc.message}")
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to get allergen profile: {exc}")
 
 
 @router.put("/allergens", response_model=AllergenProfile)
@@ -221,20 +213,19 @@ async def update_allergen_profile(
     user_id: str = Depends(get_current_user_id),
 ):
     """Update allergen profile document."""
-    db = get_firestore_client()
+    repos = get_repositories()
 
     try:
         update_data = allergen_update.dict(exclude_unset=True)
         update_data["updated_at"] = datetime.utcnow()
 
-        doc_ref = db.collection("allergen_profiles").document(user_id)
-        doc_ref.set(update_data, merge=True)
+        await repos.allergen_profiles.set(user_id, update_data, merge=True)
 
-        snapshot = doc_ref.get()
-        data = snapshot.to_dict() if snapshot.exists else {}
-        return AllergenProfile(**(data or {}))
-    except firebase_exceptions.FirebaseError as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to update allergen profile: {exc.message}")
+        data = await repos.allergen_profiles.get(user_id) or {}
+        profile_matrix.update_profile(user_id, data)
+        return AllergenProfile(**data)
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to update allergen profile: {exc}")
 
 
 @router.post("/logout")
@@ -243,62 +234,238 @@ async def logout(user_id: str = Depends(get_current_user_id)):
     return {"message": "Logged out successfully"}
 
 
+def _history_entry(doc_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    entry = {
+        "id": doc_id,
+        "timestamp": _format_datetime(data.get("created_at")),
+    }
+    entry.update(data.get("analysis_result") or {})
+    return entry
+
+
+def _encode_sync_token(at: datetime) -> str:
+    return base64.urlsafe_b64encode(at.isoformat().encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _decode_sync_token(token: str) -> datetime:
+    """Decode a sync token to a naive UTC datetime, comparable with ``utcnow()``."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        at = datetime.fromisoformat(raw.decode("ascii"))
+        if at.tzinfo is not None:
+            at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    except (ValueError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    return at
+
+
+async def _record_deletion(user_id: str, entry_id: Optional[str]) -> None:
+    now = datetime.utcnow()
+    await get_repositories().history_tombstones.add(
+        user_id,
+        entry_id,
+        deleted_at=now,
+        expires_at=now + timedelta(days=settings.HISTORY_TOMBSTONE_RETENTION_DAYS),
+    )
+
+
 @router.get("/history")
 async def get_history(user_id: str = Depends(get_current_user_id)):
     """Get user's scan history ordered by timestamp."""
-    db = get_firestore_client()
+    repos = get_repositories()
 
     try:
-        query = (
-            db.collection("food_scans")
-            .where("user_id", "==", user_id)
-            .order_by("created_at", direction=g_firestore.Query.DESCENDING)
-        )
-        results = query.stream()
-
-        history: List[Dict[str, Any]] = []
-        for doc in results:
-            data = doc.to_dict() or {}
-            entry = {
-                "id": doc.id,
-                "timestamp": _format_datetime(data.get("created_at")),
-            }
-            analysis = data.get("analysis_result") or {}
-            entry.update(analysis)
-            history.append(entry)
+        history: List[Dict[str, Any]] = [
+            _history_entry(doc_id, data)
+            for doc_id, data in await repos.food_scans.list_for_user(user_id)
+        ]
 
-        return history
-    except firebase_exceptions.FirebaseError as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to get history: {exc.message}")
+        # Returned as a response so the entries are encoded by orjson in one
+        # pass instead of being walked by jsonable_encoder first.
+        return ORJSONResponse(history)
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to get history: {exc}")
 
 
-@router.post("/history")
-async def add_history(
-    history_entry: Dict[str, Any],
+@router.get("/history/changes")
+async def get_history_changes(
+    since: Optional[str] = Query(None, description="next_since from the previous sync"),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Get the history entries added and deleted since a previous sync.
+
+    Without ``since``, when the token predates the tombstone retention, or
+    when the history was cleared in the meantime, the full history is
+    returned with ``reset: true`` and the client replaces its copy.
+    Otherwise ``entries`` are new entries and ``deleted`` the ids to drop.
+    Entries near the token may be sent again; clients merge by ``id``.
+    """
+    repos = get_repositories()
+    now = datetime.utcnow()
+    since_at = _decode_sync_token(since) if since else None
+    reset = since_at is None or since_at < now - timedelta(days=settings.HISTORY_TOMBSTONE_RETENTION_DAYS)
+
+    try:
+        deleted: List[str] = []
+        if not reset:
+            window = since_at - timedelta(seconds=settings.HISTORY_SYNC_OVERLAP_SECONDS)
+            for tombstone in await repos.history_tombstones.list_for_user_since(user_id, window):
+                if tombstone.get("entry_id") is None:
+                    reset = True
+                    break
+                deleted.append(tombstone["entry_id"])
+
+        if reset:
+            deleted = []
+            docs = await repos.food_scans.list_for_user(user_id)
+        else:
+            docs = await repos.food_scans.list_for_user_since(user_id, window)
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to sync history: {exc}")
+
+    return ORJSONResponse({
+        "entries": [_history_entry(doc_id, data) for doc_id, data in docs],
+        "deleted": deleted,
+        "reset": reset,
+        "next_since": _encode_sync_token(now),
+    })
+
+
+@router.get("/history/stats")
+async def get_history_stats(
+    top: int = Query(10, ge=1, le=50, description="Number of foods and allergens to list"),
     user_id: str = Depends(get_current_user_id),
 ):
-    """Add a new history entry for the user."""
-    db = get_firestore_client()
+    """Scan counts, unsafe rate, most scanned foods and most detected allergens."""
+    try:
+        return summarize(await history_stats.get(user_id), top)
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to get history stats: {exc}")
+
 
+async def _export_stream(chunks, fmt: str):
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except StorageError as exc:
+        # Headers are already sent; NDJSON clients see the error line, binary
+        # formats end truncated.
+        print(f"WARNING: History export failed: {exc}")
+        if fmt == "ndjson":
+            yield ORJSONResponse({"error": f"Failed to export history: {exc}"}).body + b"\n"
+
+
+@router.get("/history/export")
+async def export_history(
+    format: str = Query("ndjson", pattern="^(ndjson|parquet|arrow)$"),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Stream the user's full scan history as NDJSON, Parquet or Arrow IPC.
+
+    Firestore is read a page at a time and each page is written out before
+    the next is fetched. Parquet and Arrow need the optional ``pyarrow``
+    package.
+    """
+    if format == "ndjson":
+        chunks = history_transfer.export_ndjson(user_id)
+    elif history_transfer.arrow_available():
+        chunks = history_transfer.export_arrow(user_id, format)
+    else:
+        raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow to be installed")
+
+    return StreamingResponse(
+        _export_stream(chunks, format),
+        media_type=history_transfer.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="history.{format}"'},
+    )
+
+
+@router.post("/history/import")
+async def import_history(request: Request, user_id: str = Depends(get_current_user_id)):
+    """Import scans from an NDJSON body, as produced by the NDJSON export.
+
+    The body is read incrementally and written in Firestore batches. Lines
+    that fail validation are skipped and reported. Delta-sync clients are
+    told to resync, and statistics are rebuilt on their next read.
+    """
     try:
-        analysis = history_entry.get("analysis", {})
+        result = await history_transfer.import_ndjson(user_id, request.stream())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid import file: {exc}")
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to import history: {exc}")
+    finally:
+        # Earlier batches may have been committed even if a later one failed.
+        scan_index.invalidate_user(user_id)
+        try:
+            await _record_deletion(user_id, None)
+            await history_stats.invalidate(user_id)
+        except StorageError as exc:
+            print(f"WARNING: Failed to reset history sync state for {user_id}: {exc}")
+    return result
+
 
-        scan_data = {
-            "user_id": user_id,
-            "scan_type": history_entry.get("scan_type", "image"),
-            "food_id": analysis.get("dishName", ""),
-            "food_name": analysis.get("dishName", ""),
+async def _complete_scan(user_id: str, scan_id: str, analysis: Dict[str, Any]) -> bool:
+    """Attach the client's analysis to the user's scan record ``scan_id``.
+
+    Returns False when there is no such record, so a new entry is added.
+    """
+    def completed(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **record,
+            "food_name": analysis.get("dishName") or record.get("food_name", ""),
             "analysis_result": analysis,
-            "scan_data": history_entry,
-            "created_at": datetime.utcnow(),
         }
 
-        doc_ref = db.collection("food_scans").document()
-        doc_ref.set(scan_data)
+    queued = history_queue.pending(scan_id)
+    if queued is not None:
+        return queued.get("user_id") == user_id and history_queue.replace(scan_id, completed(queued))
+
+    try:
+        await history_queue.wait_in_flight(lambda doc_id, _: doc_id == scan_id)
+        stored = await get_repositories().food_scans.get(scan_id)
+        if stored is None or stored.get("user_id") != user_id:
+            return False
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to add history entry: {exc}")
+    # The stored version is uncounted from the stats when the rewrite commits
+    history_queue.enqueue(completed(stored), doc_id=scan_id, replaces=stored)
+    return True
+
+
+@router.post("/history")
+async def add_history(
+    history_entry: Dict[str, Any],
+    user_id: str = Depends(get_current_user_id),
+):
+    """Add a new history entry for the user.
+
+    The entry is queued for a batched Firestore write; its id is returned
+    immediately. With the ``scan_id`` a scan route returned, the analysis
+    is added to that scan's record instead of creating a second one.
+    """
+    analysis = history_entry.get("analysis", {})
+
+    scan_id = history_entry.get("scan_id")
+    if isinstance(scan_id, str) and scan_id:
+        updated = await _complete_scan(user_id, scan_id, analysis)
+        if updated:
+            return {"message": "History entry added successfully", "id": scan_id}
+
+    scan_data = {
+        "user_id": user_id,
+        "scan_type": history_entry.get("scan_type", "image"),
+        # The FatSecret food id when the client scanned a known food; the
+        # dish name is not an id and would pollute the scan index.
+        "food_id": history_entry.get("food_id") or analysis.get("food_id"),
+        "food_name": analysis.get("dishName", ""),
+        "analysis_result": analysis,
+        "scan_data": history_entry,
+        "created_at": datetime.utcnow(),
+    }
 
-        return {"message": "History entry added successfully", "id": doc_ref.id}
-    except firebase_exceptions.FirebaseError as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to add history: {exc.message}")
+    doc_id = history_queue.enqueue(scan_data)
+    return {"message": "History entry added successfully", "id": doc_id}
 
 
 @router.delete("/history/{entry_id}")
@@ -307,36 +474,50 @@ async def delete_history_entry(
     user_id: str = Depends(get_current_user_id),
 ):
     """Delete a specific history entry if it belongs to the user."""
-    db = get_firestore_client()
+    repos = get_repositories()
+
+    queued = history_queue.pending(entry_id)
+    if queued is not None:
+        if queued.get("user_id") != user_id:
+            raise HTTPException(status_code=403, detail="Not authorised to delete this entry")
+        # Not written yet, so there is nothing to delete, count or sync.
+        history_queue.discard(lambda doc_id, _: doc_id == entry_id)
+        return {"message": "History entry deleted successfully"}
 
     try:
-        doc_ref = db.collection("food_scans").document(entry_id)
-        snapshot = doc_ref.get()
+        await history_queue.wait_in_flight(lambda doc_id, _: doc_id == entry_id)
+        data = await repos.food_scans.get(entry_id)
 
-        if not snapshot.exists:
+        if data is None:
             raise HTTPException(status_code=404, detail="History entry not found")
 
-        data = snapshot.to_dict() or {}
         if data.get("user_id") != user_id:
             raise HTTPException(status_code=403, detail="Not authorised to delete this entry")
 
-        doc_ref.delete()
+        await repos.food_scans.delete(entry_id)
+        await _record_deletion(user_id, entry_id)
+        await history_stats.record_deleted(user_id, data)
+        scan_index.record_deleted(user_id, data)
         return {"message": "History entry deleted successfully"}
-    except firebase_exceptions.FirebaseError as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to delete history entry: {exc.message}")
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to delete history entry: {exc}")
 
 
 @router.delete("/history")
 async def clear_history(user_id: str = Depends(get_current_user_id)):
-    """Remove all history entries for the user."""
-    db = get_firestore_client()
+    """Remove all history entries for the user, including queued ones."""
+    repos = get_repositories()
 
-    try:
-        query = db.collection("food_scans").where("user_id", "==", user_id)
-        docs = list(query.stream())
-        for doc in docs:
-            doc.reference.delete()
+    def owned(_: str, record: Dict[str, Any]) -> bool:
+        return record.get("user_id") == user_id
 
+    try:
+        history_queue.discard(owned)
+        await history_queue.wait_in_flight(owned)
+        await repos.food_scans.delete_for_user(user_id)
+        scan_index.invalidate_user(user_id)
+        await _record_deletion(user_id, None)
+        await history_stats.record_cleared(user_id)
         return {"message": "History cleared successfully"}
-    except firebase_exceptions.FirebaseError as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to clear history: {exc.message}")
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to clear history: {exc}")
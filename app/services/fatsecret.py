@@ -1,22 +1,189 @@
+import asyncio
 import os
-import requests
-from typing import List, Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
-import json
 import time
 import hashlib
 import hmac
 import base64
-from urllib.parse import quote, urlencode
+import secrets
+from urllib.parse import quote
+
+import httpx
+
+from ..cache import cache_key, get_shared_cache
+from ..config import settings
+from .upstream import UpstreamStatus
 
 load_dotenv()
 
+FATSECRET_API_URL = "https://platform.fatsecret.com/rest/server.api"
+# Largest page foods.search will return.
+FATSECRET_MAX_PAGE_SIZE = 50
+
+# Read-only API methods whose responses are safe to share between users.
+CACHEABLE_METHODS = frozenset({
+    "foods.search",
+    "food.get",
+    "food.get.v2",
+    "food.find_id_for_barcode",
+})
+
+
+class FatSecretError(Exception):
+    """Raised when FatSecret returns an error payload or the request fails."""
+
+
+def parse_search_results(result: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+    """Foods on one ``foods.search`` page and the total number of matches."""
+    foods = result.get("foods") or {}
+    food_list = foods.get("food") or []
+    if isinstance(food_list, dict):
+        food_list = [food_list]
+    try:
+        total = int(foods.get("total_results", len(food_list)))
+    except (TypeError, ValueError):
+        total = len(food_list)
+    return food_list, total
+
+
+def _percent_encode(value: Any) -> str:
+    """RFC 3986 percent-encoding as required by OAuth 1.0."""
+    return quote(str(value), safe="~")
+
+
+class FatSecretTransport:
+    """Pooled async HTTP transport that signs FatSecret requests with OAuth 1.0.
+
+    Shared by the application's ``FatSecretService`` (two-legged, consumer
+    credentials only) and the legacy ``Backend/fatsecret.py`` diary client
+    (three-legged, with a user access token).
+    """
+
+    def __init__(
+        self,
+        consumer_key: Optional[str] = None,
+        consumer_secret: Optional[str] = None,
+        base_url: str = FATSECRET_API_URL,
+        max_connections: int = 20,
+        timeout: float = 10.0,
+    ):
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.status = UpstreamStatus(max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    def _generate_oauth_signature(
+        self, http_method: str, url: str, params: Dict[str, Any], token_secret: str = ""
+    ) -> str:
+        """Generate OAuth 1.0 HMAC-SHA1 signature."""
+        encoded = sorted((_percent_encode(k), _percent_encode(v)) for k, v in params.items())
+        param_string = "&".join(f"{k}={v}" for k, v in encoded)
+
+        signature_base_string = "&".join(
+            [http_method.upper(), _percent_encode(url), _percent_encode(param_string)]
+        )
+        signing_key = f"{_percent_encode(self.consumer_secret)}&{_percent_encode(token_secret)}"
+
+        signature = hmac.new(
+            signing_key.encode("utf-8"),
+            signature_base_string.encode("utf-8"),
+            hashlib.sha1,
+        ).digest()
+        return base64.b64encode(signature).decode("utf-8")
+
+    def sign(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        token: Optional[str] = None,
+        token_secret: Optional[str] = None,
+        http_method: str = "GET",
+    ) -> Dict[str, Any]:
+        """Return ``params`` merged with OAuth parameters and signature."""
+        all_params = {
+            **params,
+            "oauth_consumer_key": self.consumer_key,
+            "oauth_nonce": secrets.token_hex(16),
+            "oauth_signature_method": "HMAC-SHA1",
+            "oauth_timestamp": str(int(time.time())),
+            "oauth_version": "1.0",
+        }
+        if token:
+            all_params["oauth_token"] = token
+
+        all_params["oauth_signature"] = self._generate_oauth_signature(
+            http_method, url, all_params, token_secret or ""
+        )
+        return all_params
+
+    async def get(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        token: Optional[str] = None,
+        token_secret: Optional[str] = None,
+    ) -> httpx.Response:
+        """Send a signed GET request and return the raw response."""
+        signed = self.sign(url, params, token, token_secret)
+        try:
+            with self.status.track():
+                response = await self._get_client().get(url, params=signed)
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise FatSecretError(f"FatSecret API request failed: {e}")
+        return response
+
+    async def call(
+        self,
+        method: str,
+        params: Optional[Dict[str, Any]] = None,
+        token: Optional[str] = None,
+        token_secret: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Call a REST API method and return the decoded JSON body."""
+        request_params = {**(params or {}), "method": method, "format": "json"}
+        response = await self.get(self.base_url, request_params, token, token_secret)
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise FatSecretError(f"FatSecret returned invalid JSON: {e}")
+
+        if isinstance(data, dict) and "error" in data:
+            error = data["error"] or {}
+            raise FatSecretError(
+                f"FatSecret error {error.get('code')}: {error.get('message')}"
+            )
+        return data
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
 class FatSecretService:
     def __init__(self):
         self.api_key = os.getenv("FATSECRET_KEY")
         self.api_secret = os.getenv("FATSECRET_SECRET")
-        self.base_url = "https://platform.fatsecret.com/rest/server.api"
+        self.base_url = FATSECRET_API_URL
+        self.transport = FatSecretTransport(self.api_key, self.api_secret, self.base_url)
         self._warned_missing_credentials = False
+        self._prefetches: Dict[Tuple[str, int, int], asyncio.Task] = {}
 
         if not self.api_key or not self.api_secret:
             self._warn_missing_credentials()
@@ -41,106 +208,129 @@ class FatSecretService:
                 "FatSecret API credentials are missing. Set FATSECRET_KEY and "
                 "FATSECRET_SECRET environment variables to enable this feature."
             )
-    
-    def _generate_oauth_signature(self, method: str, url: str, params: Dict[str, Any]) -> str:
-        """Generate OAuth 1.0 signature for FatSecret API."""
-        # Sort parameters
-        sorted_params = sorted(params.items())
-        param_string = '&'.join([f"{quote(str(k))}={quote(str(v))}" for k, v in sorted_params])
-        
-        # Create signature base string
-        signature_base_string = f"{method}&{quote(url)}&{quote(param_string)}"
-        
-        # Create signing key
-        signing_key = f"{quote(self.api_secret)}&"
-        
-        # Generate signature
-        signature = hmac.new(
-            signing_key.encode('utf-8'),
-            signature_base_string.encode('utf-8'),
-            hashlib.sha1
-        ).digest()
-        
-        return base64.b64encode(signature).decode('utf-8')
-    
-    def _make_request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Make a request to the FatSecret API with proper OAuth 1.0 signing."""
+
+        self.transport.consumer_key = self.api_key
+        self.transport.consumer_secret = self.api_secret
+
+    async def _make_request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Make a signed request to the FatSecret API over the pooled transport.
+
+        Responses of read-only methods are served from the shared cache, so a
+        food fetched by one worker is not fetched again by the others.
+        """
+        cacheable = method in CACHEABLE_METHODS
+        if cacheable:
+            key = cache_key("fatsecret", method, params)
+            cached = get_shared_cache().get(key)
+            if cached is not None:
+                return cached
+
         self._ensure_credentials()
+        result = await self.transport.call(method, params)
 
-        # Add OAuth parameters
-        oauth_params = {
-            'oauth_consumer_key': self.api_key,
-            'oauth_nonce': str(int(time.time() * 1000)),
-            'oauth_signature_method': 'HMAC-SHA1',
-            'oauth_timestamp': str(int(time.time())),
-            'oauth_version': '1.0'
-        }
-        
-        # Merge with method parameters
-        all_params = {**params, **oauth_params}
-        all_params['method'] = method
-        all_params['format'] = 'json'
-        
-        # Generate signature
-        signature = self._generate_oauth_signature('GET', self.base_url, all_params)
-        all_params['oauth_signature'] = signature
-        
-        try:
-            response = requests.get(self.base_url, params=all_params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"FatSecret API request failed: {e}")
-    
-    async def search_foods(self, query: str, max_results: int = 10) -> Dict[str, Any]:
-        """Search for foods by name."""
-        params = {
+        if cacheable:
+            get_shared_cache().set(key, result, settings.FATSECRET_CACHE_TTL_SECONDS)
+        return result
+
+    @staticmethod
+    def _search_params(query: str, max_results: int, page_number: int) -> Dict[str, Any]:
+        return {
             'search_expression': query,
             'max_results': max_results,
-            'page_number': 0
+            'page_number': page_number
         }
-        
+
+    async def search_foods(self, query: str, max_results: int = 10, page_number: int = 0) -> Dict[str, Any]:
+        """Search for foods by name, one page of ``max_results`` at a time."""
+        key = (query, max_results, page_number)
+        pending = self._prefetches.get(key)
+        if pending is not None:
+            # The page is already being fetched in the background.
+            result = await asyncio.shield(pending)
+            if result is not None:
+                return result
+
         try:
-            result = self._make_request('foods.search', params)
+            result = await self._make_request('foods.search', self._search_params(*key))
             return result
         except Exception as e:
             raise Exception(f"Food search failed: {e}")
-    
+
+    def prefetch_search(self, query: str, max_results: int = 10, page_number: int = 0) -> None:
+        """Fetch a search page in the background so it is cached when requested."""
+        key = (query, max_results, page_number)
+        if key not in self._prefetches:
+            self._prefetches[key] = asyncio.create_task(self._prefetch(key))
+
+    async def _prefetch(self, key: Tuple[str, int, int]) -> Optional[Dict[str, Any]]:
+        try:
+            return await self._make_request('foods.search', self._search_params(*key))
+        except Exception as e:
+            print(f"WARNING: Prefetch of page {key[2]} for '{key[0]}' failed: {e}")
+            return None
+        finally:
+            self._prefetches.pop(key, None)
+
     async def get_food_details(self, food_id: str) -> Dict[str, Any]:
         """Get detailed information about a specific food."""
         params = {
             'food_id': food_id
         }
-        
+
         try:
-            result = self._make_request('food.get', params)
+            result = await self._make_request('food.get', params)
             return result
         except Exception as e:
             raise Exception(f"Failed to get food details: {e}")
-    
+
+    def cached_food_details(self, food_id: str) -> Optional[Dict[str, Any]]:
+        """The cached ``food.get`` response for ``food_id``, without fetching it."""
+        return get_shared_cache().get(cache_key("fatsecret", "food.get", {'food_id': food_id}))
+
     async def search_by_barcode(self, barcode: str) -> Dict[str, Any]:
         """Search for food by barcode."""
         params = {
             'barcode': barcode
         }
-        
+
         try:
-            result = self._make_request('food.find_id_for_barcode', params)
+            result = await self._make_request('food.find_id_for_barcode', params)
             return result
         except Exception as e:
             raise Exception(f"Barcode search failed: {e}")
-    
+
     async def get_food_nutrition(self, food_id: str) -> Dict[str, Any]:
         """Get nutrition information for a specific food."""
         params = {
             'food_id': food_id
         }
-        
+
         try:
-            result = self._make_request('food.get.v2', params)
+            result = await self._make_request('food.get.v2', params)
             return result
         except Exception as e:
             raise Exception(f"Failed to get nutrition info: {e}")
 
-# Create a singleton instance
-fatsecret_service = FatSecretService()
+    async def aclose(self) -> None:
+        """Cancel pending prefetches and close pooled upstream connections."""
+        tasks = list(self._prefetches.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.transport.aclose()
+
+_fatsecret_service: Optional[FatSecretService] = None
+
+
+def get_fatsecret_service() -> FatSecretService:
+    """Return the shared service, constructing it on first use."""
+    global _fatsecret_service
+    if _fatsecret_service is None:
+        _fatsecret_service = FatSecretService()
+    return _fatsecret_service
+
+
+async def close_fatsecret_service() -> None:
+    """Close the shared service's connections if it was ever created."""
+    if _fatsecret_service is not None:
+        await _fatsecret_service.aclose()
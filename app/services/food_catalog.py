@@ -0,0 +1,360 @@
+"""
+Local food catalog with full-text search.
+
+Foods returned by FatSecret (and optional bulk imports) are stored in a
+local SQLite database with an FTS5 index over ``food_name``, ``brand_name``
+and ``food_description``. Every query token is matched as a prefix, so
+search-as-you-type is answered locally; when nothing matches, tokens are
+corrected against the index vocabulary (one edit, symmetric-delete lookup)
+and the query is retried.
+
+All methods are blocking. Async code runs searches with
+``asyncio.to_thread`` and hands writes to ``store_in_background``; the
+catalog is only a cache of FatSecret results, so a write that cannot get
+the database lock within the short busy timeout is skipped.
+"""
+import asyncio
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set
+
+from ..config import settings
+
+FOOD_FIELDS = ("food_id", "food_name", "brand_name", "food_type", "food_url", "food_description")
+
+_QUERY_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Minimum token length before typo correction is attempted.
+_MIN_TYPO_LENGTH = 4
+_MAX_CORRECTIONS = 5
+# Matches scored per query. Candidates are taken in FTS index order (rowid,
+# roughly insertion order) before ranking, so for a very broad prefix the
+# best BM25 matches beyond the first _MAX_RANKED_CANDIDATES are not seen.
+# Ordering by rank inside the limit would score every match on each
+# keystroke, which is the cost this cap exists to avoid.
+_MAX_RANKED_CANDIDATES = 2000
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(_QUERY_TOKEN_RE.findall(query.lower()))
+
+
+def _deletes(term: str) -> Set[str]:
+    """The term and every variant with one character removed."""
+    return {term} | {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _fts_token(token: str) -> str:
+    return '"' + token.replace('"', '""') + '"'
+
+
+class FoodCatalog:
+    """SQLite/FTS5 store of food summaries, shared by all workers on a host."""
+
+    def __init__(
+        self,
+        path: str,
+        busy_timeout_ms: int = 250,
+        query_ttl_seconds: float = 86400,
+        typo_index_ttl_seconds: float = 300,
+    ):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.query_ttl_seconds = query_ttl_seconds
+        self.typo_index_ttl_seconds = typo_index_ttl_seconds
+        self._local = threading.local()
+        self._typo_index: Optional[Dict[str, Set[str]]] = None
+        self._typo_index_built_at = 0.0
+        self._typo_lock = threading.Lock()
+        self._typo_rebuilding = False
+        # Terms written while a rebuild reads the vocabulary, replayed into
+        # the new index when it is swapped in.
+        self._typo_pending: List[str] = []
+        # Background writes, referenced until they finish
+        self._writes: Set["asyncio.Future[None]"] = set()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        with conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS foods (
+                    food_id TEXT PRIMARY KEY,
+                    food_name TEXT NOT NULL,
+                    brand_name TEXT,
+                    food_type TEXT,
+                    food_url TEXT,
+                    food_description TEXT,
+                    updated_at REAL NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+                    food_name, brand_name, food_description,
+                    content='foods',
+                    prefix='2 3 4',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS foods_ai AFTER INSERT ON foods BEGIN
+                    INSERT INTO foods_fts (rowid, food_name, brand_name, food_description)
+                    VALUES (new.rowid, new.food_name, new.brand_name, new.food_description);
+                END;
+                CREATE TRIGGER IF NOT EXISTS foods_ad AFTER DELETE ON foods BEGIN
+                    INSERT INTO foods_fts (foods_fts, rowid, food_name, brand_name, food_description)
+                    VALUES ('delete', old.rowid, old.food_name, old.brand_name, old.food_description);
+                END;
+                CREATE TRIGGER IF NOT EXISTS foods_au AFTER UPDATE ON foods BEGIN
+                    INSERT INTO foods_fts (foods_fts, rowid, food_name, brand_name, food_description)
+                    VALUES ('delete', old.rowid, old.food_name, old.brand_name, old.food_description);
+                    INSERT INTO foods_fts (rowid, food_name, brand_name, food_description)
+                    VALUES (new.rowid, new.food_name, new.brand_name, new.food_description);
+                END;
+                CREATE VIRTUAL TABLE IF NOT EXISTS foods_vocab USING fts5vocab(foods_fts, 'row');
+                CREATE TABLE IF NOT EXISTS searched_queries (
+                    query TEXT PRIMARY KEY,
+                    searched_at REAL NOT NULL
+                );
+                """
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def add_many(self, foods: Iterable[Mapping[str, Any]]) -> int:
+        """Insert or refresh food summaries; returns the number written."""
+        now = time.time()
+        rows = [
+            tuple(food.get(field) for field in FOOD_FIELDS) + (now,)
+            for food in foods
+            if food.get("food_id") and food.get("food_name")
+        ]
+        if not rows:
+            return 0
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO foods (food_id, food_name, brand_name, food_type, food_url, "
+                "food_description, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (food_id) DO UPDATE SET food_name = excluded.food_name, "
+                "brand_name = excluded.brand_name, food_type = excluded.food_type, "
+                "food_url = excluded.food_url, "
+                "food_description = COALESCE(excluded.food_description, food_description), "
+                "updated_at = excluded.updated_at",
+                rows,
+            )
+        with self._typo_lock:
+            index = self._typo_index
+            if index is not None:
+                for row in rows:
+                    for field in (row[1], row[2], row[5]):
+                        for token in _QUERY_TOKEN_RE.findall((field or "").lower()):
+                            self._index_term(index, token)
+                            if self._typo_rebuilding:
+                                self._typo_pending.append(token)
+        return len(rows)
+
+    def store(self, foods: Iterable[Mapping[str, Any]], query: Optional[str] = None) -> None:
+        """Add foods and mark ``query`` as searched, logging failures instead of raising."""
+        try:
+            self.add_many(foods)
+            if query is not None:
+                self.mark_searched(query)
+        except sqlite3.Error as e:
+            print(f"WARNING: Failed to update food catalog: {e}")
+
+    def store_in_background(self, foods: Iterable[Mapping[str, Any]], query: Optional[str] = None) -> None:
+        """Run ``store`` in a worker thread without waiting for it."""
+        future = asyncio.get_running_loop().run_in_executor(None, self.store, list(foods), query)
+        self._writes.add(future)
+        future.add_done_callback(self._writes.discard)
+
+    def get(self, food_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT food_id, food_name, brand_name, food_type, food_url, food_description "
+            "FROM foods WHERE food_id = ?",
+            (food_id,),
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+
+    def mark_searched(self, query: str) -> None:
+        """Record that ``query`` was fetched upstream and its results stored."""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO searched_queries (query, searched_at) VALUES (?, ?)",
+                (normalize_query(query), time.time()),
+            )
+
+    def was_searched(self, query: str) -> bool:
+        """True when the catalog already holds upstream results for ``query``."""
+        row = self._connection().execute(
+            "SELECT 1 FROM searched_queries WHERE query = ? AND searched_at >= ?",
+            (normalize_query(query), time.time() - self.query_ttl_seconds),
+        ).fetchone()
+        return row is not None
+
+    def search(self, query: str, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        """Prefix search ranked by BM25, retried with typo corrections on a miss."""
+        tokens = _QUERY_TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return []
+
+        expression = " AND ".join(_fts_token(token) + "*" for token in tokens)
+        results = self._match(expression, limit, offset)
+        # Later pages of a corrected search are corrected too
+        if results or (offset and self._match(expression, 1, 0)):
+            return results
+
+        corrected = self._corrected_expression(tokens)
+        if corrected is None:
+            return []
+        return self._match(corrected, limit, offset)
+
+    def _match(self, expression: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+        # Short prefixes can match a large share of the catalog; only the
+        # first _MAX_RANKED_CANDIDATES matches are scored so a keystroke never
+        # pays for ranking the whole table.
+        rows = self._connection().execute(
+            "SELECT f.food_id, f.food_name, f.brand_name, f.food_type, f.food_url, "
+            "f.food_description FROM ("
+            "  SELECT rowid, bm25(foods_fts, 10.0, 4.0, 1.0) AS score FROM foods_fts "
+            "  WHERE foods_fts MATCH ? LIMIT ?"
+            ") AS m JOIN foods AS f ON f.rowid = m.rowid "
+            "ORDER BY m.score LIMIT ? OFFSET ?",
+            (expression, _MAX_RANKED_CANDIDATES, limit, offset),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _has_prefix(self, token: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM foods_vocab WHERE term >= ? AND term < ? LIMIT 1",
+            (token, token + "\U0010ffff"),
+        ).fetchone()
+        return row is not None
+
+    def _corrected_expression(self, tokens: List[str]) -> Optional[str]:
+        parts = []
+        changed = False
+        for token in tokens:
+            part = _fts_token(token) + "*"
+            if len(token) >= _MIN_TYPO_LENGTH and not self._has_prefix(token):
+                corrections = self.corrections(token)
+                if not corrections:
+                    return None
+                part = "(" + " OR ".join([part] + [_fts_token(c) for c in corrections]) + ")"
+                changed = True
+            parts.append(part)
+        return " AND ".join(parts) if changed else None
+
+    @staticmethod
+    def _index_term(index: Dict[str, Set[str]], term: str) -> None:
+        if len(term) >= _MIN_TYPO_LENGTH - 1:
+            for variant in _deletes(term):
+                index.setdefault(variant, set()).add(term)
+
+    def _build_typo_index(self) -> Dict[str, Set[str]]:
+        index: Dict[str, Set[str]] = {}
+        for (term,) in self._connection().execute("SELECT term FROM foods_vocab"):
+            self._index_term(index, term)
+        with self._typo_lock:
+            for term in self._typo_pending:
+                self._index_term(index, term)
+            self._typo_pending = []
+            self._typo_index = index
+            self._typo_index_built_at = time.monotonic()
+        return index
+
+    def _rebuild_typo_index(self) -> None:
+        try:
+            self._build_typo_index()
+        except sqlite3.Error as e:
+            print(f"WARNING: Food catalog typo index rebuild failed: {e}")
+        finally:
+            with self._typo_lock:
+                self._typo_rebuilding = False
+                self._typo_pending = []
+
+    def _load_typo_index(self) -> Dict[str, Set[str]]:
+        index = self._typo_index
+        if index is None:
+            return self._build_typo_index()
+        # Rebuilt periodically so terms written by other workers appear. The
+        # scan covers the whole vocabulary, so it runs in a background thread
+        # and searches keep using the current index until it finishes.
+        if time.monotonic() - self._typo_index_built_at > self.typo_index_ttl_seconds:
+            with self._typo_lock:
+                start = not self._typo_rebuilding
+                self._typo_rebuilding = True
+            if start:
+                threading.Thread(target=self._rebuild_typo_index, name="typo-index", daemon=True).start()
+        return index
+
+    def corrections(self, token: str) -> List[str]:
+        """Vocabulary terms within one edit of ``token``."""
+        index = self._load_typo_index()
+        candidates: Set[str] = set()
+        for variant in _deletes(token):
+            candidates.update(index.get(variant, ()))
+        candidates.discard(token)
+        return sorted(candidates, key=lambda term: (abs(len(term) - len(token)), term))[
+            :_MAX_CORRECTIONS
+        ]
+
+    def import_file(self, path: str) -> int:
+        """Bulk-load foods from a JSON, NDJSON/JSONL or CSV file.
+
+        JSON files may hold a list of foods or a FatSecret ``foods.search``
+        response. Returns the number of foods written.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        with open(path, newline="", encoding="utf-8") as handle:
+            if extension == ".csv":
+                return self.add_many(csv.DictReader(handle))
+            if extension in (".ndjson", ".jsonl"):
+                return self.add_many(json.loads(line) for line in handle if line.strip())
+            data = json.load(handle)
+        if isinstance(data, dict):
+            data = (data.get("foods") or {}).get("food") or []
+            if isinstance(data, dict):
+                data = [data]
+        return self.add_many(data)
+
+
+_food_catalog: Optional[FoodCatalog] = None
+
+
+def get_food_catalog() -> FoodCatalog:
+    """Return the shared catalog, creating its database on first use."""
+    global _food_catalog
+    if _food_catalog is None:
+        _food_catalog = FoodCatalog(
+            settings.FOOD_CATALOG_PATH,
+            query_ttl_seconds=settings.FOOD_CATALOG_QUERY_TTL_SECONDS,
+        )
+    return _food_catalog
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        raise SystemExit("usage: python -m app.services.food_catalog FILE [FILE ...]")
+    catalog = get_food_catalog()
+    for file_path in sys.argv[1:]:
+        print(f"Imported {catalog.import_file(file_path)} foods from {file_path}")
+    print(f"Catalog now holds {len(catalog)} foods")
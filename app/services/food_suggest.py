@@ -0,0 +1,204 @@
+"""
+Food name autocomplete.
+
+``SuggestionIndex`` keeps every known food name in a sorted list of
+(searchable suffix, name) pairs, one entry per word start, so a prefix is
+located with two bisects and ranked by weight: how often the food was
+scanned through this worker plus a small weight each time it is looked up.
+Only names that come from FatSecret or the local catalog are indexed; the
+index is shared by every user, so text from users' own history entries
+never goes into it. Ranked results are cached per prefix (LRU), so
+repeated keystrokes are dictionary lookups; adding a name or changing a
+weight evicts exactly the prefixes whose results it can affect.
+"""
+import asyncio
+import heapq
+import re
+import sqlite3
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+from .fatsecret import get_fatsecret_service, parse_search_results
+from .food_catalog import get_food_catalog
+
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+_CACHED_LIMIT = 20
+_MAX_CACHED_PREFIXES = 10000
+# Weight a food gains each time its details are looked up; a scan counts 1.
+LOOKUP_WEIGHT = 0.25
+
+
+def normalize_name(name: str) -> str:
+    return _NON_WORD_RE.sub(" ", name.lower()).strip()
+
+
+def _suffixes(key: str) -> List[str]:
+    """The key and every suffix of it that starts a word."""
+    suffixes = [key]
+    for i, char in enumerate(key):
+        if char == " ":
+            suffixes.append(key[i + 1:])
+    return suffixes
+
+
+class SuggestionIndex:
+    """Sorted-array prefix index over food names weighted by popularity."""
+
+    def __init__(self):
+        self._entries: List[Tuple[str, str]] = []
+        self._names: Dict[str, str] = {}
+        self._scan_counts: Dict[str, float] = {}
+        self._lookup_weights: Dict[str, float] = {}
+        self._cache: "OrderedDict[str, List[Tuple[str, float]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def weight(self, key: str) -> float:
+        return self._scan_counts.get(key, 0.0) + self._lookup_weights.get(key, 0.0)
+
+    def _invalidate(self, key: str) -> None:
+        if self._cache:
+            for suffix in _suffixes(key):
+                for length in range(1, len(suffix) + 1):
+                    self._cache.pop(suffix[:length], None)
+
+    def _ensure(self, name: str) -> Optional[str]:
+        key = normalize_name(name)
+        if not key:
+            return None
+        if key not in self._names:
+            self._names[key] = name.strip()
+            for suffix in _suffixes(key):
+                insort(self._entries, (suffix, key))
+        return key
+
+    def add(self, name: str, scans: float = 0.0, lookups: float = 0.0) -> None:
+        """Add a name, or increase its weight if it is already known."""
+        key = self._ensure(name)
+        if key is None:
+            return
+        if scans:
+            self._scan_counts[key] = self._scan_counts.get(key, 0.0) + scans
+        if lookups:
+            self._lookup_weights[key] = self._lookup_weights.get(key, 0.0) + lookups
+        self._invalidate(key)
+
+    def _top(self, prefix: str, limit: int) -> List[Tuple[str, float]]:
+        lo = bisect_left(self._entries, (prefix,))
+        hi = bisect_left(self._entries, (prefix + "\U0010ffff",), lo)
+        keys = {key for _, key in self._entries[lo:hi]}
+        weight = self.weight
+        best = heapq.nsmallest(limit, keys, key=lambda key: (-weight(key), len(key), key))
+        return [(self._names[key], weight(key)) for key in best]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Top ``limit`` (name, weight) pairs for names with a word starting with ``prefix``."""
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        if limit > _CACHED_LIMIT:
+            return self._top(prefix, limit)
+        cached = self._cache.get(prefix)
+        if cached is None:
+            cached = self._cache[prefix] = self._top(prefix, _CACHED_LIMIT)
+            if len(self._cache) > _MAX_CACHED_PREFIXES:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(prefix)
+        return cached[:limit]
+
+
+class FoodSuggestions:
+    """Autocomplete service around ``SuggestionIndex``.
+
+    Weights are incremental counters: barcode and voice scans and food
+    lookups made through this worker are applied to the index as they
+    happen. When a prefix has fewer suggestions
+    than requested, a fill is scheduled after ``fill_delay_ms``: later
+    keystrokes extending the same prefix cancel it, so only the prefix the
+    user paused on is filled, from the local catalog when it has matches
+    and from FatSecret otherwise.
+    """
+
+    def __init__(
+        self,
+        fill_delay_ms: int = 300,
+        min_fill_length: int = 3,
+        fill_results: int = 20,
+    ):
+        self.index = SuggestionIndex()
+        self.fill_delay = fill_delay_ms / 1000
+        self.min_fill_length = min_fill_length
+        self.fill_results = fill_results
+        self._fills: Dict[str, asyncio.Task] = {}
+
+    def record_scan(self, food_id: Optional[str], food_name: Optional[str]) -> None:
+        """Count a scan of a FatSecret food under its FatSecret name.
+
+        Foods without an id (image scans, client-written history entries)
+        are not counted.
+        """
+        if food_id and food_name:
+            self.index.add(food_name, scans=1.0)
+
+    def record_lookup(self, food_name: Optional[str], weight: float = LOOKUP_WEIGHT) -> None:
+        if food_name:
+            self.index.add(food_name, lookups=weight)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[str, float]]:
+        suggestions = self.index.suggest(prefix, limit)
+        if len(suggestions) < limit:
+            self._schedule_fill(normalize_name(prefix))
+        return suggestions
+
+    def _schedule_fill(self, prefix: str) -> None:
+        if len(prefix) < self.min_fill_length or prefix in self._fills:
+            return
+        # A longer prefix supersedes the shorter ones still waiting.
+        for pending in [p for p in self._fills if prefix.startswith(p)]:
+            self._fills.pop(pending).cancel()
+        self._fills[prefix] = asyncio.create_task(self._fill(prefix))
+
+    async def _fill(self, prefix: str) -> None:
+        try:
+            await asyncio.sleep(self.fill_delay)
+            names = await self._catalog_names(prefix)
+            if not names:
+                result = await get_fatsecret_service().search_foods(prefix, self.fill_results)
+                foods, _ = parse_search_results(result)
+                names = [food.get("food_name") for food in foods]
+                get_food_catalog().store_in_background(foods, prefix)
+            for name in names:
+                self.record_lookup(name, 0.0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WARNING: Suggestion fill for '{prefix}' failed: {e}")
+        finally:
+            if self._fills.get(prefix) is asyncio.current_task():
+                del self._fills[prefix]
+
+    async def _catalog_names(self, prefix: str) -> List[str]:
+        if not settings.FOOD_CATALOG_ENABLED:
+            return []
+        try:
+            foods = await asyncio.to_thread(get_food_catalog().search, prefix, self.fill_results)
+        except sqlite3.Error:
+            return []
+        return [food["food_name"] for food in foods]
+
+    async def stop(self) -> None:
+        tasks = list(self._fills.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._fills.clear()
+
+
+# Create a singleton instance
+food_suggestions = FoodSuggestions(
+    fill_delay_ms=settings.SUGGEST_FILL_DELAY_MS,
+)
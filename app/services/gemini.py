@@ -1,8 +1,12 @@
 import os
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+from ..cache import cache_key, get_shared_cache
+from ..config import settings
+from ..utils.allergens import profile_allergen_names
+from .upstream import UpstreamStatus
 
 load_dotenv()
 
@@ -13,51 +17,61 @@ class GeminiService:
         if not self.api_key:
             raise ValueError("GEMINI_KEY must be set in environment variables")
         
+        # google.generativeai takes hundreds of milliseconds to import, so it
+        # is only loaded once the service is actually needed
+        import google.generativeai as genai
+
         # Configure the Gemini API
         genai.configure(api_key=self.api_key)
+        self._genai = genai
         self.model = genai.GenerativeModel('gemini-pro')
+        self.status = UpstreamStatus()
     
     async def analyze_allergens(self, user_allergens: Dict[str, Any], food_info: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze food for allergen risks using Gemini AI."""
         
         # Prepare the prompt
         prompt = self._create_analysis_prompt(user_allergens, food_info)
+
+        # Identical prompts (same allergies, same food) share one analysis
+        key = cache_key("analysis", prompt)
+        cached = get_shared_cache().get(key)
+        if cached is not None:
+            return cached
         
         try:
-            # Generate content using Gemini
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,
-                    top_k=32,
-                    top_p=1,
-                    max_output_tokens=1024,
+            with self.status.track():
+                # Generate content using Gemini without blocking the event loop
+                response = await self.model.generate_content_async(
+                    prompt,
+                    generation_config=self._genai.types.GenerationConfig(
+                        temperature=0.1,
+                        top_k=32,
+                        top_p=1,
+                        max_output_tokens=1024,
+                    )
                 )
-            )
-            
-            if response.text:
-                return self._parse_analysis_response(response.text)
-            else:
-                raise Exception("No valid response from Gemini API")
-                
+
+                if not response.text:
+                    raise Exception("No valid response from Gemini API")
         except Exception as e:
             raise Exception(f"Failed to analyze allergens: {e}")
+
+        result = self._parse_analysis_response(response.text)
+        get_shared_cache().set(key, result, settings.ANALYSIS_CACHE_TTL_SECONDS)
+        return result
     
     def _create_analysis_prompt(self, user_allergens: Dict[str, Any], food_info: Dict[str, Any]) -> str:
         """Create a detailed prompt for allergen analysis."""
         
         # Extract user allergens
-        allergen_list = []
-        for allergen, has_allergy in user_allergens.items():
-            if has_allergy and allergen != "custom_allergens" and allergen != "severity_level":
-                allergen_list.append(allergen.replace("_", " "))
-        
-        if user_allergens.get("custom_allergens"):
-            allergen_list.extend(user_allergens["custom_allergens"])
+        allergen_list = profile_allergen_names(user_allergens)
         
         # Extract food information
         food_name = food_info.get("food_name", "Unknown food")
         ingredients = food_info.get("ingredients", [])
+        contains = food_info.get("contains", [])
+        may_contain = food_info.get("may_contain", [])
         nutrition = food_info.get("nutrition", {})
         
         prompt = f"""
@@ -69,6 +83,8 @@ SEVERITY LEVEL: {user_allergens.get('severity_level', 'moderate')}
 FOOD INFORMATION:
 - Name: {food_name}
 - Ingredients: {', '.join(ingredients) if ingredients else 'Not specified'}
+- Label declares (contains): {', '.join(contains) if contains else 'Not specified'}
+- Label warns (may contain): {', '.join(may_contain) if may_contain else 'Not specified'}
 - Nutrition: {json.dumps(nutrition, indent=2) if nutrition else 'Not available'}
 
 Please provide a comprehensive allergen analysis in the following JSON format:
@@ -137,5 +153,17 @@ Be thorough but concise. Prioritize user safety.
             "analysis_details": content
         }
 
-# Create a singleton instance
-gemini_service = GeminiService()
+_gemini_service: Optional[GeminiService] = None
+
+
+def get_gemini_service() -> GeminiService:
+    """Return the shared service, constructing it on first use."""
+    global _gemini_service
+    if _gemini_service is None:
+        _gemini_service = GeminiService()
+    return _gemini_service
+
+
+def peek_gemini_service() -> Optional[GeminiService]:
+    """Return the shared service only if it has already been constructed."""
+    return _gemini_service
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+from ..config import settings
+from ..repositories import get_repositories
+from .fatsecret import get_fatsecret_service
+from .gemini import peek_gemini_service
+from .history_queue import history_queue
+
+
+@dataclass
+class ProbeResult:
+    status: str  # ok, degraded, down, unknown
+    checked_at: Optional[float] = None
+    latency_ms: Optional[float] = None
+    detail: Optional[str] = None
+
+
+class DependencyMonitor:
+    """Background dependency probes backing the ``/ready`` endpoint.
+
+    The storage backend (Firestore or SQLite) is probed actively on an
+    interval; FatSecret and Gemini are
+    metered, so their status comes from the outcome of real requests. The
+    request path only reads the cached results.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = 15.0,
+        timeout_seconds: float = 5.0,
+        max_pool_saturation: float = 0.9,
+        max_queue_depth: int = 1000,
+    ):
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.max_pool_saturation = max_pool_saturation
+        self.max_queue_depth = max_queue_depth
+        self.storage = ProbeResult("unknown")
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            result = await self._probe_storage()
+            if result.status != self.storage.status:
+                if result.status == "ok":
+                    print(f"SUCCESS: {settings.STORAGE_BACKEND} storage connection successful")
+                else:
+                    print(f"ERROR: {settings.STORAGE_BACKEND} storage connection failed: {result.detail}")
+            self.storage = result
+            await asyncio.sleep(self.interval_seconds)
+
+    async def _probe_storage(self) -> ProbeResult:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(get_repositories().user_profiles.ping(), timeout=self.timeout_seconds)
+            status, detail = "ok", None
+        except asyncio.TimeoutError:
+            status, detail = "down", f"timed out after {self.timeout_seconds}s"
+        except Exception as exc:
+            status, detail = "down", str(exc)
+        return ProbeResult(
+            status=status,
+            checked_at=time.time(),
+            latency_ms=round((time.perf_counter() - started) * 1000, 1),
+            detail=detail,
+        )
+
+    def _fatsecret_report(self) -> Dict[str, Any]:
+        service = get_fatsecret_service()
+        upstream = service.transport.status
+        if not (service.api_key or os.getenv("FATSECRET_KEY")):
+            status = "down"
+        elif upstream.last_success_at is None and upstream.last_failure_at is None:
+            status = "unknown"
+        else:
+            status = "ok" if upstream.healthy else "degraded"
+        return {"status": status, **upstream.as_dict()}
+
+    def _gemini_report(self) -> Dict[str, Any]:
+        if not os.getenv("GEMINI_KEY"):
+            return {"status": "down", "detail": "GEMINI_KEY is not configured"}
+        service = peek_gemini_service()
+        if service is None:
+            return {"status": "unknown", "detail": "not initialized yet"}
+        upstream = service.status
+        if upstream.last_success_at is None and upstream.last_failure_at is None:
+            status = "unknown"
+        else:
+            status = "ok" if upstream.healthy else "degraded"
+        return {"status": status, **upstream.as_dict()}
+
+    def report(self) -> Dict[str, Any]:
+        """Build the readiness report from cached state; never does I/O."""
+        fatsecret = self._fatsecret_report()
+        gemini = self._gemini_report()
+        queue_depth = history_queue.depth
+        saturation = fatsecret.get("saturation") or 0.0
+
+        reasons = []
+        if self.storage.status == "down":
+            reasons.append(f"{settings.STORAGE_BACKEND} unavailable")
+        if saturation >= self.max_pool_saturation:
+            reasons.append("fatsecret connection pool saturated")
+        if queue_depth >= self.max_queue_depth:
+            reasons.append("history write queue backlog")
+
+        return {
+            "ready": not reasons,
+            "reasons": reasons,
+            "dependencies": {
+                settings.STORAGE_BACKEND: asdict(self.storage),
+                "fatsecret": fatsecret,
+                "gemini": gemini,
+            },
+            "load": {
+                "fatsecret_pool_saturation": saturation,
+                "history_queue_depth": queue_depth,
+                "history_records_dropped": history_queue.dropped,
+            },
+        }
+
+
+# Create a singleton instance
+dependency_monitor = DependencyMonitor(
+    interval_seconds=settings.READINESS_PROBE_INTERVAL_SECONDS,
+    timeout_seconds=settings.READINESS_PROBE_TIMEOUT_SECONDS,
+    max_pool_saturation=settings.READINESS_MAX_POOL_SATURATION,
+    max_queue_depth=settings.READINESS_MAX_QUEUE_DEPTH,
+)
@@ -0,0 +1,221 @@
+import asyncio
+import secrets
+import string
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..repositories import get_repositories
+from ..repositories.firestore import FIRESTORE_MAX_BATCH
+from .history_stats import history_stats
+from .scan_index import scan_index
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+Record = Tuple[str, Dict[str, Any]]
+
+
+def new_document_id() -> str:
+    """Generate a Firestore-style 20 character auto-id without a client call."""
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+
+
+class HistoryWriteQueue:
+    """In-process write-behind queue for ``food_scans`` documents.
+
+    ``enqueue`` assigns the document id and returns immediately; a background
+    task coalesces records into Firestore batch commits every
+    ``flush_interval_ms`` or as soon as ``max_batch`` records are waiting.
+    Failed batches are retried with exponential backoff and ``stop`` drains
+    everything still queued. Scan index and stats counters are only updated
+    for committed batches, so a dropped batch leaves nothing to roll back.
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int = 250,
+        max_batch: int = 100,
+        max_retries: int = 5,
+        retry_backoff_ms: int = 200,
+    ):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = min(max_batch, FIRESTORE_MAX_BATCH)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self._pending: List[Record] = []
+        self._in_flight: List[Record] = []
+        # Previous contents of queued records that overwrite a stored document
+        self._replaced: Dict[str, Dict[str, Any]] = {}
+        # Held while a batch is being committed
+        self._commit_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of records accepted but not yet committed."""
+        return len(self._pending) + len(self._in_flight)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task after flushing every pending record."""
+        self._stopping = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        # Records enqueued while the worker was not running
+        while self._pending:
+            await self._flush_once()
+
+    def enqueue(
+        self,
+        record: Dict[str, Any],
+        doc_id: Optional[str] = None,
+        replaces: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Accept a record for writing and return its document id.
+
+        ``replaces`` is the stored document ``record`` overwrites; it is
+        uncounted from the history stats once the write commits.
+        """
+        doc_id = doc_id or new_document_id()
+        if replaces is not None:
+            self._replaced[doc_id] = replaces
+        self._pending.append((doc_id, record))
+        if self._wakeup is not None and len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return doc_id
+
+    def pending(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """The queued record with this id, if it has not been committed yet."""
+        for pending_id, record in self._pending:
+            if pending_id == doc_id:
+                return record
+        return None
+
+    def replace(self, doc_id: str, record: Dict[str, Any]) -> bool:
+        """Swap the queued record with this id; False if it is not queued."""
+        for index, (pending_id, _) in enumerate(self._pending):
+            if pending_id == doc_id:
+                self._pending[index] = (doc_id, record)
+                return True
+        return False
+
+    def discard(self, predicate: Callable[[str, Dict[str, Any]], bool]) -> int:
+        """Drop queued records matching ``predicate``; returns how many."""
+        kept = [item for item in self._pending if not predicate(*item)]
+        dropped = len(self._pending) - len(kept)
+        if dropped and self._replaced:
+            kept_ids = {doc_id for doc_id, _ in kept}
+            for doc_id, _ in self._pending:
+                if doc_id not in kept_ids:
+                    self._replaced.pop(doc_id, None)
+        self._pending[:] = kept
+        return dropped
+
+    async def wait_in_flight(self, predicate: Callable[[str, Dict[str, Any]], bool]) -> None:
+        """Wait until no record matching ``predicate`` is being committed.
+
+        Records already handed to Firestore cannot be pulled back, so
+        deletes wait for that commit instead of racing it.
+        """
+        while any(predicate(*item) for item in self._in_flight):
+            async with self._commit_lock:
+                pass
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                await self._flush_once()
+                if len(self._pending) < self.max_batch and not self._stopping:
+                    break
+
+    async def _flush_once(self) -> None:
+        async with self._commit_lock:
+            batch_items = self._pending[: self.max_batch]
+            del self._pending[: len(batch_items)]
+            self._in_flight = batch_items
+            replaced = {
+                doc_id: self._replaced.pop(doc_id)
+                for doc_id, _ in batch_items
+                if doc_id in self._replaced
+            }
+
+            try:
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        await get_repositories().food_scans.add_many(batch_items)
+                        break
+                    except Exception as exc:
+                        if attempt == self.max_retries:
+                            self.dropped += len(batch_items)
+                            lost = ", ".join(doc_id for doc_id, _ in batch_items)
+                            print(
+                                f"ERROR: Dropping {len(batch_items)} history records after "
+                                f"{self.max_retries} retries: {exc}; lost ids: {lost}"
+                            )
+                            return
+                        await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+                scan_index.record_added(batch_items)
+                await history_stats.record_added(batch_items, replaced)
+            finally:
+                self._in_flight = []
+
+
+# Create a singleton instance
+history_queue = HistoryWriteQueue(
+    flush_interval_ms=settings.HISTORY_FLUSH_INTERVAL_MS,
+    max_batch=settings.HISTORY_FLUSH_MAX_RECORDS,
+    max_retries=settings.HISTORY_MAX_RETRIES,
+)
+
+
+async def save_scan_to_history(
+    user_id: str,
+    scan_type: str,
+    food_data: Dict[str, Any],
+    analysis_result: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Save a scan to the user's scan history.
+
+    The record is handed to the write-behind queue, so this returns before
+    Firestore has committed it.
+    
+    Args:
+        user_id: User ID
+        scan_type: Type of scan (image, barcode, voice)
+        food_data: Food information
+        analysis_result: AI analysis result
+        
+    Returns:
+        Scan ID
+    """
+    scan_data = {
+        'user_id': user_id,
+        'scan_type': scan_type,
+        'food_id': food_data.get('food_id'),
+        'food_name': food_data.get('food_name', 'Unknown'),
+        'scan_data': food_data,
+        'analysis_result': analysis_result,
+        'created_at': datetime.utcnow()
+    }
+    
+    try:
+        return history_queue.enqueue(scan_data)
+    except Exception as e:
+        print(f"Failed to save scan history: {e}")
+        return ""
@@ -0,0 +1,157 @@
+"""
+Per-user scan statistics maintained incrementally.
+
+Each user has one ``history_stats`` document of counters: total scans,
+scans per verdict, scans per food and detections per allergen. Scans
+committed by the history queue are added with Firestore increments and
+deletions subtract, so the statistics page reads one document however long
+the history is. A document that was never built from the full history
+(users who scanned before statistics existed, or whose first scan created
+it) is rebuilt from ``food_scans`` once, on first read.
+"""
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from ..cache import MemoryCache
+from ..config import settings
+from ..repositories import StorageError, get_repositories
+
+Counters = Dict[str, Any]
+
+VERDICTS = ("SAFE", "RISKY", "UNSAFE")
+
+
+def scan_verdict(analysis: Dict[str, Any]) -> Optional[str]:
+    # The app stores {"verdict": "SAFE" | "RISKY" | "UNSAFE"}; Gemini
+    # analyses carry is_safe/risk_level instead.
+    verdict = str(analysis.get("verdict") or "").upper()
+    if verdict in VERDICTS:
+        return verdict
+    is_safe = analysis.get("is_safe")
+    if is_safe is False:
+        return "UNSAFE"
+    if is_safe is True:
+        return "RISKY" if analysis.get("risk_level") in ("medium", "high") else "SAFE"
+    return None
+
+
+def scan_counters(record: Dict[str, Any], sign: int = 1) -> Counters:
+    """Counters one scan record contributes (``sign=-1`` to remove it)."""
+    analysis = record.get("analysis_result") or {}
+    counters: Counters = {"total_scans": sign, "verdicts": {}, "foods": {}, "allergens": {}}
+
+    verdict = scan_verdict(analysis)
+    if verdict is not None:
+        counters["verdicts"][verdict] = sign
+    food_name = (record.get("food_name") or "").strip()
+    if food_name and food_name != "Unknown":
+        counters["foods"][food_name] = sign
+    allergens = analysis.get("detectedAllergens") or analysis.get("detected_allergens") or []
+    for allergen in {str(a).strip().lower() for a in allergens if a}:
+        counters["allergens"][allergen] = sign
+    return counters
+
+
+def add_counters(target: Counters, delta: Counters) -> Counters:
+    """Add ``delta`` into ``target`` in place and return ``target``."""
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            add_counters(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+    return target
+
+
+def _top(counts: Dict[str, int], limit: int) -> List[Dict[str, Any]]:
+    ranked = sorted((item for item in counts.items() if item[1] > 0), key=lambda item: (-item[1], item[0]))
+    return [{"name": name, "count": count} for name, count in ranked[:limit]]
+
+
+def summarize(counters: Counters, top: int = 10) -> Dict[str, Any]:
+    total = max(int(counters.get("total_scans", 0)), 0)
+    verdicts = {verdict: max(int((counters.get("verdicts") or {}).get(verdict, 0)), 0) for verdict in VERDICTS}
+    return {
+        "total_scans": total,
+        "verdicts": verdicts,
+        "unsafe_rate": round(verdicts["UNSAFE"] / total, 4) if total else 0.0,
+        "top_foods": _top(counters.get("foods") or {}, top),
+        "top_allergens": _top(counters.get("allergens") or {}, top),
+    }
+
+
+class HistoryStats:
+    """Keeps ``history_stats`` documents in step with ``food_scans``.
+
+    Documents read or updated by this worker are cached for
+    ``cache_ttl_seconds``; increments made by other workers show up once
+    the cached copy expires.
+    """
+
+    def __init__(self, cache_ttl_seconds: float = 60.0, max_cached_users: int = 10000):
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self._cache = MemoryCache(max_cached_users)
+
+    async def _apply(self, user_id: str, delta: Counters) -> None:
+        try:
+            await get_repositories().history_stats.increment(user_id, delta)
+        except StorageError as e:
+            # The document is rebuilt from food_scans on its next read.
+            print(f"WARNING: Failed to update history stats for {user_id}: {e}")
+            self._cache.delete(user_id)
+            return
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            add_counters(cached, delta)
+
+    async def record_added(
+        self,
+        documents: Iterable[Tuple[str, Dict[str, Any]]],
+        replaced: Optional[Mapping[str, Dict[str, Any]]] = None,
+    ) -> None:
+        """Count committed scans, with one increment per user.
+
+        ``replaced`` maps the ids of documents that were overwritten to
+        their previous contents, which are uncounted in the same increment.
+        """
+        deltas: Dict[str, Counters] = defaultdict(dict)
+        for doc_id, record in documents:
+            user_id = record.get("user_id")
+            if user_id:
+                add_counters(deltas[user_id], scan_counters(record))
+                if replaced and doc_id in replaced:
+                    add_counters(deltas[user_id], scan_counters(replaced[doc_id], sign=-1))
+        for user_id, delta in deltas.items():
+            await self._apply(user_id, delta)
+
+    async def record_deleted(self, user_id: str, record: Dict[str, Any]) -> None:
+        await self._apply(user_id, scan_counters(record, sign=-1))
+
+    async def record_cleared(self, user_id: str) -> None:
+        counters = {"total_scans": 0, "verdicts": {}, "foods": {}, "allergens": {}, "complete": True}
+        await get_repositories().history_stats.set(user_id, counters)
+        self._cache.set(user_id, counters, self.cache_ttl_seconds)
+
+    async def invalidate(self, user_id: str) -> None:
+        """Have the user's counters rebuilt from ``food_scans`` on their next read."""
+        self._cache.delete(user_id)
+        await get_repositories().history_stats.set(user_id, {"complete": False}, merge=True)
+
+    async def get(self, user_id: str) -> Counters:
+        """The user's counters: cached, from their document, or rebuilt."""
+        counters = self._cache.get(user_id)
+        if counters is not None:
+            return counters
+        repos = get_repositories()
+        counters = await repos.history_stats.get(user_id)
+        if not counters or not counters.get("complete"):
+            counters = {"total_scans": 0, "verdicts": {}, "foods": {}, "allergens": {}}
+            for _, record in await repos.food_scans.list_for_user(user_id):
+                add_counters(counters, scan_counters(record))
+            counters["complete"] = True
+            await repos.history_stats.set(user_id, counters)
+        self._cache.set(user_id, counters, self.cache_ttl_seconds)
+        return counters
+
+
+# Create a singleton instance
+history_stats = HistoryStats(cache_ttl_seconds=settings.HISTORY_STATS_CACHE_TTL_SECONDS)
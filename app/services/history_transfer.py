@@ -0,0 +1,215 @@
+"""
+Bulk export and import of a user's scan history.
+
+Exports page through ``food_scans`` and stream each page out as it is
+read: NDJSON (one record per line) or, when ``pyarrow`` is installed,
+Parquet or an Arrow IPC stream with one row group / record batch per page.
+Imports read an NDJSON request body line by line and commit records in
+Firestore batches as they fill. Both use constant memory whatever the size
+of the history.
+"""
+import hashlib
+import importlib.util
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from ..repositories import get_repositories
+from ..repositories.firestore import FIRESTORE_MAX_BATCH, Document
+from ..responses import json_body
+
+EXPORT_FIELDS = ("scan_type", "food_id", "food_name", "created_at", "analysis_result", "scan_data")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+# Records per NDJSON chunk written to the response.
+_LINES_PER_CHUNK = 100
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_record(doc_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    record = {"id": doc_id}
+    for field in EXPORT_FIELDS:
+        record[field] = data.get(field)
+    return record
+
+
+async def export_ndjson(user_id: str) -> AsyncIterator[bytes]:
+    lines: List[bytes] = []
+    async for doc_id, data in get_repositories().food_scans.stream_for_user(user_id):
+        lines.append(json_body(export_record(doc_id, data)) + b"\n")
+        if len(lines) >= _LINES_PER_CHUNK:
+            yield b"".join(lines)
+            lines = []
+    if lines:
+        yield b"".join(lines)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Writable file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.string()),
+        ("scan_type", pa.string()),
+        ("food_id", pa.string()),
+        ("food_name", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        # Free-form maps are kept as JSON text.
+        ("analysis_result", pa.string()),
+        ("scan_data", pa.string()),
+    ])
+
+
+def _arrow_batch(schema, page: List[Document]):
+    import pyarrow as pa
+
+    def text(value: Any) -> Optional[str]:
+        return None if value is None else json_body(value).decode("utf-8")
+
+    columns = {
+        "id": [doc_id for doc_id, _ in page],
+        "scan_type": [data.get("scan_type") for _, data in page],
+        "food_id": [None if data.get("food_id") is None else str(data["food_id"]) for _, data in page],
+        "food_name": [data.get("food_name") for _, data in page],
+        "created_at": [data.get("created_at") for _, data in page],
+        "analysis_result": [text(data.get("analysis_result")) for _, data in page],
+        "scan_data": [text(data.get("scan_data")) for _, data in page],
+    }
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+async def export_arrow(user_id: str, fmt: str) -> AsyncIterator[bytes]:
+    """Stream the history as Parquet (``fmt="parquet"``) or an Arrow IPC stream."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else pa.ipc.new_stream(sink, schema)
+
+    page: List[Document] = []
+    try:
+        async for document in get_repositories().food_scans.stream_for_user(user_id):
+            page.append(document)
+            if len(page) >= FIRESTORE_MAX_BATCH:
+                # One Parquet row group / IPC record batch per page.
+                writer.write_batch(_arrow_batch(schema, page))
+                page = []
+                yield sink.drain()
+        if page:
+            writer.write_batch(_arrow_batch(schema, page))
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _parse_datetime(value: Any) -> datetime:
+    if value is None:
+        return datetime.utcnow()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    raise ValueError("created_at must be an ISO 8601 string")
+
+
+def import_record(user_id: str, item: Any) -> Document:
+    """Validate one imported line and return it as a ``food_scans`` document."""
+    if not isinstance(item, dict):
+        raise ValueError("each line must be a JSON object")
+    analysis = item.get("analysis_result")
+    if analysis is not None and not isinstance(analysis, dict):
+        raise ValueError("analysis_result must be an object")
+    scan_data = item.get("scan_data")
+    if scan_data is not None and not isinstance(scan_data, dict):
+        raise ValueError("scan_data must be an object")
+
+    source_id = item.get("id")
+    if not isinstance(source_id, str) or not source_id:
+        raise ValueError("id must be a non-empty string")
+    # Scoped to the importing user, so a file cannot overwrite another
+    # user's scans and importing it twice writes the same documents.
+    doc_id = hashlib.sha256(f"{user_id}:{source_id}".encode("utf-8")).hexdigest()[:20]
+    record = {
+        "user_id": user_id,
+        "scan_type": item.get("scan_type") or "import",
+        "food_id": item.get("food_id"),
+        "food_name": item.get("food_name") or (analysis or {}).get("dishName") or "Unknown",
+        "analysis_result": analysis,
+        "scan_data": scan_data,
+        "created_at": _parse_datetime(item.get("created_at")),
+    }
+    return doc_id, record
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+        if len(buffer) > MAX_IMPORT_LINE_BYTES:
+            raise ValueError(f"line longer than {MAX_IMPORT_LINE_BYTES} bytes")
+    if buffer:
+        yield buffer
+
+
+async def import_ndjson(user_id: str, chunks: AsyncIterator[bytes], max_errors: int = 100) -> Dict[str, Any]:
+    """Write every valid NDJSON line as a scan of ``user_id``.
+
+    Document ids are derived from each line's ``id``, so importing the same
+    file twice overwrites instead of duplicating. Invalid lines are skipped
+    and reported by line number.
+    """
+    scans = get_repositories().food_scans
+    batch: List[Document] = []
+    imported = 0
+    failed = 0
+    errors: List[Dict[str, Any]] = []
+
+    line_number = 0
+    async for line in _lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            batch.append(import_record(user_id, json.loads(line)))
+        except ValueError as e:
+            failed += 1
+            if len(errors) < max_errors:
+                errors.append({"line": line_number, "error": str(e)})
+            continue
+        if len(batch) >= FIRESTORE_MAX_BATCH:
+            await scans.add_many(batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        await scans.add_many(batch)
+        imported += len(batch)
+
+    return {"imported": imported, "failed": failed, "errors": errors}
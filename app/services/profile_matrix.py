@@ -0,0 +1,135 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from ..repositories import get_repositories
+from ..utils.allergens import (
+    build_mask_matrix,
+    encode_profile,
+    mask_to_words,
+    words_needed,
+)
+
+
+@dataclass
+class ProfileCheck:
+    user_id: str
+    is_safe: bool
+    conflicting_mask: int = 0
+
+
+@dataclass
+class _Snapshot:
+    user_ids: List[str] = field(default_factory=list)
+    index: Dict[str, int] = field(default_factory=dict)
+    masks: List[int] = field(default_factory=list)
+    matrix: Any = None  # uint64 ndarray, built on first load or update
+
+
+class ProfileMatrix:
+    """In-memory matrix of every user's allergen bitmask.
+
+    Loaded from the ``allergen_profiles`` collection and refreshed every
+    ``ttl_seconds``; single-profile updates are patched in place so writes
+    through the API are visible immediately.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot = _Snapshot()
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _load(self) -> _Snapshot:
+        snapshot = _Snapshot()
+        async for user_id, profile in get_repositories().allergen_profiles.stream():
+            snapshot.index[user_id] = len(snapshot.user_ids)
+            snapshot.user_ids.append(user_id)
+            snapshot.masks.append(encode_profile(profile))
+        snapshot.matrix = build_mask_matrix(snapshot.masks)
+        return snapshot
+
+    async def refresh(self) -> None:
+        """Reload every profile from Firestore."""
+        async with self._lock:
+            self._snapshot = await self._load()
+            self._loaded_at = time.monotonic()
+
+    async def ensure_fresh(self) -> None:
+        if time.monotonic() - self._loaded_at > self.ttl_seconds:
+            await self.refresh()
+
+    async def load_missing(self, user_ids: Iterable[str]) -> None:
+        """Fetch profiles the snapshot lacks in one batched read.
+
+        Covers profiles created through another worker since the last refresh.
+        """
+        missing = [uid for uid in dict.fromkeys(user_ids) if uid not in self._snapshot.index]
+        if not missing:
+            return
+        profiles = await get_repositories().allergen_profiles.get_many(missing)
+        for user_id, profile in profiles.items():
+            self.update_profile(user_id, profile)
+
+    def update_profile(self, user_id: str, profile: Dict[str, Any]) -> None:
+        """Apply a single profile write without reloading the collection."""
+        snapshot = self._snapshot
+        mask = encode_profile(profile)
+        row = snapshot.index.get(user_id)
+        if row is None:
+            snapshot.index[user_id] = len(snapshot.user_ids)
+            snapshot.user_ids.append(user_id)
+            snapshot.masks.append(mask)
+        else:
+            snapshot.masks[row] = mask
+
+        width = snapshot.matrix.shape[1] if snapshot.matrix is not None else 0
+        if row is None or words_needed([mask]) > width:
+            snapshot.matrix = build_mask_matrix(snapshot.masks, width)
+        else:
+            snapshot.matrix[row] = mask_to_words(mask, snapshot.matrix.shape[1])
+
+    def evaluate(
+        self, food_mask: int, user_ids: Optional[Sequence[str]] = None
+    ) -> List[ProfileCheck]:
+        """Check ``food_mask`` against all (or the given) cached profiles.
+
+        Unknown user ids are skipped; compare against the input to find them.
+        """
+        import numpy as np
+
+        snapshot = self._snapshot
+        if snapshot.matrix is None:
+            return []
+        if user_ids is None:
+            rows = np.arange(len(snapshot.user_ids))
+        else:
+            rows = np.array(
+                [snapshot.index[uid] for uid in user_ids if uid in snapshot.index],
+                dtype=np.intp,
+            )
+
+        words = mask_to_words(food_mask, snapshot.matrix.shape[1])
+        unsafe = np.bitwise_and(snapshot.matrix[rows], words).any(axis=1)
+
+        results = []
+        for row, is_unsafe in zip(rows.tolist(), unsafe.tolist()):
+            results.append(
+                ProfileCheck(
+                    user_id=snapshot.user_ids[row],
+                    is_safe=not is_unsafe,
+                    conflicting_mask=snapshot.masks[row] & food_mask if is_unsafe else 0,
+                )
+            )
+        return results
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._snapshot.index
+
+    def __len__(self) -> int:
+        return len(self._snapshot.user_ids)
+
+
+# Create a singleton instance
+profile_matrix = ProfileMatrix()
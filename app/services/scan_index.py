@@ -0,0 +1,118 @@
+"""
+Per-user ``food_id`` -> latest scan index.
+
+Answers "have I scanned this before, and what was the verdict?" without
+reading the user's history: misses run one query on the ``food_scans``
+composite index (user_id, food_id, created_at DESC) and recent answers are
+kept in an LRU. Scans committed by the history queue update the LRU
+directly, so a rescan on this worker never needs the query.
+"""
+import itertools
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..cache import MemoryCache
+from ..config import settings
+from ..repositories import StorageError, get_repositories
+from .history_stats import scan_verdict
+
+
+def _timestamp(value: Any) -> float:
+    if not isinstance(value, datetime):
+        return 0.0
+    if value.tzinfo is None:
+        # Records written by this app use naive UTC datetimes.
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def scan_summary(doc_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a scan record returned as ``previous_scan``."""
+    analysis = record.get("analysis_result") or {}
+    allergens = analysis.get("detectedAllergens") or analysis.get("detected_allergens") or []
+    return {
+        "scan_id": doc_id,
+        "scan_type": record.get("scan_type"),
+        "food_name": record.get("food_name"),
+        "scanned_at": record.get("created_at"),
+        "verdict": scan_verdict(analysis),
+        "detected_allergens": [str(allergen) for allergen in allergens if allergen],
+    }
+
+
+class ScanIndex:
+    """LRU of each user's latest scan per ``food_id`` in front of Firestore."""
+
+    def __init__(self, max_entries: int = 50000, ttl_seconds: float = 300.0):
+        self.ttl_seconds = ttl_seconds
+        # Cached summaries, or False for "never scanned"
+        self._cache = MemoryCache(max_entries)
+        # A user's generation changes when their history is cleared or
+        # replaced, orphaning their cached entries. It lives in the same
+        # LRU: it is touched on every lookup of the user and set after
+        # their old entries, so it is evicted or expires only after them,
+        # and fresh numbers are never reused.
+        self._generation_ids = itertools.count(1)
+
+    def _generation_key(self, user_id: str) -> str:
+        return f"{user_id}:generation"
+
+    def _key(self, user_id: str, food_id: Any) -> str:
+        return f"{user_id}:{self._cache.get(self._generation_key(user_id)) or 0}:{food_id}"
+
+    def _store(self, key: str, summary: Dict[str, Any]) -> None:
+        cached = self._cache.get(key)
+        if cached and _timestamp(cached["scanned_at"]) > _timestamp(summary["scanned_at"]):
+            return
+        self._cache.set(key, summary, self.ttl_seconds)
+
+    async def previous_scan(self, user_id: str, food_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The user's latest committed scan of ``food_id``, or ``None``.
+
+        Storage errors are logged and treated as "not found" so a scan
+        never fails because of this lookup.
+        """
+        if not food_id:
+            return None
+        key = self._key(user_id, food_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached or None
+
+        try:
+            document = await get_repositories().food_scans.latest_for_food(user_id, str(food_id))
+        except StorageError as e:
+            print(f"WARNING: Previous scan lookup failed for {user_id}: {e}")
+            return None
+        summary = scan_summary(*document) if document else None
+        if self._key(user_id, food_id) != key:
+            # Invalidated while the query ran; do not cache under the old generation.
+            return summary
+        if summary is not None:
+            self._store(key, summary)
+        elif self._cache.get(key) is None:
+            self._cache.set(key, False, self.ttl_seconds)
+        # A scan committed while the query ran takes precedence.
+        return self._cache.get(key) or summary
+
+    def record_added(self, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Index committed scans."""
+        for doc_id, record in documents:
+            user_id, food_id = record.get("user_id"), record.get("food_id")
+            if user_id and food_id:
+                self._store(self._key(user_id, food_id), scan_summary(doc_id, record))
+
+    def record_deleted(self, user_id: str, record: Dict[str, Any]) -> None:
+        # The next lookup finds whichever scan is now the latest.
+        if record.get("food_id"):
+            self._cache.delete(self._key(user_id, record["food_id"]))
+
+    def invalidate_user(self, user_id: str) -> None:
+        self._cache.set(self._generation_key(user_id), next(self._generation_ids), self.ttl_seconds)
+
+
+# Create a singleton instance
+scan_index = ScanIndex(
+    max_entries=settings.SCAN_INDEX_MAX_ENTRIES,
+    ttl_seconds=settings.SCAN_INDEX_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,69 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+
+class TokenStore:
+    """SQLite-backed key/value store for OAuth tokens and other small values.
+
+    Replaces ``shelve``: every thread gets its own connection and the database
+    runs in WAL mode, so several threads or worker processes can read and write
+    the same file concurrently. Values are stored JSON-encoded.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_store ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._connection().execute(
+            "SELECT value FROM token_store WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        self.update({key: value})
+
+    def update(self, values: Dict[str, Any]) -> None:
+        """Write several keys in a single transaction."""
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO token_store (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in values.items()],
+            )
+
+    def delete(self, key: str) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM token_store WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,70 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class UpstreamStatus:
+    """Passive health record for an upstream API, updated by real requests.
+
+    Readiness reporting reads this instead of probing APIs that are metered
+    (FatSecret's free tier allows 1000 requests/day).
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.last_success_at: Optional[float] = None
+        self.last_failure_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def begin(self) -> None:
+        self.in_flight += 1
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.in_flight -= 1
+        if error is None:
+            self.last_success_at = time.time()
+        else:
+            self.last_failure_at = time.time()
+            self.last_error = str(error)
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Count one request as in flight until the block exits, however it exits.
+
+        Exceptions are recorded as failures; cancellation (client
+        disconnects, cancelled prefetches) only releases the slot.
+        """
+        self.begin()
+        try:
+            yield
+        except Exception as exc:
+            self.end(exc)
+            raise
+        except BaseException:
+            self.in_flight -= 1
+            raise
+        self.end()
+
+    @property
+    def saturation(self) -> Optional[float]:
+        """Share of the connection pool in use, if the pool is bounded."""
+        if not self.max_concurrency:
+            return None
+        return self.in_flight / self.max_concurrency
+
+    @property
+    def healthy(self) -> bool:
+        """False when the most recent request failed."""
+        if self.last_failure_at is None:
+            return True
+        return self.last_success_at is not None and self.last_success_at > self.last_failure_at
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "saturation": self.saturation,
+            "last_success_at": self.last_success_at,
+            "last_failure_at": self.last_failure_at,
+            "last_error": self.last_error,
+        }
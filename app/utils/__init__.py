@@ -10,12 +10,37 @@ from .helpers import (
     format_allergen_list,
     calculate_risk_score,
     generate_food_id,
-    save_scan_to_history,
     format_confidence_score,
     sanitize_food_name,
     extract_barcode_from_text,
     validate_barcode
 )
+from .allergens import (
+    STANDARD_ALLERGENS,
+    encode_profile,
+    encode_allergen_tags,
+    decode_mask,
+    profile_allergen_names,
+    is_safe,
+    safe_profiles,
+    safe_foods,
+    allergen_matcher
+)
+from .ingredients import (
+    Ingredient,
+    IngredientList,
+    parse_ingredients,
+    ingredient_names
+)
+from .food_details import (
+    normalize_food_details,
+    analysis_input,
+    clear_food_details_cache
+)
+from .nutrition import (
+    parse_nutrition,
+    parse_nutrition_many
+)
 
 __all__ = [
     "decode_base64_audio",
@@ -25,9 +50,26 @@ __all__ = [
     "format_allergen_list",
     "calculate_risk_score",
     "generate_food_id",
-    "save_scan_to_history",
     "format_confidence_score",
     "sanitize_food_name",
     "extract_barcode_from_text",
-    "validate_barcode"
+    "validate_barcode",
+    "STANDARD_ALLERGENS",
+    "encode_profile",
+    "encode_allergen_tags",
+    "decode_mask",
+    "profile_allergen_names",
+    "is_safe",
+    "safe_profiles",
+    "safe_foods",
+    "allergen_matcher",
+    "Ingredient",
+    "IngredientList",
+    "parse_ingredients",
+    "ingredient_names",
+    "normalize_food_details",
+    "analysis_input",
+    "clear_food_details_cache",
+    "parse_nutrition",
+    "parse_nutrition_many"
 ]
@@ -0,0 +1,489 @@
+"""
+Bitmask encoding of allergen profiles and food allergen tags.
+
+Each of the 14 standard allergens owns a fixed bit; custom allergens are
+interned to bits above them. A food is safe for a profile when
+``food_mask & profile_mask == 0``. Masks are plain Python ints so they can
+grow past 64 bits; for vectorized checks they are split into little-endian
+``uint64`` words and stacked into a NumPy matrix.
+
+Custom allergen bit positions are assigned per process and must not be
+persisted; store the allergen names and re-encode instead. Only custom
+allergens declared in profiles are given bits; food tags are mapped onto
+standard allergens (by name, synonym or ingredient keyword) or onto
+custom allergens that some profile already declares.
+"""
+import re
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+from pydantic import BaseModel
+
+# NumPy is imported inside the vectorized helpers so that importing this
+# module (and everything that depends on it) stays cheap at startup.
+if TYPE_CHECKING:
+    import numpy as np
+
+
+STANDARD_ALLERGENS: Tuple[str, ...] = (
+    "peanuts",
+    "tree_nuts",
+    "shellfish",
+    "fish",
+    "gluten",
+    "dairy",
+    "eggs",
+    "soy",
+    "sesame",
+    "sulfites",
+    "mustard",
+    "celery",
+    "lupin",
+    "mollusks",
+)
+
+ALLERGEN_BITS: Dict[str, int] = {name: 1 << i for i, name in enumerate(STANDARD_ALLERGENS)}
+STANDARD_MASK = (1 << len(STANDARD_ALLERGENS)) - 1
+
+# Alternative spellings that food tags commonly use for the standard allergens.
+ALLERGEN_SYNONYMS: Dict[str, str] = {
+    "peanut": "peanuts",
+    "groundnut": "peanuts",
+    "tree nut": "tree_nuts",
+    "tree nuts": "tree_nuts",
+    "nuts": "tree_nuts",
+    "crustacean": "shellfish",
+    "crustaceans": "shellfish",
+    "wheat": "gluten",
+    "cereals containing gluten": "gluten",
+    "milk": "dairy",
+    "lactose": "dairy",
+    "egg": "eggs",
+    "soya": "soy",
+    "soybean": "soy",
+    "soybeans": "soy",
+    "sesame seeds": "sesame",
+    "sulphites": "sulfites",
+    "sulphur dioxide": "sulfites",
+    "sulfur dioxide": "sulfites",
+    "molluscs": "mollusks",
+    "mollusc": "mollusks",
+    "mollusk": "mollusks",
+    "lupine": "lupin",
+}
+
+# Ingredient keywords that indicate a standard allergen, used for local detection.
+ALLERGEN_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "peanuts": ("peanut", "peanuts", "groundnut", "groundnuts", "arachis"),
+    "tree_nuts": (
+        "almond", "almonds", "cashew", "cashews", "walnut", "walnuts", "pecan",
+        "pecans", "hazelnut", "hazelnuts", "pistachio", "pistachios",
+        "macadamia", "brazil nut", "brazil nuts", "praline", "marzipan",
+    ),
+    "shellfish": (
+        "shrimp", "shrimps", "prawn", "prawns", "crab", "lobster", "crayfish",
+        "langoustine", "krill",
+    ),
+    "fish": (
+        "fish", "salmon", "tuna", "cod", "anchovy", "anchovies", "sardine",
+        "sardines", "mackerel", "haddock", "trout", "tilapia", "pollock",
+    ),
+    "gluten": (
+        "wheat", "gluten", "barley", "rye", "spelt", "semolina", "durum",
+        "kamut", "malt", "couscous", "bulgur",
+    ),
+    "dairy": (
+        "milk", "butter", "cheese", "cream", "whey", "casein", "caseinate",
+        "yogurt", "yoghurt", "lactose", "ghee", "buttermilk", "cheddar",
+        "mozzarella", "parmesan", "ricotta", "mascarpone", "paneer",
+    ),
+    "eggs": ("egg", "eggs", "albumin", "albumen", "mayonnaise", "meringue"),
+    "soy": ("soy", "soya", "soybean", "soybeans", "tofu", "edamame", "miso", "tempeh"),
+    "sesame": ("sesame", "tahini", "gomasio"),
+    "sulfites": (
+        "sulfite", "sulfites", "sulphite", "sulphites", "metabisulfite",
+        "metabisulphite", "sulfur dioxide", "sulphur dioxide",
+    ),
+    "mustard": ("mustard",),
+    "celery": ("celery", "celeriac"),
+    "lupin": ("lupin", "lupine"),
+    "mollusks": (
+        "clam", "clams", "mussel", "mussels", "oyster", "oysters", "scallop",
+        "scallops", "squid", "calamari", "octopus", "snail", "escargot",
+    ),
+}
+
+ProfileLike = Union[Mapping[str, Any], BaseModel]
+
+_WORD_BITS = 64
+_WORD_MASK = (1 << _WORD_BITS) - 1
+_WHITESPACE_RE = re.compile(r"[\s_]+")
+_KEYWORD_BITS: Dict[str, int] = {
+    keyword: 1 << STANDARD_ALLERGENS.index(allergen)
+    for allergen, keywords in ALLERGEN_KEYWORDS.items()
+    for keyword in keywords
+}
+_KEYWORD_RE = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, _KEYWORD_BITS), key=len, reverse=True)) + r")\b"
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_allergen_name(name: str) -> str:
+    """Lowercase and collapse whitespace/underscores to single spaces."""
+    return _WHITESPACE_RE.sub(" ", name).strip().lower()
+
+
+class CustomAllergenRegistry:
+    """Interns custom allergen names to stable bit positions for this process."""
+
+    def __init__(self, first_bit: int = len(STANDARD_ALLERGENS)):
+        self._first_bit = first_bit
+        self._bits: Dict[str, int] = {}
+        self._names: List[str] = []
+        # (name, bit) pairs, replaced as a whole on intern so readers need no lock
+        self._items: Tuple[Tuple[str, int], ...] = ()
+        self._lock = threading.Lock()
+
+    def intern(self, name: str) -> int:
+        """Return the bit index for ``name``, allocating one if needed."""
+        key = normalize_allergen_name(name)
+        bit = self._bits.get(key)
+        if bit is not None:
+            return bit
+        with self._lock:
+            bit = self._bits.get(key)
+            if bit is None:
+                bit = self._first_bit + len(self._names)
+                self._bits[key] = bit
+                self._names.append(key)
+                self._items = self._items + ((key, bit),)
+        return bit
+
+    def get(self, name: str) -> Optional[int]:
+        """The bit index for ``name`` if it has been interned, without allocating."""
+        return self._bits.get(normalize_allergen_name(name))
+
+    def name(self, bit: int) -> str:
+        return self._names[bit - self._first_bit]
+
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    def items(self) -> Tuple[Tuple[str, int], ...]:
+        """Every interned ``(name, bit)`` pair, in allocation order."""
+        return self._items
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+custom_allergen_registry = CustomAllergenRegistry()
+
+
+def _as_mapping(profile: ProfileLike) -> Mapping[str, Any]:
+    if isinstance(profile, BaseModel):
+        return profile.model_dump()
+    return profile or {}
+
+
+def _standard_bit(key: str) -> int:
+    standard = key.replace(" ", "_")
+    if standard in ALLERGEN_BITS:
+        return ALLERGEN_BITS[standard]
+    synonym = ALLERGEN_SYNONYMS.get(key)
+    if synonym:
+        return ALLERGEN_BITS[synonym]
+    return 0
+
+
+def _keyword_mask(text: str) -> int:
+    mask = 0
+    for match in _KEYWORD_RE.finditer(text):
+        mask |= _KEYWORD_BITS[match.group(1)]
+    return mask
+
+
+def _canonical_bit(name: str) -> int:
+    key = normalize_allergen_name(name)
+    return _standard_bit(key) or 1 << custom_allergen_registry.intern(key)
+
+
+def _tag_mask(tag: str) -> int:
+    key = normalize_allergen_name(tag)
+    mask = _standard_bit(key) or _keyword_mask(key)
+    for name, bit in custom_allergen_registry.items():
+        if name in key:
+            mask |= 1 << bit
+    return mask
+
+
+def encode_allergen_tags(tags: Iterable[str], declare: bool = False) -> int:
+    """Encode allergen tags (e.g. ``FoodDetails.allergens``) as a mask.
+
+    Free-form food tags such as "Milk protein" map onto the standard
+    allergens they mention and onto already declared custom allergens;
+    anything else is ignored. With ``declare=True`` (profile custom
+    allergens) unknown names are registered as new custom allergens.
+    """
+    mask = 0
+    for tag in tags or ():
+        if tag and tag.strip():
+            mask |= _canonical_bit(tag) if declare else _tag_mask(tag)
+    return mask
+
+
+def detect_allergens(texts: Iterable[str], custom_names: Iterable[str] = ()) -> int:
+    """Locally detect allergens in ingredient/name texts and return their mask.
+
+    Standard allergens are found through ``ALLERGEN_KEYWORDS``; each name in
+    ``custom_names`` is matched as a plain substring.
+    """
+    text = normalize_allergen_name(" | ".join(t for t in texts if t))
+    mask = _keyword_mask(text)
+    for name in custom_names:
+        key = normalize_allergen_name(name)
+        if key and key in text:
+            mask |= _canonical_bit(key)
+    return mask
+
+
+def _standard_profile_mask(data: Mapping[str, Any]) -> int:
+    mask = 0
+    for name, bit in ALLERGEN_BITS.items():
+        if data.get(name) is True:
+            mask |= bit
+    return mask
+
+
+def encode_profile(profile: ProfileLike) -> int:
+    """Encode an allergen profile: standard flags plus its custom allergens."""
+    data = _as_mapping(profile)
+    return _standard_profile_mask(data) | encode_allergen_tags(data.get("custom_allergens") or (), declare=True)
+
+
+@lru_cache(maxsize=1 << len(STANDARD_ALLERGENS))
+def _standard_names(mask: int) -> Tuple[str, ...]:
+    return tuple(
+        name.replace("_", " ")
+        for name, bit in ALLERGEN_BITS.items()
+        if mask & bit
+    )
+
+
+def decode_mask(mask: int) -> List[str]:
+    """Return readable allergen names for every bit set in ``mask``."""
+    names = list(_standard_names(mask & STANDARD_MASK))
+    custom = mask >> len(STANDARD_ALLERGENS)
+    bit = len(STANDARD_ALLERGENS)
+    while custom:
+        if custom & 1:
+            names.append(custom_allergen_registry.name(bit))
+        custom >>= 1
+        bit += 1
+    return names
+
+
+def profile_allergen_names(profile: ProfileLike) -> List[str]:
+    """Readable list of the allergens a profile avoids, custom ones verbatim."""
+    data = _as_mapping(profile)
+    names = list(_standard_names(_standard_profile_mask(data)))
+    names.extend(data.get("custom_allergens") or [])
+    return names
+
+
+def _stem(token: str) -> str:
+    """Light plural stemming so "peanuts"/"peanut" and "anchovies"/"anchovy" agree."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "sses", "xes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+@lru_cache(maxsize=8192)
+def allergen_tokens(text: str) -> Tuple[str, ...]:
+    """Lowercased, stemmed word tokens of an allergen or ingredient name."""
+    return tuple(_stem(token) for token in _TOKEN_RE.findall(text.lower()))
+
+
+# Words that end in an allergen phrase without containing the allergen.
+# Only the compound check skips them; a profile phrase equal to the whole
+# word (a custom "coconut") still matches.
+NOT_COMPOUNDS: FrozenSet[str] = frozenset({"coconut", "doughnut", "donut", "butternut"})
+
+# Single-token phrases that mean something else after certain words:
+# "cocoa butter" and "peanut butter" are not dairy. A phrase spelling out
+# the whole term (a custom "cocoa butter") still matches.
+FALSE_FRIENDS: Dict[str, FrozenSet[str]] = {
+    "butter": frozenset({
+        "cocoa", "cacao", "shea", "nut", "peanut", "almond", "cashew",
+        "hazelnut", "pistachio", "sunflower", "seed", "apple", "mango",
+    }),
+}
+
+
+class AllergenMatcher:
+    """Token index over the allergen phrases of one profile.
+
+    A name matches when one of the profile's phrases occurs in it as a run
+    of whole tokens ("peanut" in "peanut butter"), when the name itself is
+    a run of tokens inside a phrase ("nut" in "brazil nuts"), or when a
+    token of the name is a compound ending in a phrase ("swordfish",
+    "walnuts" for "nut"). ``NOT_COMPOUNDS`` and ``FALSE_FRIENDS`` list
+    the look-alikes ("coconut", "cocoa butter") that are not counted.
+    Phrases are stored in a token trie, every
+    contiguous token run of every phrase is kept in a set, and phrases are
+    also indexed by their joined spelling for the compound check, so
+    matching a name costs a few hash lookups per token instead of a scan
+    over the whole profile.
+    """
+
+    _END = ""  # trie key marking the end of a phrase; tokens are never empty
+    # Shorter phrases would turn up as the tail of too many unrelated words.
+    _MIN_SUFFIX = 3
+
+    def __init__(self, phrases: Iterable[str]):
+        self._trie: Dict[str, Any] = {}
+        self._fragments: Set[Tuple[str, ...]] = set()
+        self._suffixes: Set[str] = set()
+        for phrase in phrases:
+            tokens = allergen_tokens(phrase)
+            if not tokens:
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[self._END] = True
+            for start in range(len(tokens)):
+                for end in range(start + 1, len(tokens) + 1):
+                    self._fragments.add(tokens[start:end])
+            joined = "".join(tokens)
+            if len(joined) >= self._MIN_SUFFIX:
+                self._suffixes.add(joined)
+        self._suffix_lengths = sorted({len(suffix) for suffix in self._suffixes})
+
+    def _compound_match(self, token: str) -> bool:
+        if token in NOT_COMPOUNDS:
+            return False
+        suffixes = self._suffixes
+        for length in self._suffix_lengths:
+            if length >= len(token):
+                break
+            if token[-length:] in suffixes:
+                return True
+        return False
+
+    def matches(self, name: str) -> bool:
+        tokens = allergen_tokens(name)
+        if not tokens:
+            return False
+        if tokens in self._fragments:
+            return True
+        trie = self._trie
+        for start in range(len(tokens)):
+            node = trie
+            for end in range(start, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                if self._END in node and not (
+                    end == start and start and tokens[start - 1] in FALSE_FRIENDS.get(tokens[start], ())
+                ):
+                    return True
+        return any(self._compound_match(token) for token in tokens)
+
+    def count_matches(self, names: Iterable[str]) -> int:
+        """Number of ``names`` that match the profile."""
+        return sum(1 for name in names if name and self.matches(name))
+
+
+_SYNONYMS_BY_ALLERGEN: Dict[str, Tuple[str, ...]] = {
+    allergen: tuple(alias for alias, target in ALLERGEN_SYNONYMS.items() if target == allergen)
+    for allergen in STANDARD_ALLERGENS
+}
+
+
+@lru_cache(maxsize=1024)
+def _matcher(standard_mask: int, custom_allergens: Tuple[str, ...]) -> AllergenMatcher:
+    phrases: List[str] = list(custom_allergens)
+    for name, bit in ALLERGEN_BITS.items():
+        if standard_mask & bit:
+            phrases.append(name)
+            phrases.extend(_SYNONYMS_BY_ALLERGEN[name])
+            phrases.extend(ALLERGEN_KEYWORDS[name])
+    return AllergenMatcher(phrases)
+
+
+def allergen_matcher(profile: ProfileLike) -> AllergenMatcher:
+    """Matcher for a profile, cached by the profile's allergen contents.
+
+    Standard allergens are expanded with their synonyms and ingredient
+    keywords, so a "dairy" profile also matches "whey" or "milk powder".
+    """
+    data = _as_mapping(profile)
+    return _matcher(
+        _standard_profile_mask(data),
+        tuple(data.get("custom_allergens") or ()),
+    )
+
+
+def is_safe(food_mask: int, profile_mask: int) -> bool:
+    """True when the food contains none of the profile's allergens."""
+    return not (food_mask & profile_mask)
+
+
+def words_needed(masks: Iterable[int]) -> int:
+    """Number of 64-bit words required to hold the widest mask."""
+    width = max((mask.bit_length() for mask in masks), default=0)
+    return max(1, -(-width // _WORD_BITS))
+
+
+def mask_to_words(mask: int, n_words: int) -> "np.ndarray":
+    """Split ``mask`` into ``n_words`` little-endian uint64 words."""
+    import numpy as np
+
+    return np.array(
+        [(mask >> (_WORD_BITS * i)) & _WORD_MASK for i in range(n_words)],
+        dtype=np.uint64,
+    )
+
+
+def build_mask_matrix(masks: Sequence[int], n_words: int = 0) -> "np.ndarray":
+    """Stack masks into an ``(len(masks), n_words)`` uint64 matrix."""
+    import numpy as np
+
+    n_words = max(n_words, words_needed(masks))
+    matrix = np.zeros((len(masks), n_words), dtype=np.uint64)
+    for row, mask in enumerate(masks):
+        word = 0
+        while mask:
+            matrix[row, word] = mask & _WORD_MASK
+            mask >>= _WORD_BITS
+            word += 1
+    return matrix
+
+
+def overlap_rows(matrix: "np.ndarray", mask: int) -> "np.ndarray":
+    """Boolean array, True where a row of ``matrix`` shares a bit with ``mask``.
+
+    Bits of ``mask`` beyond the matrix width cannot overlap any row and are
+    ignored.
+    """
+    import numpy as np
+
+    words = mask_to_words(mask, matrix.shape[1])
+    return np.bitwise_and(matrix, words).any(axis=1)
+
+
+def safe_profiles(food_mask: int, profile_masks: Sequence[int]) -> "np.ndarray":
+    """Check one food against many profiles; True where the food is safe."""
+    return ~overlap_rows(build_mask_matrix(profile_masks), food_mask)
+
+
+def safe_foods(profile_mask: int, food_masks: Sequence[int]) -> "np.ndarray":
+    """Check many foods against one profile; True where the food is safe."""
+    return ~overlap_rows(build_mask_matrix(food_masks), profile_mask)
@@ -0,0 +1,111 @@
+"""
+FatSecret ``food.get`` response -> ``FoodDetails``.
+
+Every route that looks up a food (details, batch, barcode and voice scans)
+converts the raw payload here, so the servings, nutrient numbers and
+ingredient statement are read the same way everywhere. Converted foods are
+memoized by ``food_id``: a food that is scanned again is returned without
+re-parsing its ingredients or re-validating the model.
+"""
+from typing import Any, Dict, List, Optional
+
+from ..cache import MemoryCache
+from ..config import settings
+from ..models.food import FoodDetails, NutritionInfo
+from .ingredients import parse_ingredients
+
+# FatSecret serving field -> NutritionInfo field.
+SERVING_NUTRIENTS = {
+    "calories": "calories",
+    "protein": "protein",
+    "carbohydrate": "carbohydrates",
+    "fat": "fat",
+    "fiber": "fiber",
+    "sugar": "sugar",
+    "sodium": "sodium",
+    "cholesterol": "cholesterol",
+    "saturated_fat": "saturated_fat",
+    "trans_fat": "trans_fat",
+}
+
+_normalized = MemoryCache(max_entries=5000)
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def servings(food_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The food's servings as a list; FatSecret sends a lone serving as an object."""
+    serving = (food_data.get("servings") or {}).get("serving") or []
+    if isinstance(serving, dict):
+        serving = [serving]
+    return serving
+
+
+def serving_nutrition(serving: Dict[str, Any]) -> NutritionInfo:
+    """Nutrition for one FatSecret serving; nutrients it omits stay ``None``."""
+    nutrition: Dict[str, Any] = {
+        field: _number(serving.get(key)) for key, field in SERVING_NUTRIENTS.items()
+    }
+    nutrition["serving_size"] = serving.get("serving_description") or serving.get("serving_size")
+    nutrition["serving_unit"] = serving.get("measurement_description")
+    nutrition["basis"] = "per_serving"
+    return NutritionInfo(**nutrition)
+
+
+def normalize_food_details(
+    result: Dict[str, Any], food_id: Optional[str] = None, barcode: Optional[str] = None
+) -> FoodDetails:
+    """Convert a ``food.get`` response into ``FoodDetails``.
+
+    Nutrition comes from the first serving; ingredients and the allergens
+    the label declares come from the ingredient statement. The returned
+    object is shared with later callers for the same food and must not be
+    modified.
+    """
+    food_data = result.get("food") or {}
+    food_id = str(food_data.get("food_id") or food_id or "")
+    details = _normalized.get(food_id) if food_id and food_data else None
+
+    if details is None:
+        serving = servings(food_data)
+        statement = (food_data.get("ingredients") or "").strip()
+        label = parse_ingredients(statement)
+        details = FoodDetails(
+            food_id=food_id,
+            food_name=food_data.get("food_name", ""),
+            brand_name=food_data.get("brand_name"),
+            food_type=food_data.get("food_type"),
+            food_url=food_data.get("food_url"),
+            food_description=food_data.get("food_description"),
+            # A statement that is only a "Contains:" line is kept as-is
+            ingredients=label.names() or ([statement] if statement else []),
+            nutrition=serving_nutrition(serving[0]) if serving else None,
+            allergens=label.contains or None,
+            may_contain=label.may_contain or None,
+        )
+        if food_id and food_data:
+            _normalized.set(food_id, details, settings.FATSECRET_CACHE_TTL_SECONDS)
+
+    if barcode is not None and details.barcode != barcode:
+        details = details.model_copy(update={"barcode": barcode})
+    return details
+
+
+def analysis_input(food: FoodDetails) -> Dict[str, Any]:
+    """What the allergen analysis is told about a food, declared allergens included."""
+    return {
+        "food_name": food.food_name,
+        "ingredients": food.ingredients or [],
+        "contains": food.allergens or [],
+        "may_contain": food.may_contain or [],
+        "nutrition": food.nutrition.dict() if food.nutrition else {},
+    }
+
+
+def clear_food_details_cache() -> None:
+    _normalized.clear()
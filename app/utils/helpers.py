@@ -5,12 +5,11 @@ import base64
 import io
 import re
 from typing import List, Dict, Any, Optional
-from PIL import Image
-import aiofiles
 import os
-from datetime import datetime
 
-from ..firebase import get_firestore_client
+from .allergens import allergen_matcher
+from .ingredients import ingredient_names
+from .nutrition import parse_nutrition
 
 
 def decode_base64_audio(audio_base64: str) -> bytes:
@@ -43,6 +42,9 @@ def validate_image_file(file_content: bytes) -> bool:
     Returns:
         True if valid image, False otherwise
     """
+    # Pillow is only needed here; importing it lazily keeps startup fast
+    from PIL import Image
+
     try:
         image = Image.open(io.BytesIO(file_content))
         image.verify()
@@ -54,6 +56,10 @@ def validate_image_file(file_content: bytes) -> bool:
 def extract_ingredients_from_text(text: str) -> List[str]:
     """
     Extract ingredients from a text string.
+
+    Nested groups such as "chocolate (sugar, cocoa butter)" are flattened,
+    parents first; "contains:"/"may contain:" clauses are not ingredients
+    and are left out. Use ``parse_ingredients`` for the structured tree.
     
     Args:
         text: Text containing ingredients
@@ -61,36 +67,15 @@ def extract_ingredients_from_text(text: str) -> List[str]:
     Returns:
         List of extracted ingredients
     """
-    if not text:
-        return []
-    
-    # Common ingredient separators
-    separators = [',', ';', '\n', '|', '•']
-    
-    ingredients = []
-    for separator in separators:
-        if separator in text:
-            ingredients = [ingredient.strip() for ingredient in text.split(separator)]
-            break
-    
-    if not ingredients:
-        ingredients = [text.strip()]
-    
-    # Clean up ingredients
-    cleaned_ingredients = []
-    for ingredient in ingredients:
-        ingredient = ingredient.strip()
-        if ingredient and len(ingredient) > 1:
-            # Remove common prefixes
-            ingredient = re.sub(r'^[-•\*\d+\.\)\s]+', '', ingredient)
-            cleaned_ingredients.append(ingredient)
-    
-    return cleaned_ingredients
+    return [name for name in ingredient_names(text) if len(name) > 1]
 
 
 def parse_nutrition_data(nutrition_text: str) -> Dict[str, float]:
     """
     Parse nutrition information from text.
+
+    Thin wrapper over ``parse_nutrition`` kept for callers that expect a
+    plain dictionary; carbohydrates are reported under ``carbs``.
     
     Args:
         nutrition_text: Text containing nutrition information
@@ -98,27 +83,14 @@ def parse_nutrition_data(nutrition_text: str) -> Dict[str, float]:
     Returns:
         Dictionary of nutrition values
     """
-    nutrition = {}
-    
     if not nutrition_text:
-        return nutrition
-    
-    # Common nutrition patterns
-    patterns = {
-        'calories': r'(\d+(?:\.\d+)?)\s*(?:cal|kcal|calories)',
-        'protein': r'(\d+(?:\.\d+)?)\s*(?:g|grams?)\s*(?:protein)',
-        'carbs': r'(\d+(?:\.\d+)?)\s*(?:g|grams?)\s*(?:carbs|carbohydrates)',
-        'fat': r'(\d+(?:\.\d+)?)\s*(?:g|grams?)\s*(?:fat)',
-        'fiber': r'(\d+(?:\.\d+)?)\s*(?:g|grams?)\s*(?:fiber)',
-        'sugar': r'(\d+(?:\.\d+)?)\s*(?:g|grams?)\s*(?:sugar)',
-        'sodium': r'(\d+(?:\.\d+)?)\s*(?:mg|milligrams?)\s*(?:sodium)',
-    }
-    
-    for key, pattern in patterns.items():
-        match = re.search(pattern, nutrition_text.lower())
-        if match:
-            nutrition[key] = float(match.group(1))
-    
+        return {}
+
+    info = parse_nutrition(nutrition_text)
+    nutrition = {}
+    for key, value in info.model_dump(exclude_none=True).items():
+        if isinstance(value, float):
+            nutrition["carbs" if key == "carbohydrates" else key] = value
     return nutrition
 
 
@@ -158,22 +130,8 @@ def calculate_risk_score(detected_allergens: List[str], user_allergens: Dict[str
     if not detected_allergens:
         return 0.0
     
-    # Get user's allergens
-    user_allergen_list = []
-    for allergen, has_allergy in user_allergens.items():
-        if has_allergy and allergen not in ['custom_allergens', 'severity_level']:
-            user_allergen_list.append(allergen.replace('_', ' '))
-    
-    if user_allergens.get('custom_allergens'):
-        user_allergen_list.extend(user_allergens['custom_allergens'])
-    
-    # Calculate matches
-    matches = 0
-    for detected in detected_allergens:
-        for user_allergen in user_allergen_list:
-            if user_allergen.lower() in detected.lower() or detected.lower() in user_allergen.lower():
-                matches += 1
-                break
+    # Count detected allergens that match the (cached) profile matcher
+    matches = allergen_matcher(user_allergens).count_matches(detected_allergens)
     
     # Base risk score
     risk_score = matches / len(detected_allergens) if detected_allergens else 0.0
@@ -211,44 +169,6 @@ def generate_food_id(food_name: str, brand: Optional[str] = None) -> str:
     return f"food_{hash_object.hexdigest()[:8]}"
 
 
-async def save_scan_to_history(
-    user_id: str,
-    scan_type: str,
-    food_data: Dict[str, Any],
-    analysis_result: Optional[Dict[str, Any]] = None
-) -> str:
-    """
-    Save a scan to the user's scan history.
-    
-    Args:
-        user_id: User ID
-        scan_type: Type of scan (image, barcode, voice)
-        food_data: Food information
-        analysis_result: AI analysis result
-        
-    Returns:
-        Scan ID
-    """
-    scan_data = {
-        'user_id': user_id,
-        'scan_type': scan_type,
-        'food_id': food_data.get('food_id'),
-        'food_name': food_data.get('food_name', 'Unknown'),
-        'scan_data': food_data,
-        'analysis_result': analysis_result,
-        'created_at': datetime.utcnow()
-    }
-    
-    try:
-        db = get_firestore_client()
-        doc_ref = db.collection('food_scans').document()
-        doc_ref.set(scan_data)
-        return doc_ref.id
-    except Exception as e:
-        print(f"Failed to save scan history: {e}")
-        return ""
-
-
 def format_confidence_score(score: float) -> str:
     """
     Format confidence score into a human-readable string.
@@ -0,0 +1,224 @@
+"""
+Single-pass tokenizer for food label ingredient statements.
+
+Turns text such as::
+
+    Ingredients: chocolate 20% (sugar, cocoa butter, milk), emulsifier (E322),
+    salt. Contains: milk, soy. May contain: nuts.
+
+into an ``IngredientList`` tree. Parentheses, brackets and braces nest
+sub-ingredients; percentages and E-numbers are pulled out of the names;
+"contains:" and "may contain:" clauses are collected separately. All
+patterns are compiled once at import time and the input is scanned once.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+# Structural delimiters: brackets and separators. A full stop only separates
+# when followed by whitespace or the end and not preceded by a digit, so
+# "2.5%" and "1. sugar" stay in one run. Splitting with a capturing group
+# yields text runs at even indices and the delimiter after each at odd ones.
+_SPLIT_RE = re.compile(r"([(\[{)\]},;\n|•·]|(?<!\d)\.(?=\s|$))")
+_OPENERS = frozenset("([{")
+_CLOSERS = frozenset(")]}")
+_LEADING_LABEL_RE = re.compile(r"^\s*ingredients?\s*:\s*", re.IGNORECASE)
+_CLAUSE_RE = re.compile(
+    r"(?:(?P<less>(?:contains?\s+)?(?:\d+(?:\.\d+)?\s*%|less\s+than\s+\d+(?:\.\d+)?\s*%)"
+    r"(?:\s+or\s+less)?\s+of)"
+    r"|(?P<may>may\s+(?:also\s+)?contains?(?:\s+traces?\s+of)?|traces?\s+of)"
+    r"|(?P<contains>contains?))"
+    r"\s*:?\s*",
+    re.IGNORECASE,
+)
+_CLAUSE_START = frozenset("cCmMtTlL0123456789")
+_ANNOTATION_RE = re.compile(
+    r"(?:<\s*)?(?P<percent>\d+(?:\.\d+)?)\s*%"
+    r"|\b[Ee] ?-?(?P<e_number>\d{3,4}[a-z]?[ivx]*)\b"
+)
+_DIGIT_RE = re.compile(r"\d")
+_BULLET_RE = re.compile(r"^(?:[-*•\s]+|\d+[.)]\s+)+")
+_BULLET_START = frozenset("-*• 0123456789")
+_TRAILING_RE = re.compile(r"[\s*:.†‡]+$")
+_TRAILING_END = frozenset(" *:.†‡")
+_SPACES_RE = re.compile(r"\s{2,}|[\t\r]")
+
+
+@dataclass
+class Ingredient:
+    name: str
+    percent: Optional[float] = None
+    e_number: Optional[str] = None
+    children: List["Ingredient"] = field(default_factory=list)
+
+    def walk(self) -> Iterator["Ingredient"]:
+        """Yield this ingredient followed by all nested sub-ingredients."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+@dataclass
+class IngredientList:
+    ingredients: List[Ingredient] = field(default_factory=list)
+    contains: List[str] = field(default_factory=list)
+    may_contain: List[str] = field(default_factory=list)
+
+    def walk(self) -> Iterator[Ingredient]:
+        for ingredient in self.ingredients:
+            yield from ingredient.walk()
+
+    def names(self) -> List[str]:
+        """Flat list of ingredient names, parents before their sub-ingredients."""
+        return [ingredient.name for ingredient in self.walk() if ingredient.name]
+
+    def e_numbers(self) -> List[str]:
+        return [ingredient.e_number for ingredient in self.walk() if ingredient.e_number]
+
+
+def _make_ingredient(text: str) -> Optional[Ingredient]:
+    if text[0] in _BULLET_START:
+        text = _BULLET_RE.sub("", text)
+        if not text:
+            return None
+
+    # Every annotation contains a digit; most ingredient names do not, and
+    # the plain digit scan is far cheaper than the annotation pattern.
+    percent = None
+    e_number = None
+    if _DIGIT_RE.search(text):
+        for match in _ANNOTATION_RE.finditer(text):
+            if match.group("percent") is not None:
+                if percent is None:
+                    percent = float(match.group("percent"))
+                    text = text.replace(match.group(), "", 1)
+            elif e_number is None:
+                e_number = "E" + match.group("e_number").lower()
+                text = text.replace(match.group(), "", 1).strip(" -") or e_number
+        text = text.strip()
+
+    if text and text[-1] in _TRAILING_END:
+        text = _TRAILING_RE.sub("", text)
+    if "  " in text or "\t" in text or "\r" in text:
+        text = _SPACES_RE.sub(" ", text)
+    name = text.strip()
+    if not name and percent is None and e_number is None:
+        return None
+    return Ingredient(name=name, percent=percent, e_number=e_number)
+
+
+class _Frame:
+    """An open bracket group: the ingredient it belongs to and its children."""
+
+    __slots__ = ("owner", "items", "closed")
+
+    def __init__(self, owner: Optional[Ingredient]):
+        self.owner = owner
+        self.items: List[Ingredient] = []
+        # Ingredient whose bracket group just closed inside this frame; text
+        # that follows it before the next separator continues its name.
+        self.closed: Optional[Ingredient] = None
+
+
+def _attach_group(owner: Ingredient, items: List[Ingredient]) -> None:
+    # "tomatoes (45%)" and "emulsifier (E322)" annotate the owner instead of
+    # introducing a sub-ingredient.
+    if len(items) == 1 and not items[0].children:
+        only = items[0]
+        if not only.name or only.name == only.e_number:
+            if only.percent is not None and owner.percent is None:
+                owner.percent = only.percent
+            if only.e_number and owner.e_number is None:
+                owner.e_number = only.e_number
+            return
+    owner.children.extend(items)
+
+
+def parse_ingredients(text: Optional[str]) -> IngredientList:
+    """Parse an ingredient statement into a structured ``IngredientList``."""
+    result = IngredientList()
+    if not text:
+        return result
+    text = _LEADING_LABEL_RE.sub("", text)
+
+    top = _Frame(None)
+    stack = [top]
+    clause: Optional[List[str]] = None
+
+    def flush(frame: _Frame, raw: str) -> Optional[Ingredient]:
+        nonlocal clause
+        raw = raw.strip()
+        closed = frame.closed
+        if closed is not None:
+            frame.closed = None
+            ingredient = _make_ingredient(raw) if raw else None
+            if ingredient is not None:
+                if ingredient.name:
+                    closed.name = f"{closed.name} {ingredient.name}".strip()
+                if closed.percent is None:
+                    closed.percent = ingredient.percent
+                if closed.e_number is None:
+                    closed.e_number = ingredient.e_number
+            return closed
+        if not raw:
+            return None
+
+        if frame is top and raw[0] in _CLAUSE_START:
+            match = _CLAUSE_RE.match(raw)
+            if match:
+                if match.group("less"):
+                    clause = None
+                else:
+                    clause = result.may_contain if match.group("may") else result.contains
+                raw = raw[match.end():]
+                if not raw:
+                    return None
+
+        ingredient = _make_ingredient(raw)
+        if ingredient is not None:
+            if frame is top and clause is not None:
+                clause.append(ingredient.name)
+            else:
+                frame.items.append(ingredient)
+        return ingredient
+
+    parts = _SPLIT_RE.split(text)
+    last = len(parts) - 1
+    for i in range(0, last, 2):
+        raw, delimiter = parts[i], parts[i + 1]
+        frame = stack[-1]
+        if delimiter in _OPENERS:
+            # A group with no name before it, e.g. a stray "(" after a
+            # separator, is transparent: its items join the enclosing list.
+            stack.append(_Frame(flush(frame, raw)))
+        elif delimiter in _CLOSERS:
+            flush(frame, raw)
+            if len(stack) == 1:  # unmatched closer
+                continue
+            stack.pop()
+            parent = stack[-1]
+            if frame.owner is None:
+                parent.items.extend(frame.items)
+            else:
+                _attach_group(frame.owner, frame.items)
+                parent.closed = frame.owner
+        else:
+            flush(frame, raw)
+            if frame is top and delimiter == ".":
+                clause = None
+
+    flush(stack[-1], parts[last])
+    while len(stack) > 1:
+        frame = stack.pop()
+        if frame.owner is None:
+            stack[-1].items.extend(frame.items)
+        else:
+            _attach_group(frame.owner, frame.items)
+
+    result.ingredients = [item for item in top.items if item.name or item.children]
+    return result
+
+
+def ingredient_names(text: Optional[str]) -> List[str]:
+    """Flattened ingredient names from a label; declared allergen clauses excluded."""
+    return parse_ingredients(text).names()
@@ -0,0 +1,231 @@
+"""
+Single-pass nutrition label parser.
+
+Every nutrient, the per-100g/per-serving marker and the serving size are
+matched by one compiled alternation, so a label is scanned once regardless
+of how many nutrients it lists. Values are normalized to the units used by
+``NutritionInfo``: kcal for energy, milligrams for sodium and cholesterol
+and grams for everything else.
+"""
+import re
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..models.food import NutritionInfo
+
+# Label wording -> NutritionInfo field. ``None`` entries are matched only so
+# that their numbers are not attributed to a neighbouring nutrient
+# ("Calories from Fat 90" is not 90 g of fat).
+NUTRIENT_NAMES: Dict[str, Optional[str]] = {
+    "calories from fat": None,
+    "added sugars": None,
+    "energy": "energy",
+    "calories": "calories",
+    "calorie": "calories",
+    "total fat": "fat",
+    "fat": "fat",
+    "saturated fat": "saturated_fat",
+    "sat fat": "saturated_fat",
+    "saturates": "saturated_fat",
+    "trans fat": "trans_fat",
+    "cholesterol": "cholesterol",
+    "sodium": "sodium",
+    "salt": "salt",
+    "total carbohydrates": "carbohydrates",
+    "total carbohydrate": "carbohydrates",
+    "carbohydrates": "carbohydrates",
+    "carbohydrate": "carbohydrates",
+    "carbs": "carbohydrates",
+    "dietary fiber": "fiber",
+    "dietary fibre": "fiber",
+    "fiber": "fiber",
+    "fibre": "fiber",
+    "total sugars": "sugar",
+    "sugars": "sugar",
+    "sugar": "sugar",
+    "proteins": "protein",
+    "protein": "protein",
+}
+
+# Unit NutritionInfo stores each field in.
+_MILLIGRAM_FIELDS = frozenset({"sodium", "cholesterol"})
+_UNIT_FACTORS = {
+    ("g", "g"): 1.0,
+    ("mg", "g"): 0.001,
+    ("ug", "g"): 0.000001,
+    ("g", "mg"): 1000.0,
+    ("mg", "mg"): 1.0,
+    ("ug", "mg"): 0.001,
+}
+_KJ_PER_KCAL = 4.184
+# 1 g of salt contains 0.4 g (400 mg) of sodium.
+_SODIUM_MG_PER_SALT_G = 400.0
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:[.,]\d+)?"
+_UNIT = r"mg|milligrams?|µg|ug|mcg|kcal|kj|cal(?:ories)?|g|grams?"
+# Before a nutrient name only mass units count: in "1046 kJ / 250 kcal Fat
+# 9 g" the energy figure ends the energy entry and is not an amount of fat.
+_MASS_UNIT = r"mg|milligrams?|µg|ug|mcg|g|grams?"
+# After a nutrient name the number may be followed by the next nutrient's
+# name ("Calories 250 Calories from Fat 110"), so only short units count.
+_SHORT_UNIT = r"mg|µg|ug|mcg|kcal|kj|g"
+_NAMES = "|".join(
+    re.escape(name).replace(r"\ ", r"\s+")
+    for name in sorted(NUTRIENT_NAMES, key=len, reverse=True)
+)
+
+_BASIS_WORDS = r"100\s*(?:g|ml)|serving|portion|pack"
+
+_LABEL_RE = re.compile(
+    # Serving size: "Serving size 1 cup (228g)", up to the end of the line or
+    # the next nutrient or basis marker when a label is flattened onto one line
+    rf"serving\s+size\s*:?\s*(?P<serving>[^\n\x00]*?[^\s\x00])"
+    rf"(?=[ \t]*(?:[\n\x00]|$|\b(?:{_NAMES}|amount\s+per|per\s+(?:{_BASIS_WORDS}))\b))"
+    # Basis marker: "per 100g", "per 100 ml", "per serving"
+    rf"|per\s+(?P<basis>{_BASIS_WORDS})\b"
+    # Name before value on the same line: "Total Fat 12g", "Sodium: 480 mg"
+    rf"|(?:of\s+which\s+)?(?P<name>{_NAMES})\b(?:[ \t]*\((?:{_UNIT})\))?[ \t:\-]*<?[ \t]*"
+    rf"(?P<value>{_NUMBER})[ \t]*(?P<unit>{_SHORT_UNIT})?(?![a-zµ])"
+    # Value before name: "5g protein", "480 mg sodium"
+    rf"|<?[ \t]*(?P<value2>{_NUMBER})[ \t]*(?P<unit2>{_MASS_UNIT})[ \t]+(?:of[ \t]+)?(?P<name2>{_NAMES})\b"
+    # Bare energy: "250 kcal", "250 calories"
+    rf"|(?P<kcal>{_NUMBER})[ \t]*(?:kcal|cal(?:ories)?)\b",
+    re.IGNORECASE,
+)
+_SPACES_RE = re.compile(r"\s+")
+
+_BASIS = {"serving": "per_serving", "portion": "per_serving", "pack": "per_serving"}
+
+
+def _to_float(number: str) -> float:
+    if "," in number:
+        # "1,046" groups thousands; "3,5" is a decimal comma.
+        if "." in number or len(number.rsplit(",", 1)[1]) == 3:
+            number = number.replace(",", "")
+        else:
+            number = number.replace(",", ".")
+    return float(number)
+
+
+def _normalize_unit(unit: Optional[str]) -> Optional[str]:
+    if not unit:
+        return None
+    unit = unit.lower()
+    if unit.startswith("mg") or unit.startswith("milli"):
+        return "mg"
+    if unit in ("µg", "ug", "mcg"):
+        return "ug"
+    if unit == "kj":
+        return "kj"
+    if unit.startswith("kcal") or unit.startswith("cal"):
+        return "kcal"
+    return "g"
+
+
+class _LabelValues:
+    """Collects the first value seen for each field of one label."""
+
+    __slots__ = ("fields", "salt_g", "kcal_from_kj", "basis", "serving_size")
+
+    def __init__(self):
+        self.fields: Dict[str, float] = {}
+        self.salt_g: Optional[float] = None
+        self.kcal_from_kj = False
+        self.basis: Optional[str] = None
+        self.serving_size: Optional[str] = None
+
+    def add(self, field: Optional[str], value: float, unit: Optional[str]) -> None:
+        fields = self.fields
+        if field is None:
+            return
+        if field in ("energy", "calories"):
+            if unit == "kj":
+                if "calories" not in fields:
+                    fields["calories"] = round(value / _KJ_PER_KCAL, 1)
+                    self.kcal_from_kj = True
+            elif unit in (None, "kcal"):
+                self.add_kcal(value)
+            return
+        if unit in ("kj", "kcal"):
+            return
+        if field == "salt":
+            if self.salt_g is None:
+                self.salt_g = value * _UNIT_FACTORS[(unit or "g", "g")]
+            return
+        if field not in fields:
+            target = "mg" if field in _MILLIGRAM_FIELDS else "g"
+            fields[field] = value * _UNIT_FACTORS[(unit or target, target)]
+
+    def add_kcal(self, value: float) -> None:
+        # An explicit kcal figure wins over one converted from kJ.
+        if "calories" not in self.fields or self.kcal_from_kj:
+            self.fields["calories"] = value
+            self.kcal_from_kj = False
+
+    def to_info(self) -> NutritionInfo:
+        fields: Dict[str, Any] = dict(self.fields)
+        if "sodium" not in fields and self.salt_g is not None:
+            fields["sodium"] = round(self.salt_g * _SODIUM_MG_PER_SALT_G, 1)
+        return NutritionInfo(
+            **fields,
+            serving_size=self.serving_size,
+            basis=self.basis,
+        )
+
+
+def _apply(values: _LabelValues, match: "re.Match") -> None:
+    group = match.group
+    if group("value") is not None:
+        name, value, unit = group("name"), group("value"), group("unit")
+    elif group("value2") is not None:
+        name, value, unit = group("name2"), group("value2"), group("unit2")
+    elif group("kcal") is not None:
+        values.add_kcal(_to_float(group("kcal")))
+        return
+    elif group("basis") is not None:
+        if values.basis is None:
+            basis = _SPACES_RE.sub("", group("basis").lower())
+            values.basis = _BASIS.get(basis, f"per_{basis}")
+        return
+    else:
+        if values.serving_size is None:
+            values.serving_size = group("serving")
+        return
+
+    field = NUTRIENT_NAMES[_SPACES_RE.sub(" ", name.lower())]
+    values.add(field, _to_float(value), _normalize_unit(unit))
+
+
+def parse_nutrition(text: Optional[str]) -> NutritionInfo:
+    """Parse one nutrition label into a ``NutritionInfo``.
+
+    When a label lists several columns (per 100g and per serving) the first
+    value of each nutrient is kept and ``basis`` reports the first column.
+    """
+    values = _LabelValues()
+    if text:
+        for match in _LABEL_RE.finditer(text):
+            _apply(values, match)
+    return values.to_info()
+
+
+def parse_nutrition_many(texts: Iterable[Optional[str]]) -> List[NutritionInfo]:
+    """Parse many labels with a single scan over their concatenation.
+
+    Labels are joined with NUL characters, which no part of the pattern can
+    match across, and each match is routed back to its label by offset.
+    """
+    texts = [text or "" for text in texts]
+    if not texts:
+        return []
+    # Offset of the NUL that terminates each label.
+    ends = [end - 1 for end in accumulate(len(text) + 1 for text in texts)]
+    results = [_LabelValues() for _ in texts]
+
+    index = 0
+    for match in _LABEL_RE.finditer("\x00".join(texts)):
+        if match.start() > ends[index]:
+            index = bisect_left(ends, match.start(), index)
+        _apply(results[index], match)
+    return [values.to_info() for values in results]
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Allergen matcher benchmark for the Allergen-Aware Recipe Advisor API.
+
+Scores the same detected-allergen lists against profiles with growing
+``custom_allergens`` lists, once with the previous nested substring loop and
+once with ``calculate_risk_score`` backed by the cached ``AllergenMatcher``.
+Before timing, checks that the matcher still scores a few names the
+substring loop caught, and exits non-zero if one regressed.
+
+Usage:
+    python benchmarks/allergen_matcher_benchmark.py [--foods 2000] [--detected 20]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from app.utils.allergens import ALLERGEN_KEYWORDS, profile_allergen_names  # noqa: E402
+from app.utils.helpers import calculate_risk_score  # noqa: E402
+
+WORDS = (
+    "red", "green", "dried", "roasted", "wild", "sweet", "smoked", "black",
+    "white", "pickled", "ground", "fresh", "golden", "spiced", "bitter",
+)
+BASES = (
+    "pepper", "berry", "bean", "seed", "root", "leaf", "melon", "citrus",
+    "gourd", "lentil", "pea", "grape", "plum", "cherry", "apple", "mushroom",
+)
+KEYWORDS = [keyword for keywords in ALLERGEN_KEYWORDS.values() for keyword in keywords]
+
+# (detected allergens, profile, expected score)
+REGRESSION_CASES = (
+    (["swordfish"], {"fish": True}, 1.0),
+    (["catfish"], {"fish": True}, 1.0),
+    (["walnuts"], {"custom_allergens": ["nut"]}, 1.0),
+    (["cheddar"], {"dairy": True}, 1.0),
+    (["buttermilk"], {"dairy": True}, 1.0),
+    (["peanut butter"], {"peanuts": True}, 1.0),
+    (["avocado"], {"fish": True}, 0.0),
+    (["eggplant"], {"eggs": True}, 0.0),
+    (["cocoa butter"], {"dairy": True}, 0.0),
+    (["peanut butter"], {"dairy": True}, 0.0),
+    (["salted butter"], {"dairy": True}, 1.0),
+    (["cocoa butter"], {"custom_allergens": ["cocoa butter"]}, 1.0),
+    (["doughnut"], {"tree_nuts": True}, 0.0),
+    (["coconut"], {"tree_nuts": True}, 0.0),
+    (["butternut squash"], {"tree_nuts": True}, 0.0),
+    (["coconut milk"], {"custom_allergens": ["coconut"]}, 1.0),
+    (["chestnuts"], {"tree_nuts": True}, 1.0),
+)
+
+
+def legacy_risk_score(detected_allergens: List[str], user_allergens: Dict[str, Any]) -> float:
+    """The previous implementation, kept here as the baseline."""
+    if not detected_allergens:
+        return 0.0
+    user_allergen_list = profile_allergen_names(user_allergens)
+    matches = 0
+    for detected in detected_allergens:
+        for user_allergen in user_allergen_list:
+            if user_allergen.lower() in detected.lower() or detected.lower() in user_allergen.lower():
+                matches += 1
+                break
+    risk_score = matches / len(detected_allergens)
+    severity = user_allergens.get("severity_level", "moderate")
+    if severity == "severe":
+        risk_score = min(1.0, risk_score * 1.2)
+    elif severity == "mild":
+        risk_score = max(0.0, risk_score * 0.8)
+    return min(1.0, risk_score)
+
+
+def make_profile(rng: random.Random, n_custom: int) -> Dict[str, Any]:
+    customs = {f"{rng.choice(WORDS)} {rng.choice(BASES)} {i}" for i in range(n_custom)}
+    return {
+        "peanuts": True,
+        "dairy": rng.random() < 0.5,
+        "sesame": rng.random() < 0.5,
+        "custom_allergens": sorted(customs),
+        "severity_level": rng.choice(("mild", "moderate", "severe")),
+    }
+
+
+def make_detected(rng: random.Random, n: int) -> List[str]:
+    detected = []
+    for _ in range(n):
+        if rng.random() < 0.5:
+            detected.append(rng.choice(KEYWORDS))
+        else:
+            detected.append(f"{rng.choice(WORDS)} {rng.choice(BASES)} {rng.randint(0, 5000)}")
+    return detected
+
+
+def check_regressions() -> List[str]:
+    failures = []
+    for detected, profile, expected in REGRESSION_CASES:
+        score = calculate_risk_score(detected, profile)
+        if score != expected:
+            failures.append(f"{detected} vs {profile}: expected {expected}, got {score}")
+    return failures
+
+
+def _time(func, profile: Dict[str, Any], foods: List[List[str]]) -> float:
+    started = time.perf_counter()
+    for detected in foods:
+        func(detected, profile)
+    return time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--foods", type=int, default=2000)
+    parser.add_argument("--detected", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    failures = check_regressions()
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        return 1
+    print(f"{len(REGRESSION_CASES)} matcher regression cases OK\n")
+
+    rng = random.Random(args.seed)
+    foods = [make_detected(rng, args.detected) for _ in range(args.foods)]
+    print(f"{args.foods} foods x {args.detected} detected allergens per profile size\n")
+    print(f"{'custom allergens':>16}  {'legacy us/food':>14}  {'matcher us/food':>15}  {'speedup':>7}")
+
+    for n_custom in (10, 100, 1000, 5000):
+        profile = make_profile(rng, n_custom)
+        legacy = _time(legacy_risk_score, profile, foods)
+        indexed = _time(calculate_risk_score, profile, foods)
+        print(
+            f"{n_custom:>16}  {legacy / args.foods * 1e6:>14.1f}  "
+            f"{indexed / args.foods * 1e6:>15.1f}  {legacy / indexed:>6.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
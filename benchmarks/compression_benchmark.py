@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Response compression benchmark for the Allergen-Aware Recipe Advisor API.
+
+Compresses representative response bodies (a 1000-entry history, a page
+of 50 search results and one food's details) with gzip at several levels
+and, when the ``brotli`` package is installed, brotli at several
+qualities. For each it reports the compression ratio, the CPU time spent
+compressing, and the total time to deliver the body (compression plus
+transfer) on typical mobile links, against sending it uncompressed.
+
+Usage:
+    python benchmarks/compression_benchmark.py [--entries 1000] [--repeat 20]
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+from app.compression import _Compressor, brotli  # noqa: E402
+from app.responses import json_body  # noqa: E402
+from response_serialization_benchmark import make_entry  # noqa: E402
+
+# Downlink bandwidth in megabits per second.
+LINKS = (("3G", 1.5), ("4G", 10.0))
+SETTINGS = [("gzip", level) for level in (1, 6, 9)]
+if brotli is not None:
+    SETTINGS += [("br", quality) for quality in (1, 4, 6, 11)]
+
+
+def make_payloads(entries: int, seed: int) -> Dict[str, bytes]:
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    history = [make_entry(rng, index, now) for index in range(entries)]
+    search = {
+        "foods": [
+            {
+                "food_id": str(100000 + i),
+                "food_name": f"{rng.choice(('Chicken', 'Rice', 'Apple', 'Bread'))} {rng.choice(('Salad', 'Bowl', 'Pie', 'Roll'))}",
+                "brand_name": rng.choice((None, "Generic", "Store Brand")),
+                "food_type": "Generic",
+                "food_url": f"https://www.fatsecret.com/calories-nutrition/generic/{100000 + i}",
+                "food_description": f"Per 100g - Calories: {rng.randint(50, 500)}kcal | Fat: {rng.uniform(0, 30):.2f}g "
+                f"| Carbs: {rng.uniform(0, 80):.2f}g | Protein: {rng.uniform(0, 40):.2f}g",
+            }
+            for i in range(50)
+        ],
+        "total_results": 1250,
+        "page_number": 0,
+        "max_results": 50,
+        "source": "fatsecret",
+    }
+    details = history[0]
+    return {
+        f"history ({entries} entries)": json_body(history),
+        "search page (50 foods)": json_body(search),
+        "food details": json_body(details),
+    }
+
+
+def _time(func: Callable[[], bytes], repeat: int) -> Tuple[float, int]:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        size = len(func())
+    return (time.perf_counter() - started) / repeat, size
+
+
+def _transfer_ms(size: int, mbps: float) -> float:
+    return size * 8 / (mbps * 1_000_000) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli is not installed; only gzip is measured (pip install brotli)\n")
+
+    header = "".join(f"{name + ' total':>14s}" for name, _ in LINKS)
+    for name, body in make_payloads(args.entries, args.seed).items():
+        print(f"{name}: {len(body) / 1024:.1f} KiB")
+        print(f"  {'encoding':10s} {'ratio':>7s} {'cpu ms':>8s}{header}")
+        rows: List[Tuple[str, float, float, int]] = [("identity", 1.0, 0.0, len(body))]
+        for encoding, level in SETTINGS:
+            elapsed, size = _time(lambda: _Compressor(encoding, level).compress(body, True), args.repeat)
+            rows.append((f"{encoding}-{level}", len(body) / size, elapsed * 1000, size))
+        for label, ratio, cpu_ms, size in rows:
+            totals = "".join(f"{cpu_ms + _transfer_ms(size, mbps):11.1f} ms" for _, mbps in LINKS)
+            print(f"  {label:10s} {ratio:6.1f}x {cpu_ms:8.2f}{totals}")
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
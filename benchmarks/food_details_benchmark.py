@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+FatSecret food details normalizer benchmark for the Allergen-Aware Recipe Advisor API.
+
+Generates reproducible ``food.get`` payloads and replays a skewed stream
+of lookups (a few popular foods scanned over and over), timing the
+previous inline conversion against ``normalize_food_details`` with an
+empty memo and with the memo warm.
+
+Usage:
+    python benchmarks/food_details_benchmark.py [--foods 2000] [--lookups 50000] [--seed 42]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from app.models.food import FoodDetails  # noqa: E402
+from app.utils.food_details import clear_food_details_cache, normalize_food_details  # noqa: E402
+from app.utils.ingredients import parse_ingredients  # noqa: E402
+
+INGREDIENTS = (
+    "wheat flour", "sugar", "palm oil", "skimmed milk powder", "cocoa butter",
+    "salt", "emulsifier (soy lecithin)", "raising agent (E500ii)", "whey powder",
+    "hazelnuts (13%)", "glucose syrup", "egg", "rapeseed oil", "natural flavouring",
+)
+
+
+def make_food(rng: random.Random, food_id: int) -> Dict[str, Any]:
+    serving = {
+        "serving_description": f"{rng.randint(1, 4)} portion",
+        "measurement_description": "portion",
+        **{
+            key: f"{rng.uniform(0, 40):.2f}"
+            for key in ("calories", "protein", "carbohydrate", "fat", "fiber", "sugar",
+                        "sodium", "cholesterol", "saturated_fat")
+        },
+    }
+    servings: Any = [serving, dict(serving, serving_description="100 g")]
+    if rng.random() < 0.3:
+        servings = serving
+    return {
+        "food": {
+            "food_id": str(food_id),
+            "food_name": f"Food {food_id}",
+            "brand_name": "Brand",
+            "food_type": "Brand",
+            "food_url": f"https://www.fatsecret.com/foods/{food_id}",
+            "ingredients": ", ".join(rng.sample(INGREDIENTS, rng.randint(4, 12)))
+            + ". Contains: milk, soy.",
+            "servings": {"serving": servings},
+        }
+    }
+
+
+def legacy_convert(result: Dict[str, Any]) -> FoodDetails:
+    """The previous per-route conversion: parse everything on every call."""
+    food_data = result.get("food", {})
+    nutrition_data = {}
+    if "servings" in food_data and "serving" in food_data["servings"]:
+        serving = food_data["servings"]["serving"]
+        if not isinstance(serving, list):
+            serving = [serving]
+        if serving:
+            nutrition_data = {
+                "calories": float(serving[0].get("calories", 0)),
+                "protein": float(serving[0].get("protein", 0)),
+                "carbohydrates": float(serving[0].get("carbohydrate", 0)),
+                "fat": float(serving[0].get("fat", 0)),
+                "fiber": float(serving[0].get("fiber", 0)),
+                "sugar": float(serving[0].get("sugar", 0)),
+                "sodium": float(serving[0].get("sodium", 0)),
+                "cholesterol": float(serving[0].get("cholesterol", 0)),
+                "saturated_fat": float(serving[0].get("saturated_fat", 0)),
+                "serving_size": serving[0].get("serving_size"),
+                "serving_unit": serving[0].get("measurement_description"),
+            }
+    label = parse_ingredients(food_data.get("ingredients"))
+    return FoodDetails(
+        food_id=food_data.get("food_id", ""),
+        food_name=food_data.get("food_name", ""),
+        brand_name=food_data.get("brand_name"),
+        food_type=food_data.get("food_type"),
+        food_url=food_data.get("food_url"),
+        ingredients=label.names(),
+        nutrition=nutrition_data,
+        allergens=label.contains or None,
+    )
+
+
+def _time(func, lookups: List[Dict[str, Any]]) -> float:
+    started = time.perf_counter()
+    for result in lookups:
+        func(result)
+    return time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--foods", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    foods = [make_food(rng, food_id) for food_id in range(args.foods)]
+    # Zipf-like popularity: food i is picked with weight 1 / (i + 1).
+    weights = [1 / (rank + 1) for rank in range(len(foods))]
+    lookups = rng.choices(foods, weights=weights, k=args.lookups)
+    print(f"Corpus: {len(foods)} foods, {len(lookups)} lookups, {len({id(f) for f in lookups})} distinct")
+
+    legacy = _time(legacy_convert, lookups)
+    clear_food_details_cache()
+    cold = _time(normalize_food_details, foods)
+    memoized = _time(normalize_food_details, lookups)
+
+    rows = (
+        ("legacy inline conversion", legacy, len(lookups)),
+        ("normalize_food_details (first sight)", cold, len(foods)),
+        ("normalize_food_details (memoized)", memoized, len(lookups)),
+    )
+    for name, elapsed, count in rows:
+        print(f"  {name:38s} {elapsed:7.3f} s  {elapsed / count * 1e6:7.2f} us/food")
+    print(f"\nSpeed-up on the lookup stream: {legacy / memoized:.0f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
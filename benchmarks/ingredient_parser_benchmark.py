@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Ingredient parser benchmark for the Allergen-Aware Recipe Advisor API.
+
+Generates a reproducible corpus of synthetic food labels (nested groups,
+percentages, E-numbers, "contains"/"may contain" clauses) and times
+``parse_ingredients`` against the previous split-and-regex approach.
+
+Usage:
+    python benchmarks/ingredient_parser_benchmark.py [--labels 100000] [--seed 42]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from app.utils.ingredients import parse_ingredients  # noqa: E402
+
+BASIC = (
+    "sugar", "salt", "water", "wheat flour", "palm oil", "skimmed milk powder",
+    "cocoa butter", "rapeseed oil", "glucose syrup", "yeast", "barley malt extract",
+    "tomato puree", "onion", "garlic powder", "black pepper", "whey powder",
+    "dextrose", "rice flour", "potato starch", "sunflower oil", "hazelnuts",
+)
+COMPOUND = (
+    ("chocolate", ("sugar", "cocoa mass", "cocoa butter", "milk powder")),
+    ("pasta", ("durum wheat semolina", "egg")),
+    ("seasoning", ("salt", "spices", "yeast extract", "flavouring")),
+    ("cheese", ("milk", "salt", "rennet")),
+    ("mayonnaise", ("rapeseed oil", "egg yolk", "vinegar", "mustard seeds")),
+)
+ADDITIVES = (
+    ("emulsifier", "E322"), ("acidity regulator", "E330"), ("preservative", "E202"),
+    ("raising agent", "E500ii"), ("colour", "E160a"), ("antioxidant", "E306"),
+)
+ALLERGENS = ("milk", "soy", "wheat", "egg", "nuts", "sesame", "mustard", "celery")
+
+
+def _compound(rng: random.Random, depth: int) -> str:
+    name, parts = rng.choice(COMPOUND)
+    children = list(rng.sample(parts, rng.randint(1, len(parts))))
+    if depth < 2 and rng.random() < 0.3:
+        children[0] = _compound(rng, depth + 1)
+    open_, close = rng.choice((("(", ")"), ("[", "]")))
+    percent = f" {rng.randint(1, 60)}%" if rng.random() < 0.4 else ""
+    return f"{name}{percent} {open_}{', '.join(children)}{close}"
+
+
+def make_label(rng: random.Random) -> str:
+    items: List[str] = []
+    for _ in range(rng.randint(4, 18)):
+        roll = rng.random()
+        if roll < 0.2:
+            items.append(_compound(rng, 0))
+        elif roll < 0.35:
+            name, e_number = rng.choice(ADDITIVES)
+            items.append(f"{name} ({e_number})" if rng.random() < 0.7 else e_number)
+        elif roll < 0.45:
+            items.append(f"{rng.choice(BASIC)} ({rng.randint(1, 99)}.{rng.randint(0, 9)}%)")
+        else:
+            items.append(rng.choice(BASIC))
+    label = "Ingredients: " + ", ".join(items) + "."
+    if rng.random() < 0.6:
+        label += " Contains: " + ", ".join(rng.sample(ALLERGENS, rng.randint(1, 3))) + "."
+    if rng.random() < 0.4:
+        label += " May contain: " + ", ".join(rng.sample(ALLERGENS, rng.randint(1, 2))) + "."
+    return label
+
+
+def legacy_split(text: str) -> List[str]:
+    """The previous behaviour: split on the first separator, regex per item."""
+    ingredients: List[str] = []
+    for separator in [",", ";", "\n", "|", "•"]:
+        if separator in text:
+            ingredients = [ingredient.strip() for ingredient in text.split(separator)]
+            break
+    cleaned = []
+    for ingredient in ingredients or [text.strip()]:
+        ingredient = ingredient.strip()
+        if ingredient and len(ingredient) > 1:
+            cleaned.append(re.sub(r"^[-•\*\d+\.\)\s]+", "", ingredient))
+    return cleaned
+
+
+def _time(func, labels: List[str]) -> float:
+    started = time.perf_counter()
+    for label in labels:
+        func(label)
+    return time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--labels", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    labels = [make_label(rng) for _ in range(args.labels)]
+    total_chars = sum(map(len, labels))
+    print(f"Corpus: {len(labels)} labels, {total_chars / len(labels):.0f} chars on average")
+
+    legacy = _time(legacy_split, labels)
+    parsed = _time(parse_ingredients, labels)
+
+    for name, elapsed in (("legacy split (flat, no structure)", legacy), ("parse_ingredients", parsed)):
+        print(
+            f"  {name:36s} {elapsed:7.2f} s  "
+            f"{len(labels) / elapsed:9.0f} labels/s  {elapsed / len(labels) * 1e6:6.1f} us/label"
+        )
+
+    sample = parse_ingredients(labels[0])
+    print(f"\nSample: {labels[0]}")
+    print(f"  names:       {sample.names()}")
+    print(f"  e-numbers:   {sample.e_numbers()}")
+    print(f"  contains:    {sample.contains}")
+    print(f"  may contain: {sample.may_contain}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark for the Allergen-Aware Recipe Advisor API.
+
+Builds a reproducible ``GET /api/v1/users/history`` payload (entries with
+nested ``analysis_result`` maps) and times the previous path, FastAPI's
+``jsonable_encoder`` followed by the standard library ``JSONResponse``,
+against ``ORJSONResponse`` rendering the entries directly.
+
+Usage:
+    python benchmarks/response_serialization_benchmark.py [--entries 1000] [--repeat 50] [--seed 42]
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.responses import ORJSONResponse  # noqa: E402
+
+ALLERGENS = ("milk", "eggs", "peanuts", "tree nuts", "soy", "wheat", "fish", "shellfish", "sesame")
+DISHES = ("Pad Thai", "Margherita Pizza", "Caesar Salad", "Chicken Tikka Masala", "Pancakes")
+
+
+def make_entry(rng: random.Random, index: int, now: datetime) -> Dict[str, Any]:
+    detected = rng.sample(ALLERGENS, rng.randint(0, 4))
+    return {
+        "id": f"scan_{index:06d}",
+        "timestamp": (now - timedelta(minutes=index * 7)).isoformat(),
+        "dishName": rng.choice(DISHES),
+        "is_safe": not detected,
+        "risk_level": rng.choice(("low", "medium", "high")),
+        "detected_allergens": detected,
+        "risk_factors": [f"May contain {allergen}" for allergen in detected],
+        "recommendations": ["Check the label", "Ask the restaurant about preparation"],
+        "alternative_suggestions": rng.sample(DISHES, 2),
+        "confidence_score": round(rng.random(), 3),
+        "ingredients": [
+            {"name": f"ingredient {i}", "allergens": rng.sample(ALLERGENS, rng.randint(0, 2))}
+            for i in range(rng.randint(5, 15))
+        ],
+        "nutrition": {
+            key: round(rng.uniform(0, 500), 1)
+            for key in ("calories", "protein", "carbohydrates", "fat", "fiber", "sugar", "sodium")
+        },
+        "analysis_details": "Detected ingredients were matched against the user's profile. " * 3,
+    }
+
+
+def _time(render: Callable[[List[Dict[str, Any]]], bytes], history: List[Dict[str, Any]], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        render(history)
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    history = [make_entry(rng, index, now) for index in range(args.entries)]
+
+    before = lambda content: JSONResponse(jsonable_encoder(content)).body  # noqa: E731
+    after = lambda content: ORJSONResponse(content).body  # noqa: E731
+    size = len(after(history))
+    print(f"History: {len(history)} entries, {size / 1024:.0f} KiB of JSON")
+
+    before_s = _time(before, history, args.repeat)
+    after_s = _time(after, history, args.repeat)
+    for name, elapsed in (
+        ("jsonable_encoder + JSONResponse", before_s),
+        ("ORJSONResponse", after_s),
+    ):
+        print(f"  {name:32s} {elapsed * 1000:8.2f} ms/response")
+    print(f"\nSpeed-up: {before_s / after_s:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
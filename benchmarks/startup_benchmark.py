@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Allergen-Aware Recipe Advisor API.
+
+Imports ``app.main`` in fresh interpreters with ``-X importtime`` and fails
+(exit code 1) when the median import time exceeds the budget or when a
+module that is supposed to load lazily is imported at startup.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--budget-ms 800]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Heavy dependencies that must only be imported on first use.
+LAZY_MODULES = (
+    "google.generativeai",
+    "firebase_admin",
+    "google.cloud.firestore",
+    "PIL",
+    "numpy",
+    "requests",
+)
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def profile_import() -> Dict[str, Tuple[int, int]]:
+    """Import app.main once and return {module: (self_us, cumulative_us)}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=REPO_ROOT,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        raise SystemExit("ERROR: importing app.main failed")
+
+    modules: Dict[str, Tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "800")),
+        help="maximum median import time of app.main (default 800, or $STARTUP_IMPORT_BUDGET_MS)",
+    )
+    args = parser.parse_args()
+
+    totals: List[float] = []
+    modules: Dict[str, Tuple[int, int]] = {}
+    for _ in range(args.runs):
+        modules = profile_import()
+        totals.append(modules["app.main"][1] / 1000)
+
+    median = statistics.median(totals)
+    print(f"app.main import time: median {median:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}), budget {args.budget_ms:.0f} ms")
+
+    print("\nSlowest modules by self time (last run):")
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"  {self_us / 1000:8.1f} ms self  {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in modules]
+    if eager:
+        failed = True
+        print(f"\nFAIL: modules that should load lazily were imported: {', '.join(eager)}")
+    if median > args.budget_ms:
+        failed = True
+        print(f"\nFAIL: import time {median:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+
+    if not failed:
+        print("\nOK: startup within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Storage backend benchmark for the Allergen-Aware Recipe Advisor API.
+
+Runs the history queries the API makes against the embedded SQLite
+backend in a temporary database: batched scan writes, loading a user's
+full history, paging through it, the "scanned this food before" lookup
+and a stats increment. Reports the mean latency of each operation.
+
+Usage:
+    python benchmarks/storage_benchmark.py [--users 50] [--scans 1000] [--repeat 200]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+from app.repositories.sqlite import (  # noqa: E402
+    SQLiteDatabase,
+    SQLiteFoodScanRepository,
+    SQLiteHistoryStatsRepository,
+)
+from response_serialization_benchmark import make_entry  # noqa: E402
+
+
+async def _time(func: Callable[[], Awaitable[object]], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def run(users: int, scans: int, repeat: int, seed: int) -> None:
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    with tempfile.TemporaryDirectory() as directory:
+        database = SQLiteDatabase(str(Path(directory) / "storage.sqlite3"))
+        food_scans = SQLiteFoodScanRepository(database)
+        history_stats = SQLiteHistoryStatsRepository(database)
+
+        started = time.perf_counter()
+        for user in range(users):
+            documents = []
+            for index in range(scans):
+                entry = make_entry(rng, index, now)
+                documents.append((
+                    f"u{user}-{index}",
+                    {
+                        "user_id": f"user-{user}",
+                        "scan_type": "barcode",
+                        "food_id": str(rng.randint(1, 200)),
+                        "food_name": entry["dishName"],
+                        "analysis_result": entry,
+                        "created_at": now - timedelta(minutes=index),
+                    },
+                ))
+            for start in range(0, len(documents), 100):
+                await food_scans.add_many(documents[start:start + 100])
+        elapsed = time.perf_counter() - started
+        total = users * scans
+        print(f"wrote {total} scans in batches of 100: {total / elapsed:,.0f} scans/s\n")
+
+        async def stream_page() -> None:
+            async for _ in food_scans.stream_for_user("user-0", page_size=100):
+                break
+
+        async def stream_all() -> None:
+            async for _ in food_scans.stream_for_user("user-0"):
+                pass
+
+        operations = [
+            (f"list_for_user ({scans} scans)", lambda: food_scans.list_for_user("user-0"), max(repeat // 20, 1)),
+            (f"stream_for_user ({scans} scans)", stream_all, max(repeat // 20, 1)),
+            ("first page of 100", stream_page, repeat),
+            ("list_for_user_since (last hour)", lambda: food_scans.list_for_user_since("user-0", now - timedelta(hours=1)), repeat),
+            ("latest_for_food", lambda: food_scans.latest_for_food("user-0", str(rng.randint(1, 200))), repeat),
+            ("history_stats.increment", lambda: history_stats.increment("user-0", {"total_scans": 1, "foods": {"Apple": 1}}), repeat),
+        ]
+        print(f"  {'operation':36s} {'mean':>10s}")
+        for label, func, count in operations:
+            print(f"  {label:36s} {await _time(func, count):7.3f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--scans", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.scans, args.repeat, args.seed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
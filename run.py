@@ -22,6 +22,8 @@ for path in (CURRENT_DIR, PARENT_DIR):
 # Load environment variables
 load_dotenv()
 
+from app.config import settings
+
 def check_environment():
     """Check if suggestion-worthy environment variables are set."""
     required_vars = [
@@ -63,13 +65,16 @@ def main():
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
     environment = os.getenv("ENVIRONMENT", "development")
-    reload = environment == "development"
+    workers = max(1, settings.WORKERS)
+    # uvicorn cannot combine auto-reload with multiple worker processes
+    reload = environment == "development" and workers == 1
     log_level = os.getenv("LOG_LEVEL", "info")
     
     print(f"Environment: {environment}")
     print(f"Host: {host}")
     print(f"Port: {port}")
     print(f"Reload: {reload}")
+    print(f"Workers: {workers}")
     print(f"Log Level: {log_level}")
     print(f"API Documentation: http://{host}:{port}/docs")
     print(f"ReDoc Documentation: http://{host}:{port}/redoc")
@@ -81,6 +86,7 @@ def main():
             host=host,
             port=port,
             reload=reload,
+            workers=workers,
             log_level=log_level,
             access_log=True
         )
@@ -311,11 +311,13 @@ function AppContent() {
 
     try {
       let result: any = null;
+      let scanId: string | undefined;
       const { scanImage, scanBarcode, scanVoice, analyzeFood, addHistory } = await import('./lib/api');
 
       if (data.method === 'upload') {
         const file = data.value as File;
         const scanRes = await scanImage(file);
+        scanId = scanRes?.scan_id;
         result = scanRes?.food_details ? {
           dishName: scanRes.food_details.food_name,
           explanation: 'AI-based allergen analysis',
@@ -329,6 +331,7 @@ function AppContent() {
       } else if (data.method === 'barcode') {
         const barcode = String(data.value);
         const scanRes = await scanBarcode(barcode);
+        scanId = scanRes?.scan_id;
         result = scanRes?.food_details ? {
           dishName: scanRes.food_details.food_name || `Product ${barcode}`,
           explanation: 'AI-based allergen analysis',
@@ -370,8 +373,9 @@ function AppContent() {
 
       setCurrentResult(result);
 
-      // Save to history
-      await addHistory({ analysis: result });
+      // Save to history; scans were already recorded by the server, so
+      // their record is completed instead of duplicated
+      await addHistory({ analysis: result, scan_id: scanId });
 
       // Reload history
       loadHistory();